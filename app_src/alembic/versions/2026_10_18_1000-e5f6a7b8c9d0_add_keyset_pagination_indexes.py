@@ -0,0 +1,41 @@
+"""add keyset pagination indexes
+
+Revision ID: e5f6a7b8c9d0
+Revises: b2c3d4e5f6a7
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5f6a7b8c9d0"
+down_revision: str | None = "b2c3d4e5f6a7"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_matchs_user_id_created_at_id",
+        "matchs",
+        ["user_id", "created_at", "id"],
+    )
+    op.create_index(
+        "ix_messages_match_id_id",
+        "messages",
+        ["match_id", "id"],
+    )
+    op.create_index(
+        "ix_users_rating_created_at_id",
+        "users",
+        ["rating", "created_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_rating_created_at_id", table_name="users")
+    op.drop_index("ix_messages_match_id_id", table_name="messages")
+    op.drop_index("ix_matchs_user_id_created_at_id", table_name="matchs")
@@ -0,0 +1,58 @@
+"""add unique match pair
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f6a7b8c9d0e1"
+down_revision: str | None = "e5f6a7b8c9d0"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    # Concurrent likes could store the same pair twice: keep the oldest row
+    # and move chat messages of the duplicates over to it
+    op.execute("""
+        CREATE TEMPORARY TABLE matchs_dedup ON COMMIT DROP AS
+        SELECT id, min(id) OVER (PARTITION BY user_id, matched_user_id) AS keep_id
+        FROM matchs
+    """)
+    op.execute("""
+        UPDATE messages SET match_id = d.keep_id
+        FROM matchs_dedup d
+        WHERE messages.match_id = d.id AND d.id <> d.keep_id
+    """)
+    op.execute("""
+        DELETE FROM matchs USING matchs_dedup d
+        WHERE matchs.id = d.id AND d.id <> d.keep_id
+    """)
+    # Reciprocal likes that raced each other may both have missed the
+    # mutual transition
+    op.execute("""
+        UPDATE matchs m SET is_mutual = true
+        WHERE NOT m.is_mutual AND EXISTS (
+            SELECT 1 FROM matchs r
+            WHERE r.user_id = m.matched_user_id AND r.matched_user_id = m.user_id
+        )
+    """)
+    op.create_unique_constraint(
+        "uq_matchs_user_id_matched_user_id",
+        "matchs",
+        ["user_id", "matched_user_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        "uq_matchs_user_id_matched_user_id",
+        "matchs",
+        type_="unique",
+    )
@@ -0,0 +1,94 @@
+"""add hot path indexes
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a7b8c9d0e1f2"
+down_revision: str | None = "f6a7b8c9d0e1"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    (
+        "ix_users_gender_rating_created_at_id",
+        "users",
+        ["gender", "rating", "created_at", "id"],
+        "is_active",
+    ),
+    (
+        "ix_user_interests_interest_id_user_id",
+        "user_interests",
+        ["interest_id", "user_id"],
+        None,
+    ),
+    (
+        "ix_matchs_matched_user_id_user_id",
+        "matchs",
+        ["matched_user_id", "user_id"],
+        None,
+    ),
+    (
+        "ix_blocks_blocked_user_id_user_id",
+        "blocks",
+        ["blocked_user_id", "user_id"],
+        None,
+    ),
+    (
+        "ix_messages_match_id_created_at",
+        "messages",
+        ["match_id", "created_at"],
+        None,
+    ),
+    ("ix_messages_match_id_unread", "messages", ["match_id"], "NOT is_read"),
+    ("ix_messages_sender_id", "messages", ["sender_id"], None),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction; IF NOT EXISTS lets a
+    # rerun skip indexes that were already built
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+        # Superseded by ix_users_gender_rating_created_at_id
+        op.drop_index(
+            "ix_users_rating_created_at_id",
+            table_name="users",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_rating_created_at_id",
+            "users",
+            ["rating", "created_at", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,94 @@
+"""add read cursors
+
+Replaces the per-message is_read flag with one read_cursors row per
+(match, participant): messages above last_read_message_id are unread.
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b8c9d0e1f2a3"
+down_revision: str | None = "a7b8c9d0e1f2"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "read_cursors",
+        sa.Column(
+            "match_id",
+            sa.Integer(),
+            sa.ForeignKey("matchs.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "user_id",
+            sa.Integer(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "last_read_message_id", sa.Integer(), server_default="0", nullable=False
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("match_id", "user_id", name="pk_read_cursors"),
+    )
+    op.create_index("ix_read_cursors_user_id", "read_cursors", ["user_id"])
+
+    # A participant has read up to the newest message sent to them that
+    # was flagged as read
+    op.execute(
+        """
+        INSERT INTO read_cursors (match_id, user_id, last_read_message_id)
+        SELECT m.id, p.user_id, max(msg.id)
+        FROM matchs m
+        CROSS JOIN LATERAL (VALUES (m.user_id), (m.matched_user_id)) p(user_id)
+        JOIN messages msg
+            ON msg.match_id = m.id AND msg.sender_id <> p.user_id AND msg.is_read
+        GROUP BY m.id, p.user_id
+        """
+    )
+
+    op.drop_index("ix_messages_match_id_unread", table_name="messages", if_exists=True)
+    op.drop_column("messages", "is_read")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "messages",
+        sa.Column("is_read", sa.Boolean(), server_default="false", nullable=False),
+    )
+    op.execute(
+        """
+        UPDATE messages msg
+        SET is_read = true
+        FROM matchs m, read_cursors c
+        WHERE m.id = msg.match_id
+            AND c.match_id = m.id
+            AND c.user_id <> msg.sender_id
+            AND c.user_id IN (m.user_id, m.matched_user_id)
+            AND msg.id <= c.last_read_message_id
+        """
+    )
+    op.create_index(
+        "ix_messages_match_id_unread",
+        "messages",
+        ["match_id"],
+        postgresql_where=sa.text("NOT is_read"),
+    )
+    op.drop_index("ix_read_cursors_user_id", table_name="read_cursors")
+    op.drop_table("read_cursors")
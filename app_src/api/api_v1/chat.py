@@ -17,7 +17,9 @@ from core.config import settings
 from core.models import User, db_helper
 from crud.services.chat_service import ChatService
 from crud.services.connection_manager import manager
+from crud.services.message_writer import MessageWriter
 from crud.services.notification_service import NotificationService
+from crud.services.unread_service import UnreadService
 
 from .fastapi_users import current_user
 
@@ -46,6 +48,14 @@ class MessageOut(BaseModel):
 class HistoryResponse(BaseModel):
     messages: list[MessageOut]
     total: int
+    # Set in cursor mode; pass back as ?cursor= to fetch older messages
+    next_cursor: str | None = None
+
+
+class UnreadResponse(BaseModel):
+    total: int
+    # Unread messages by match ID; chats with none are left out
+    matches: dict[int, int]
 
 
 async def _get_user_by_token(
@@ -72,13 +82,19 @@ async def websocket_chat(
     websocket: WebSocket,
     match_id: int,
     token: str = Query(...),
+    last_id: str | None = Query(None),
 ):
     """
     WebSocket endpoint for real-time chat.
 
     Connect with: ws://host/api/v1/chat/ws/{match_id}?token=<access_token>
     Send messages as JSON: {"text": "hello"}
+
+    With the stream transport, messages carry a ``stream_id``; reconnect
+    with ``&last_id=<stream_id>`` to first receive the messages missed.
     """
+    # The session only lives for the handshake; messages are saved by the
+    # MessageWriter, so an idle socket holds no pooled connection
     async with db_helper.session_factory() as session:
         user = await _get_user_by_token(token, session)
         if user is None:
@@ -99,53 +115,66 @@ async def websocket_chat(
         else:
             recipient_id = match.user_id
 
-        # Load recipient info for notifications
+        # Load recipient info for notifications, kept for the life of the socket
         recipient_result = await session.execute(
             select(User).where(User.id == recipient_id)
         )
         recipient = recipient_result.scalar_one_or_none()
 
-        await manager.connect(websocket, match_id, user.id)
+    await manager.connect(websocket, match_id, user.id, last_id=last_id)
 
-        try:
-            while True:
-                data = await websocket.receive_json()
-                text = data.get("text", "").strip()
-                if not text:
-                    continue
-
-                message = await ChatService.save_message(
-                    session, match_id, user.id, text
+    try:
+        while True:
+            data = await websocket.receive_json()
+            text = data.get("text", "").strip()
+            if not text:
+                continue
+
+            message = await MessageWriter.save(match_id, user.id, text)
+
+            outgoing = {
+                "id": message.id,
+                "match_id": match_id,
+                "sender_id": user.id,
+                "text": message.text,
+                "is_read": False,
+                "created_at": message.created_at.isoformat(),
+            }
+
+            await manager.broadcast(match_id, outgoing)
+            await UnreadService.increment(match_id, recipient_id)
+
+            # Notify recipient if not connected to this chat
+            conns = manager._connections.get(match_id, {})
+            if recipient and recipient_id not in conns:
+                await NotificationService.notify_new_message(
+                    recipient.telegram_id,
+                    user.first_name,
+                    text,
+                    match_id,
                 )
 
-                outgoing = {
-                    "id": message.id,
-                    "match_id": match_id,
-                    "sender_id": user.id,
-                    "text": message.text,
-                    "is_read": False,
-                    "created_at": message.created_at.isoformat(),
-                }
-
-                await manager.broadcast(match_id, outgoing)
-
-                # Notify recipient if not connected to this chat
-                conns = manager._connections.get(match_id, {})
-                if recipient and recipient_id not in conns:
-                    await NotificationService.notify_new_message(
-                        recipient.telegram_id,
-                        user.first_name,
-                        text,
-                        match_id,
-                    )
-
-        except WebSocketDisconnect:
-            await manager.disconnect(match_id, user.id)
-        except Exception:
-            logger.exception(
-                "WebSocket error for match_id=%s user_id=%s", match_id, user.id
-            )
-            await manager.disconnect(match_id, user.id)
+    except WebSocketDisconnect:
+        await manager.disconnect(match_id, user.id, websocket)
+    except Exception:
+        logger.exception(
+            "WebSocket error for match_id=%s user_id=%s", match_id, user.id
+        )
+        await manager.disconnect(match_id, user.id, websocket)
+
+
+@router.get(
+    "/unread",
+    response_model=UnreadResponse,
+    summary="Get unread message counts",
+)
+async def get_unread_counts(
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(db_helper.session_getter),
+):
+    """Unread messages across the user's chats, for badges."""
+    counts = await UnreadService.get_counts(session, user.id)
+    return UnreadResponse(total=sum(counts.values()), matches=counts)
 
 
 @router.get(
@@ -157,18 +186,34 @@ async def get_chat_history(
     match_id: int,
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(
+        None,
+        description="Keyset pagination: pass an empty value for the newest "
+        "page, then next_cursor to fetch older messages. Offset is ignored.",
+    ),
     user: User = Depends(current_user),
     session: AsyncSession = Depends(db_helper.session_getter),
 ):
     """Get paginated message history for a match."""
     try:
-        await ChatService.validate_match_participant(session, match_id, user.id)
+        match = await ChatService.validate_match_participant(session, match_id, user.id)
     except ValueError as e:
         raise HTTPException(status_code=403, detail=str(e)) from e
 
-    messages, total = await ChatService.get_history(
-        session, match_id, limit=limit, offset=offset
-    )
+    next_cursor = None
+    if cursor is None:
+        messages, total = await ChatService.get_history(
+            session, match_id, limit=limit, offset=offset
+        )
+    else:
+        try:
+            messages, total, next_cursor = await ChatService.get_history_by_cursor(
+                session, match_id, limit=limit, cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
+    read_cursors = await ChatService.get_read_cursors(session, match_id)
 
     return HistoryResponse(
         messages=[
@@ -177,12 +222,13 @@ async def get_chat_history(
                 match_id=msg.match_id,
                 sender_id=msg.sender_id,
                 text=msg.text,
-                is_read=msg.is_read,
+                is_read=ChatService.is_read(match, read_cursors, msg),
                 created_at=msg.created_at.isoformat(),
             )
             for msg in messages
         ],
         total=total,
+        next_cursor=next_cursor,
     )
 
 
@@ -195,11 +241,11 @@ async def mark_messages_read(
     user: User = Depends(current_user),
     session: AsyncSession = Depends(db_helper.session_getter),
 ):
-    """Mark all unread messages in a match as read."""
+    """Mark every message of a match, up to the latest, as read."""
     try:
         await ChatService.validate_match_participant(session, match_id, user.id)
     except ValueError as e:
         raise HTTPException(status_code=403, detail=str(e)) from e
 
-    count = await ChatService.mark_as_read(session, match_id, user.id)
-    return {"marked_read": count}
+    last_read_message_id = await ChatService.mark_as_read(session, match_id, user.id)
+    return {"last_read_message_id": last_read_message_id}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
@@ -12,7 +12,12 @@ from core.schemas.interest import (
     UserInterestsUpdate,
 )
 from core.schemas.pagination import PaginatedResponse
+from crud.services.cache_service import CacheService
 from crud.services.interest_service import InterestService
+from crud.services.matches_service import interest_engine
+from crud.services.profile_card_service import ProfileCardService
+from crud.services.suggestion_queue_service import SuggestionQueueService
+from utils import json_response
 
 router = APIRouter(
     prefix=settings.api.v1.interests,
@@ -22,13 +27,29 @@ router = APIRouter(
 
 @router.get("/popular", response_model=PaginatedResponse[InterestRead])
 async def get_popular_interests(
+    request: Request,
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     session: AsyncSession = Depends(db_helper.session_getter),
 ):
     """Получить популярные интересы"""
-    items, total = await InterestService.get_popular_interests(session, limit, offset)
-    return PaginatedResponse(items=items, total=total, limit=limit, offset=offset)
+    cache_key = ("interests", "popular", limit, offset)
+    body = await CacheService.get_raw(*cache_key)
+    if body is None:
+        items, total = await InterestService.get_popular_interests(
+            session, limit, offset
+        )
+        body = (
+            PaginatedResponse[InterestRead](
+                items=items, total=total, limit=limit, offset=offset
+            )
+            .model_dump_json()
+            .encode()
+        )
+        await CacheService.set_raw(
+            body, *cache_key, ttl=settings.cache.popular_interests_ttl
+        )
+    return json_response(request, body)
 
 
 @router.get("/search", response_model=PaginatedResponse[InterestRead])
@@ -72,6 +93,10 @@ async def update_my_interests(
         interests = await InterestService.update_user_interests(
             session, user, interests_data.interests
         )
+        await ProfileCardService.invalidate(user.id)
+        await CacheService.invalidate_suggestions(user.id)
+        await SuggestionQueueService.drop(user.id)
+        interest_engine.mark_stale(user.id)
 
         return UserInterestsResponse(interests=interests, count=len(interests))
     except ValueError as e:
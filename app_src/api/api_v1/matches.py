@@ -1,3 +1,6 @@
+import functools
+
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from slowapi import Limiter
 from slowapi.util import get_remote_address
@@ -5,22 +8,75 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.config import settings
 from core.models import User, db_helper
-from core.schemas.match import MatchResponse
+from core.schemas.match import (
+    MatchInboxItem,
+    MatchResponse,
+    SwipeBatchRequest,
+    SwipeBatchResponse,
+)
 from core.schemas.pagination import PaginatedResponse
 from core.schemas.user import UserRead
 from crud.services.cache_service import CacheService
 from crud.services.matches_service import MatchingService
+from crud.services.profile_card_service import ProfileCardService
+from crud.services.suggestion_queue_service import SuggestionQueueService
+from utils import json_response
 
 from .fastapi_users import current_user
 
 limiter = Limiter(key_func=get_remote_address)
 
+CURSOR_DESCRIPTION = (
+    "Keyset pagination: pass an empty value for the first page, then "
+    "next_cursor from the previous response. Offset is ignored."
+)
+
 router = APIRouter(
     prefix=settings.api.v1.matches,
     tags=["Matches"],
 )
 
 
+async def _suggestion_page(
+    user: User, limit: int, offset: int, cursor: str | None
+) -> bytes:
+    """
+    Compute a suggestions page as cached: the ordered IDs of the suggested
+    users, whose cards are cached separately by ``ProfileCardService``.
+
+    Opens its own session, since a stale page is refreshed in the
+    background after the request is done.
+    """
+    next_cursor = None
+    async with db_helper.session_factory() as session:
+        if cursor is None:
+            items, total = await SuggestionQueueService.get_page(
+                session=session,
+                user=user,
+                limit=limit,
+                offset=offset,
+            )
+        else:
+            offset = 0
+            items, total, next_cursor = await MatchingService.find_matches_by_cursor(
+                session=session,
+                user=user,
+                limit=limit,
+                cursor=cursor,
+            )
+        # The users are loaded already, so their cards come for free
+        await ProfileCardService.store(items)
+    return orjson.dumps(
+        {
+            "ids": [item.id for item in items],
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "next_cursor": next_cursor,
+        }
+    )
+
+
 @router.get(
     "/suggestion",
     response_model=PaginatedResponse[UserRead],
@@ -32,30 +88,56 @@ async def suggest_matches(
     request: Request,
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
     user: User = Depends(current_user),
     session: AsyncSession = Depends(db_helper.session_getter),
 ):
     """Get potential matches for the current user."""
-    cached = await CacheService.get_json("suggestions", user.id, limit, offset)
-    if cached is not None:
-        return cached
+    compute = functools.partial(_suggestion_page, user, limit, offset, cursor)
+    if cursor is None:
+        cache_key = await CacheService.suggestions_key(user.id, limit, offset)
+    else:
+        cache_key = await CacheService.suggestions_key(user.id, limit, "cursor", cursor)
+
+    try:
+        if cache_key is None:
+            page = await compute()
+        else:
+            page = await CacheService.get_or_compute(
+                compute,
+                *cache_key,
+                ttl=settings.cache.suggestions_ttl,
+                soft_ttl=settings.cache.suggestions_soft_ttl,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    page = orjson.loads(page)
+    cards = await ProfileCardService.get_cards(session, page.pop("ids"))
+    # Cards were validated as UserRead when they were rendered
+    return json_response(request, orjson.dumps({"items": cards, **page}))
+
 
-    items, total = await MatchingService.find_matches_by_interests_and_rating(
+@router.post(
+    "/batch",
+    response_model=SwipeBatchResponse,
+    summary="Like or pass on several users",
+    description="Apply an ordered list of like/pass actions in one transaction",
+)
+@limiter.limit(settings.rate_limit.swipe_batch)
+async def swipe_batch(
+    request: Request,
+    batch: SwipeBatchRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(db_helper.session_getter),
+):
+    """Like or pass on several users at once."""
+    results = await MatchingService.process_swipes(
         session=session,
         user=user,
-        limit=limit,
-        offset=offset,
-    )
-    response = PaginatedResponse(items=items, total=total, limit=limit, offset=offset)
-    await CacheService.set_json(
-        response.model_dump(mode="json"),
-        "suggestions",
-        user.id,
-        limit,
-        offset,
-        ttl=settings.cache.suggestions_ttl,
+        actions=[(item.action, item.user_id) for item in batch.actions],
     )
-    return response
+    return SwipeBatchResponse(results=results)
 
 
 @router.post(
@@ -86,6 +168,30 @@ async def like_user(
     return result
 
 
+@router.post(
+    "/{passed_user_id}/pass",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Pass on a user",
+    description="Skip a suggested user so they are not suggested again",
+)
+@limiter.limit(settings.rate_limit.like)
+async def pass_user(
+    request: Request,
+    passed_user_id: int,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(db_helper.session_getter),
+):
+    """Pass on a suggested user without liking them."""
+    try:
+        await MatchingService.process_pass(
+            session=session,
+            user=user,
+            passed_user_id=passed_user_id,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
 @router.get(
     "",
     response_model=PaginatedResponse[MatchResponse],
@@ -95,14 +201,53 @@ async def like_user(
 async def get_matches(
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
     user: User = Depends(current_user),
     session: AsyncSession = Depends(db_helper.session_getter),
 ):
     """Get all matches for the current user."""
-    items, total = await MatchingService.get_user_matches(
+    if cursor is None:
+        items, total = await MatchingService.get_user_matches(
+            session=session,
+            user_id=user.id,
+            limit=limit,
+            offset=offset,
+        )
+        return PaginatedResponse(items=items, total=total, limit=limit, offset=offset)
+
+    try:
+        items, total, next_cursor = await MatchingService.get_user_matches_by_cursor(
+            session=session,
+            user_id=user.id,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return PaginatedResponse(
+        items=items, total=total, limit=limit, offset=0, next_cursor=next_cursor
+    )
+
+
+@router.get(
+    "/inbox",
+    response_model=PaginatedResponse[MatchInboxItem],
+    summary="Get user matches with their last messages",
+    description="Matches by last activity, with a preview of the latest message and the unread count of each",
+)
+async def get_inbox(
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(db_helper.session_getter),
+):
+    """Get the matches of the current user as a chat inbox."""
+    items, total = await MatchingService.get_user_inbox(
         session=session,
         user_id=user.id,
         limit=limit,
         offset=offset,
     )
-    return PaginatedResponse(items=items, total=total, limit=limit, offset=offset)
+    return PaginatedResponse[MatchInboxItem](
+        items=items, total=total, limit=limit, offset=offset
+    )
@@ -12,6 +12,7 @@ from core.schemas.block import BlockResponse
 from core.schemas.report import ReportCreate, ReportResponse
 from core.schemas.user import UserRead, UserUpdate
 from crud.services.block_report_service import BlockReportService
+from crud.services.profile_card_service import ProfileCardService
 
 from .fastapi_users import current_user, fastapi_users
 
@@ -80,6 +81,7 @@ async def upload_user_photo(
     user.photo = token_name
     session.add(user)
     await session.commit()
+    await ProfileCardService.invalidate(user.id)
     return schemas.model_validate(UserRead, user)
 
 
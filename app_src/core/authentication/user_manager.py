@@ -1,6 +1,6 @@
 import logging
 import re
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 from fastapi import HTTPException
 from fastapi_users import BaseUserManager, IntegerIDMixin
@@ -8,6 +8,10 @@ from fastapi_users import BaseUserManager, IntegerIDMixin
 from core.config import settings
 from core.models.user import User
 from core.types.user_id import UserIdType
+from crud.services.cache_service import CacheService
+from crud.services.matches_service import interest_engine
+from crud.services.profile_card_service import ProfileCardService
+from crud.services.suggestion_queue_service import SuggestionQueueService
 
 if TYPE_CHECKING:
     from fastapi import Request
@@ -95,6 +99,18 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, UserIdType]):
             user.id,
         )
 
+    async def on_after_update(
+        self,
+        user: User,
+        update_dict: dict[str, Any],
+        request: Optional["Request"] = None,
+    ):
+        await ProfileCardService.invalidate(user.id)
+        # Gender and interests change who the user is matched with
+        await CacheService.invalidate_suggestions(user.id)
+        await SuggestionQueueService.drop(user.id)
+        interest_engine.mark_stale(user.id)
+
     async def on_after_forgot_password(
         self,
         user: User,
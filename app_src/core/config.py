@@ -74,6 +74,7 @@ class RateLimitConfig(BaseModel):
     auth_login: str = "5/minute"
     auth_register: str = "3/hour"
     like: str = "30/minute"
+    swipe_batch: str = "10/minute"
     suggestion: str = "20/minute"
 
 
@@ -86,7 +87,78 @@ class CorsConfig(BaseModel):
 
 class CacheConfig(BaseModel):
     suggestions_ttl: int = 300  # 5 minutes
+    suggestions_soft_ttl: int = 60  # served stale after this while refreshing
     prefix: str = "dating"
+    lock_ttl: int = 10  # single-flight lock on a key being computed
+    lock_wait: float = 3.0  # how long to wait for another worker's result
+    # In-process tier in front of Redis, per worker
+    local_enabled: bool = True
+    local_max_bytes: int = 32 * 1024 * 1024
+    local_ttl: int = 10
+    popular_interests_ttl: int = 300
+    cards_ttl: int = 3600  # rendered profiles, dropped on every profile change
+    # Encoding of cached JSON values; msgpack, zstd and lz4 need the
+    # "cache" extra. Values shorter than compress_min_bytes stay as they are
+    codec: Literal["orjson", "msgpack"] = "orjson"
+    compression: Literal["none", "zstd", "lz4"] = "none"
+    compress_min_bytes: int = 1024
+    blocks_ttl: int = 86400  # 1 day
+    blocks_local_size: int = 10_000  # users kept in the in-process LRU
+    blocks_local_ttl: int = 30  # block changes from other workers show up after this
+
+
+class MatchingConfig(BaseModel):
+    queue_size: int = 500  # candidates precomputed per user
+    queue_ttl: int = 3600  # 1 hour
+    queue_refill_threshold: int = 50  # rebuild when fewer remain after a page
+    queue_lock_ttl: int = 30
+    seen_ttl: int = 2592000  # 30 days, passed profiles resurface afterwards
+    # "bitset" ranks in memory with NumPy (optional dependency)
+    engine: Literal["sql", "bitset"] = "sql"
+    engine_metric: Literal["overlap", "jaccard"] = "overlap"
+    engine_sync_interval: int = 60
+    engine_load_batch_size: int = 10_000
+
+
+class RatingConfig(BaseModel):
+    # Buffer likes in Redis and apply them to users.rating in batches
+    write_behind: bool = True
+    flush_interval: int = 5  # seconds
+    flush_batch_size: int = 1000
+
+
+class ChatConfig(BaseModel):
+    # A socket that does not take a message within this is disconnected
+    send_timeout: float = 5.0
+    # Messages waiting per match; the oldest are dropped beyond this
+    max_pending: int = 1000
+    # "channel" subscribes to every open chat; "shard" hashes chats onto
+    # `shards` channels, bounding subscriptions per worker. Every worker
+    # must use the same routing
+    routing: Literal["channel", "shard"] = "channel"
+    shards: int = 64
+    # "pubsub" is fire-and-forget; "stream" appends every chat to a Redis
+    # Stream so a reconnecting client resumes from the last ID it saw
+    transport: Literal["pubsub", "stream"] = "pubsub"
+    stream_maxlen: int = 1000  # entries kept per chat, approximately
+    stream_ttl: int = 86400  # 1 day after a chat's last message
+    stream_block_ms: int = 5000
+    # Group commit: messages from all sockets are buffered for up to
+    # write_max_delay seconds (or write_batch_size messages) and inserted
+    # together
+    write_batching: bool = True
+    write_batch_size: int = 200
+    write_max_delay: float = 0.005
+
+
+class UnreadConfig(BaseModel):
+    # Keep per-match unread counts in a Redis hash per user; off computes
+    # them from the database on every request
+    counters: bool = True
+    ttl: int = 604800  # 1 week after a user's last change
+    # One worker at a time rewrites every counter hash from the database
+    reconcile_interval: int = 300  # seconds
+    reconcile_batch_size: int = 500  # users per query
 
 
 class AccessToken(BaseModel):
@@ -111,6 +183,10 @@ class Settings(BaseSettings):
     cors: CorsConfig = CorsConfig()
     rate_limit: RateLimitConfig = RateLimitConfig()
     cache: CacheConfig = CacheConfig()
+    matching: MatchingConfig = MatchingConfig()
+    rating: RatingConfig = RatingConfig()
+    chat: ChatConfig = ChatConfig()
+    unread: UnreadConfig = UnreadConfig()
     SECRET_KEY: str = os.getenv("SECRET_KEY", "secret")
     REDIS_URL: str = "redis://localhost:6379"
     BOT_TOKEN: str = ""
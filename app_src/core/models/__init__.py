@@ -4,11 +4,14 @@ __all__ = (
     "User",
     "Match",
     "Message",
+    "ReadCursor",
     "Block",
     "Report",
     "AccessToken",
     "GenderEnum",
     "ReportReasonEnum",
+    "SwipeActionEnum",
+    "SwipeStatusEnum",
     "Interest",
     "user_interests",
 )
@@ -18,9 +21,10 @@ from .associations import user_interests
 from .base import Base
 from .block import Block
 from .db_helper import db_helper
-from .enums import GenderEnum, ReportReasonEnum
+from .enums import GenderEnum, ReportReasonEnum, SwipeActionEnum, SwipeStatusEnum
 from .interest import Interest
 from .match import Match
 from .message import Message
+from .read_cursor import ReadCursor
 from .report import Report
 from .user import User
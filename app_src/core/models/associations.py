@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, Table
+from sqlalchemy import Column, ForeignKey, Index, Integer, Table
 
 from .base import Base
 
@@ -15,4 +15,6 @@ user_interests = Table(
         ForeignKey("interests.id", ondelete="CASCADE"),
         primary_key=True,
     ),
+    # Users sharing an interest (suggestion overlap, popular interests)
+    Index("ix_user_interests_interest_id_user_id", "interest_id", "user_id"),
 )
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, UniqueConstraint, func
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.types.user_id import UserIdType
@@ -14,7 +14,11 @@ if TYPE_CHECKING:
 
 
 class Block(Base, IntIdPkMixin):
-    __table_args__ = (UniqueConstraint("user_id", "blocked_user_id"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "blocked_user_id"),
+        # Users who blocked someone (the reverse direction of block checks)
+        Index("ix_blocks_blocked_user_id_user_id", "blocked_user_id", "user_id"),
+    )
 
     user_id: Mapped[UserIdType] = mapped_column(
         ForeignKey(
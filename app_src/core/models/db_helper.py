@@ -1,5 +1,6 @@
 from collections.abc import AsyncGenerator
 
+from prometheus_client import Gauge
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -9,6 +10,10 @@ from sqlalchemy.ext.asyncio import (
 
 from core.config import settings
 
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Database connections checked out of the pool"
+)
+
 
 class DatabaseHelper:
     def __init__(
@@ -48,3 +53,4 @@ db_helper = DatabaseHelper(
     pool_size=settings.db.pool_size,
     max_overflow=settings.db.max_overflow,
 )
+DB_POOL_CHECKED_OUT.set_function(db_helper.engine.pool.checkedout)
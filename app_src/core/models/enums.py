@@ -11,3 +11,16 @@ class ReportReasonEnum(str, Enum):
     FAKE = "Fake"
     HARASSMENT = "Harassment"
     INAPPROPRIATE_CONTENT = "Inappropriate Content"
+
+
+class SwipeActionEnum(str, Enum):
+    LIKE = "like"
+    PASS = "pass"
+
+
+class SwipeStatusEnum(str, Enum):
+    LIKED = "liked"
+    MUTUAL = "mutual"
+    ALREADY_LIKED = "already_liked"
+    PASSED = "passed"
+    REJECTED = "rejected"
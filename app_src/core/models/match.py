@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.types.user_id import UserIdType
@@ -14,6 +14,15 @@ if TYPE_CHECKING:
 
 
 class Match(Base, IntIdPkMixin):
+    __table_args__ = (
+        # One like per direction, target of the like upsert
+        UniqueConstraint("user_id", "matched_user_id"),
+        # Keyset pagination of a user's matches
+        Index("ix_matchs_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Likes received, and ON DELETE CASCADE from users
+        Index("ix_matchs_matched_user_id_user_id", "matched_user_id", "user_id"),
+    )
+
     user_id: Mapped[UserIdType] = mapped_column(
         ForeignKey(
             "users.id",
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, Text, func
+from sqlalchemy import ForeignKey, Index, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.types.user_id import UserIdType
@@ -10,6 +10,16 @@ from .mixins.int_id_pk import IntIdPkMixin
 
 
 class Message(Base, IntIdPkMixin):
+    __table_args__ = (
+        # Keyset pagination of chat history, and unread messages as the
+        # range above a read cursor
+        Index("ix_messages_match_id_id", "match_id", "id"),
+        # Offset pagination of chat history
+        Index("ix_messages_match_id_created_at", "match_id", "created_at"),
+        # ON DELETE CASCADE from users
+        Index("ix_messages_sender_id", "sender_id"),
+    )
+
     match_id: Mapped[int] = mapped_column(
         ForeignKey("matchs.id", ondelete="CASCADE"),
         nullable=False,
@@ -22,9 +32,6 @@ class Message(Base, IntIdPkMixin):
         Text,
         nullable=False,
     )
-    is_read: Mapped[bool] = mapped_column(
-        default=False,
-    )
     created_at: Mapped[datetime] = mapped_column(
         server_default=func.now(),
     )
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.types.user_id import UserIdType
+
+from .base import Base
+
+
+class ReadCursor(Base):
+    """The last message a participant has read in a match."""
+
+    __table_args__ = (
+        # ON DELETE CASCADE from users
+        Index("ix_read_cursors_user_id", "user_id"),
+    )
+
+    match_id: Mapped[int] = mapped_column(
+        ForeignKey("matchs.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    user_id: Mapped[UserIdType] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # Messages of the match with a higher id are unread
+    last_read_message_id: Mapped[int] = mapped_column(
+        default=0,
+        server_default="0",
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
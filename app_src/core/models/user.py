@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import TYPE_CHECKING
 
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTable, SQLAlchemyUserDatabase
-from sqlalchemy import BigInteger, Enum, Integer, String, func
+from sqlalchemy import BigInteger, Enum, Index, Integer, String, func, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from core.types.user_id import UserIdType
@@ -18,6 +18,19 @@ if TYPE_CHECKING:
 
 
 class User(Base, IntIdPkMixin, SQLAlchemyBaseUserTable[UserIdType]):
+    __table_args__ = (
+        # Candidate filter and rating order of suggestions (scanned backwards),
+        # also serves keyset pagination past the interest overlap
+        Index(
+            "ix_users_gender_rating_created_at_id",
+            "gender",
+            "rating",
+            "created_at",
+            "id",
+            postgresql_where=text("is_active"),
+        ),
+    )
+
     created_at: Mapped[datetime] = mapped_column(
         server_default=func.now(),
         nullable=False,
@@ -72,10 +85,6 @@ class User(Base, IntIdPkMixin, SQLAlchemyBaseUserTable[UserIdType]):
             for interest in self.interests
         )
 
-    def increment_rating(self) -> None:
-        """Увеличить рейтинг пользователя"""
-        self.rating += 1
-
     def decrement_rating(self) -> None:
         """Уменьшить рейтинг пользователя"""
         self.rating = max(0, self.rating - 1)
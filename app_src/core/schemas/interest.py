@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -11,7 +13,7 @@ class InterestCreate(InterestBase):
 
 class InterestRead(InterestBase):
     id: int
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
@@ -1,7 +1,12 @@
-from pydantic import BaseModel
+from datetime import datetime
 
+from pydantic import BaseModel, Field
+
+from core.models.enums import SwipeActionEnum, SwipeStatusEnum
 from core.types.user_id import UserIdType
 
+from .user import UserRead
+
 
 class MatchResponse(BaseModel):
     id: int
@@ -9,6 +14,42 @@ class MatchResponse(BaseModel):
     matched_user_id: UserIdType
     is_mutual: bool
 
+    class Config:
+        from_attributes = True
+
+
+class MessagePreview(BaseModel):
+    text: str = Field(..., description="Start of the message text")
+    sender_id: UserIdType
+    created_at: datetime
+
+
+class MatchInboxItem(MatchResponse):
+    matched_user: UserRead
+    last_message: MessagePreview | None = None
+    unread_count: int = 0
+
 
 class MatchCreate(BaseModel):
     matched_user_id: UserIdType
+
+
+class SwipeAction(BaseModel):
+    user_id: UserIdType
+    action: SwipeActionEnum
+
+
+class SwipeBatchRequest(BaseModel):
+    actions: list[SwipeAction] = Field(..., min_length=1, max_length=50)
+
+
+class SwipeResult(BaseModel):
+    user_id: UserIdType
+    action: SwipeActionEnum
+    status: SwipeStatusEnum
+    match: MatchResponse | None = None
+    detail: str | None = None
+
+
+class SwipeBatchResponse(BaseModel):
+    results: list[SwipeResult]
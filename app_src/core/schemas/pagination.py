@@ -10,3 +10,5 @@ class PaginatedResponse(BaseModel, Generic[T]):
     total: int
     limit: int
     offset: int
+    # Set in cursor mode; pass back as ?cursor= to fetch the next page
+    next_cursor: str | None = None
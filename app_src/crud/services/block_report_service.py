@@ -1,13 +1,39 @@
-from sqlalchemy import and_, select
+import logging
+import time
+from collections import OrderedDict
+
+import redis.asyncio as redis
+from sqlalchemy import ColumnElement, Exists, and_, case, exists, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import settings
 from core.models import Block, Report
 from core.models.enums import ReportReasonEnum
 from core.types.user_id import UserIdType
+from crud.services.cache_service import CacheService
+from crud.services.suggestion_queue_service import SuggestionQueueService
+
+logger = logging.getLogger(__name__)
 
 
 class BlockReportService:
-    """Service class for handling block and report operations."""
+    """
+    Service class for handling block and report operations.
+
+    The IDs a user blocked or is blocked by (the block set) are cached in
+    a Redis set per user and in an in-process LRU in front of it. Both are
+    updated in place by ``block_user`` and ``unblock_user``, which also
+    tell the other workers to drop their LRU entries. Should that message
+    be lost, an entry still expires after
+    ``settings.cache.blocks_local_ttl``.
+    """
+
+    # Marks a Redis block set as fully loaded. A set without it was only
+    # touched by block_user and is reloaded from the database.
+    _LOADED = "*"
+
+    # user ID -> (monotonic expiry, block set), least recently used first
+    _local: OrderedDict[UserIdType, tuple[float, frozenset[UserIdType]]] = OrderedDict()
 
     @staticmethod
     async def block_user(
@@ -25,6 +51,12 @@ class BlockReportService:
         block = Block(user_id=user_id, blocked_user_id=blocked_user_id)
         session.add(block)
         await session.commit()
+
+        await BlockReportService._update_block_sets(
+            user_id, blocked_user_id, blocked=True
+        )
+        await SuggestionQueueService.remove(user_id, blocked_user_id)
+        await SuggestionQueueService.remove(blocked_user_id, user_id)
         return block
 
     @staticmethod
@@ -39,6 +71,15 @@ class BlockReportService:
         await session.delete(block)
         await session.commit()
 
+        # The pair stays blocked if the other user blocked back
+        if not await BlockReportService.get_block(session, blocked_user_id, user_id):
+            await BlockReportService._update_block_sets(
+                user_id, blocked_user_id, blocked=False
+            )
+
+        # Rebuild both queues so the users can be suggested to each other again
+        await SuggestionQueueService.drop(user_id, blocked_user_id)
+
     @staticmethod
     async def get_block(
         session: AsyncSession, user_id: UserIdType, blocked_user_id: UserIdType
@@ -63,21 +104,152 @@ class BlockReportService:
         return list(result.scalars().all())
 
     @staticmethod
-    async def get_blocked_user_ids(
+    async def _load_blocked_user_ids(
         session: AsyncSession, user_id: UserIdType
     ) -> list[UserIdType]:
-        """Get list of blocked user IDs (both directions)."""
+        """Query IDs of users blocked by or blocking ``user_id``."""
+        other_user_id = case(
+            (Block.user_id == user_id, Block.blocked_user_id),
+            else_=Block.user_id,
+        )
         result = await session.execute(
-            select(Block.blocked_user_id).where(Block.user_id == user_id)
+            select(other_user_id)
+            .where(
+                or_(
+                    Block.user_id == user_id,
+                    Block.blocked_user_id == user_id,
+                )
+            )
+            .distinct()
         )
-        blocked_by_me = list(result.scalars().all())
+        return list(result.scalars().all())
 
-        result = await session.execute(
-            select(Block.user_id).where(Block.blocked_user_id == user_id)
+    @classmethod
+    def _blocks_key(cls, user_id: UserIdType) -> str:
+        return CacheService._make_key("blocks", user_id)
+
+    @classmethod
+    def _remember(cls, user_id: UserIdType, ids: frozenset[UserIdType]) -> None:
+        cls._local[user_id] = (time.monotonic() + settings.cache.blocks_local_ttl, ids)
+        cls._local.move_to_end(user_id)
+        while len(cls._local) > settings.cache.blocks_local_size:
+            cls._local.popitem(last=False)
+
+    @classmethod
+    async def get_blocked_user_ids(
+        cls, session: AsyncSession, user_id: UserIdType
+    ) -> frozenset[UserIdType]:
+        """
+        Get IDs of users blocked by or blocking ``user_id``.
+
+        Served from the in-process LRU, then the Redis set, then the
+        database. Loading into Redis only ever adds members, so a block
+        committed meanwhile is never lost; a member left behind by a racing
+        unblock errs on the blocked side and expires with the key.
+        """
+        entry = cls._local.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            cls._local.move_to_end(user_id)
+            return entry[1]
+
+        key = cls._blocks_key(user_id)
+        try:
+            r = await CacheService.get_redis()
+            members = await r.smembers(key)
+        except redis.RedisError:
+            logger.warning("Block set read error", exc_info=True)
+            members = set()
+
+        if cls._LOADED in members:
+            ids = frozenset(int(m) for m in members if m != cls._LOADED)
+        else:
+            ids = frozenset(await cls._load_blocked_user_ids(session, user_id))
+            try:
+                r = await CacheService.get_redis()
+                async with r.pipeline(transaction=False) as pipe:
+                    pipe.sadd(key, cls._LOADED, *ids)
+                    pipe.expire(key, settings.cache.blocks_ttl)
+                    await pipe.execute()
+            except redis.RedisError:
+                logger.warning("Block set write error", exc_info=True)
+
+        cls._remember(user_id, ids)
+        return ids
+
+    @classmethod
+    async def is_blocked(
+        cls, session: AsyncSession, user_id: UserIdType, other_id: UserIdType
+    ) -> bool:
+        """Check if either user blocked the other, from the cached block set."""
+        return other_id in await cls.get_blocked_user_ids(session, user_id)
+
+    @classmethod
+    async def _update_block_sets(
+        cls, user_id: UserIdType, other_id: UserIdType, *, blocked: bool
+    ) -> None:
+        """Add or remove the pair in both users' cached block sets."""
+        pairs = ((user_id, other_id), (other_id, user_id))
+        for owner, member in pairs:
+            entry = cls._local.get(owner)
+            if entry is not None:
+                expires, ids = entry
+                ids = ids | {member} if blocked else ids - {member}
+                cls._local[owner] = (expires, ids)
+
+        try:
+            r = await CacheService.get_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                for owner, member in pairs:
+                    key = cls._blocks_key(owner)
+                    if blocked:
+                        pipe.sadd(key, member)
+                    else:
+                        pipe.srem(key, member)
+                    pipe.expire(key, settings.cache.blocks_ttl)
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Block set write error", exc_info=True)
+        await CacheService.publish_invalidation(
+            *(cls._blocks_key(owner) for owner, _ in pairs)
+        )
+
+    @classmethod
+    def _forget(cls, key: str | None) -> None:
+        """Drop the LRU entry of a block set changed by another worker."""
+        if key is None:
+            cls._local.clear()
+        else:
+            cls._local.pop(int(key.rsplit(":", 1)[1]), None)
+
+    @staticmethod
+    def blocked(
+        user_id: UserIdType, other_id: UserIdType | ColumnElement[UserIdType]
+    ) -> Exists:
+        """EXISTS clause that is true if either user blocked the other."""
+        return exists().where(
+            or_(
+                and_(
+                    Block.user_id == user_id,
+                    Block.blocked_user_id == other_id,
+                ),
+                and_(
+                    Block.user_id == other_id,
+                    Block.blocked_user_id == user_id,
+                ),
+            )
         )
-        blocked_me = list(result.scalars().all())
 
-        return list(set(blocked_by_me + blocked_me))
+    @staticmethod
+    def not_blocked(
+        user_id: UserIdType, candidate_id: ColumnElement[UserIdType]
+    ) -> ColumnElement[bool]:
+        """
+        Anti-join clause excluding candidates blocked in either direction.
+
+        Lets queries filter blocks in SQL instead of fetching the blocked
+        IDs first.
+        """
+        return ~BlockReportService.blocked(user_id, candidate_id)
 
     @staticmethod
     async def report_user(
@@ -100,3 +272,6 @@ class BlockReportService:
         session.add(report)
         await session.commit()
         return report
+
+
+CacheService.on_invalidate("blocks", BlockReportService._forget)
@@ -1,17 +1,67 @@
+import asyncio
+import contextlib
+import functools
 import json
 import logging
+import struct
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Mapping
 
 import redis.asyncio as redis
+from prometheus_client import Counter, Gauge
 
 from core.config import settings
+from utils import cache_codec
 
 logger = logging.getLogger(__name__)
 
+LOCAL_CACHE_REQUESTS = Counter(
+    "cache_local_requests_total",
+    "In-process cache lookups",
+    ["namespace", "result"],
+)
+LOCAL_CACHE_BYTES = Gauge("cache_local_bytes", "Size of in-process cache entries")
+
+# Parts of a cache key, as passed to get_json/set_json
+CacheKey = tuple[str | int, ...]
+
 
 class CacheService:
-    """Service for caching data in Redis."""
+    """
+    Service for caching data in Redis.
+
+    Values are stored as bytes and also kept in a bounded in-process LRU
+    (the local tier, ``settings.cache.local_*``) for up to ``local_ttl``
+    seconds. Endpoints can cache serialized responses with ``get_raw``/
+    ``set_raw`` or ``get_or_compute`` and return them as they are.
+    JSON values are encoded with ``settings.cache.codec`` and large values
+    are compressed in Redis (see ``utils.cache_codec``); the local tier
+    keeps them uncompressed.
+    ``invalidate`` broadcasts over Redis pub/sub so every worker drops its
+    local copy; other services register handlers with ``on_invalidate``
+    to drop their own in-process state the same way.
+    """
 
     _redis: redis.Redis | None = None
+    _binary_redis: redis.Redis | None = None
+
+    # key -> (monotonic expiry, value), least recently used first
+    _local: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+    _local_bytes = 0
+    # namespace -> handler called with invalidated keys (None: drop everything)
+    _invalidation_handlers: dict[str, Callable[[str | None], None]] = {}
+    _worker_id = uuid.uuid4().hex
+    _listener_task: asyncio.Task | None = None
+
+    # Computations in flight in this process, by cache key
+    _inflight: dict[str, asyncio.Task] = {}
+    _refreshing: set[str] = set()
+    _tasks: set[asyncio.Task] = set()
+    _POLL_INTERVAL = 0.05
+    # get_or_compute entries start with their soft expiry (Unix time)
+    _FRESH_UNTIL = struct.Struct(">d")
 
     @classmethod
     async def get_redis(cls) -> redis.Redis:
@@ -22,11 +72,24 @@ class CacheService:
             )
         return cls._redis
 
+    @classmethod
+    async def get_binary_redis(cls) -> redis.Redis:
+        """Client returning raw bytes, for values that are not UTF-8 text."""
+        if cls._binary_redis is None:
+            cls._binary_redis = redis.from_url(settings.REDIS_URL)
+        return cls._binary_redis
+
     @classmethod
     async def close(cls) -> None:
+        if cls._listener_task is not None:
+            cls._listener_task.cancel()
+            cls._listener_task = None
         if cls._redis is not None:
             await cls._redis.close()
             cls._redis = None
+        if cls._binary_redis is not None:
+            await cls._binary_redis.close()
+            cls._binary_redis = None
 
     @classmethod
     def _make_key(cls, *parts: str | int) -> str:
@@ -34,41 +97,563 @@ class CacheService:
 
     @classmethod
     async def get_json(cls, *key_parts: str | int) -> dict | list | None:
-        try:
-            r = await cls.get_redis()
-            data = await r.get(cls._make_key(*key_parts))
-            if data is not None:
-                return json.loads(data)
-        except redis.RedisError:
-            logger.warning("Redis read error", exc_info=True)
-        return None
+        plain = await cls._read(cls._make_key(*key_parts))
+        return None if plain is None else cls._decode_json(plain)
 
     @classmethod
     async def set_json(
         cls, value: dict | list, *key_parts: str | int, ttl: int | None = None
     ) -> None:
+        plain = cache_codec.encode(value, settings.cache.codec)
+        await cls._write(cls._make_key(*key_parts), plain, ttl)
+
+    @classmethod
+    async def mget_json(
+        cls, keys: Iterable[CacheKey]
+    ) -> tuple[dict[CacheKey, dict | list], list[CacheKey]]:
+        """
+        Get many JSON values in one round trip.
+
+        Returns the values found, by key parts, and the keys that were
+        missed, in request order, so callers can backfill only those. On a
+        Redis error every key not held locally is a miss.
+        """
+        keys = list(keys)
+        plains: dict[CacheKey, bytes] = {}
+        remote: list[CacheKey] = []
+        for parts in keys:
+            plain = cls._local_get(cls._make_key(*parts))
+            if plain is None:
+                remote.append(parts)
+            else:
+                plains[parts] = plain
+
+        if remote:
+            try:
+                r = await cls.get_binary_redis()
+                replies = await r.mget([cls._make_key(*parts) for parts in remote])
+            except redis.RedisError:
+                logger.warning("Redis read error", exc_info=True)
+                replies = [None] * len(remote)
+            for parts, stored in zip(remote, replies, strict=True):
+                plain = cls._load(cls._make_key(*parts), stored)
+                if plain is not None:
+                    plains[parts] = plain
+
+        found = {}
+        for parts, plain in plains.items():
+            value = cls._decode_json(plain)
+            if value is not None:
+                found[parts] = value
+        return found, [parts for parts in keys if parts not in found]
+
+    @classmethod
+    async def mset_json(
+        cls,
+        values: Mapping[CacheKey, dict | list],
+        ttl: int | Mapping[CacheKey, int] | None = None,
+    ) -> None:
+        """Set many JSON values in one round trip; ``ttl`` may be per key."""
+        async with cls.pipeline() as pipe:
+            for parts, value in values.items():
+                key_ttl = ttl.get(parts) if isinstance(ttl, Mapping) else ttl
+                pipe.set_json(value, *parts, ttl=key_ttl)
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def pipeline(
+        cls, transaction: bool = False
+    ) -> AsyncIterator["CachePipeline"]:
+        """
+        Queue cache operations and send them in one round trip on exit::
+
+            async with CacheService.pipeline() as pipe:
+                pipe.get_json("cards", 1)
+                pipe.set_json(card, "cards", 2, ttl=60)
+            card_1, _ = pipe.results
+
+        With ``transaction`` the operations run atomically in MULTI/EXEC.
+        Nothing is sent if the block raises.
+        """
+        pipe = CachePipeline(transaction)
+        yield pipe
+        await pipe.execute()
+
+    @classmethod
+    async def get_raw(cls, *key_parts: str | int) -> bytes | None:
+        """Get bytes stored with ``set_raw``, e.g. a serialized response body."""
+        return await cls._read_raw(cls._make_key(*key_parts))
+
+    @classmethod
+    async def set_raw(
+        cls, data: bytes, *key_parts: str | int, ttl: int | None = None
+    ) -> None:
+        await cls._write_raw(cls._make_key(*key_parts), data, ttl)
+
+    @classmethod
+    async def _read_raw(cls, key: str) -> bytes | None:
+        plain = await cls._read(key)
+        return None if plain is None else cls._decode_raw(plain)
+
+    @classmethod
+    async def _write_raw(cls, key: str, data: bytes, ttl: int | None) -> None:
+        await cls._write(key, cache_codec.RAW + data, ttl)
+
+    @staticmethod
+    def _decode_json(plain: bytes) -> dict | list | None:
         try:
-            r = await cls.get_redis()
-            key = cls._make_key(*key_parts)
-            await r.set(key, json.dumps(value, default=str), ex=ttl)
+            return cache_codec.decode(plain)
+        except ValueError:
+            logger.warning("Unreadable cache value", exc_info=True)
+            return None
+
+    @staticmethod
+    def _decode_raw(plain: bytes) -> bytes | None:
+        return plain[1:] if plain[:1] == cache_codec.RAW else None
+
+    @classmethod
+    async def _read(cls, key: str) -> bytes | None:
+        plain = cls._local_get(key)
+        if plain is not None:
+            return plain
+        try:
+            r = await cls.get_binary_redis()
+            stored = await r.get(key)
+        except redis.RedisError:
+            logger.warning("Redis read error", exc_info=True)
+            return None
+        return cls._load(key, stored)
+
+    @classmethod
+    def _load(cls, key: str, stored: bytes | None) -> bytes | None:
+        """The plain value of a value read from Redis, kept locally."""
+        if stored is None:
+            return None
+        try:
+            plain = cache_codec.decompress(stored)
+        except Exception:
+            # Written by another app version or with a codec not installed here
+            logger.warning("Unreadable cache value", exc_info=True)
+            return None
+        cls._local_put(key, plain)
+        return plain
+
+    @staticmethod
+    def _compress(plain: bytes) -> bytes:
+        return cache_codec.compress(
+            plain, settings.cache.compression, settings.cache.compress_min_bytes
+        )
+
+    @classmethod
+    async def _write(cls, key: str, plain: bytes, ttl: int | None) -> None:
+        """Set a key, keeping it locally and dropping other workers' copies."""
+        try:
+            r = await cls.get_binary_redis()
+            await r.set(key, cls._compress(plain), ex=ttl)
         except redis.RedisError:
             logger.warning("Redis write error", exc_info=True)
+            # Without Redis other workers could not invalidate a local copy
+            cls._local_drop(key)
+            return
+        cls._local_put(key, plain)
+        await cls.publish_invalidation(key)
 
     @classmethod
-    async def delete_pattern(cls, *key_parts: str | int) -> None:
+    async def invalidate(cls, *key_parts: str | int) -> None:
+        """Delete a key along with every worker's local copy of it."""
+        key = cls._make_key(*key_parts)
+        cls._local_drop(key)
         try:
             r = await cls.get_redis()
-            pattern = cls._make_key(*key_parts) + "*"
-            cursor = 0
-            while True:
-                cursor, keys = await r.scan(cursor=cursor, match=pattern, count=100)
-                if keys:
-                    await r.delete(*keys)
-                if cursor == 0:
-                    break
+            await r.delete(key)
         except redis.RedisError:
             logger.warning("Redis delete error", exc_info=True)
+        await cls.publish_invalidation(key)
+
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(":", 2)[1]
+
+    @classmethod
+    def _local_get(cls, key: str) -> bytes | None:
+        if not settings.cache.local_enabled:
+            return None
+        entry = cls._local.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            cls._local_drop(key)
+            entry = None
+        LOCAL_CACHE_REQUESTS.labels(
+            cls._namespace(key), "miss" if entry is None else "hit"
+        ).inc()
+        if entry is None:
+            return None
+        cls._local.move_to_end(key)
+        return entry[1]
+
+    @classmethod
+    def _local_put(cls, key: str, data: bytes) -> None:
+        if not settings.cache.local_enabled:
+            return
+        cls._local_drop(key)
+        if len(data) > settings.cache.local_max_bytes:
+            return
+        while (
+            cls._local and cls._local_bytes + len(data) > settings.cache.local_max_bytes
+        ):
+            _, (_, evicted) = cls._local.popitem(last=False)
+            cls._local_bytes -= len(evicted)
+        cls._local[key] = (time.monotonic() + settings.cache.local_ttl, data)
+        cls._local_bytes += len(data)
+        LOCAL_CACHE_BYTES.set(cls._local_bytes)
+
+    @classmethod
+    def _local_drop(cls, key: str) -> None:
+        entry = cls._local.pop(key, None)
+        if entry is not None:
+            cls._local_bytes -= len(entry[1])
+            LOCAL_CACHE_BYTES.set(cls._local_bytes)
+
+    @classmethod
+    def _local_clear(cls) -> None:
+        cls._local.clear()
+        cls._local_bytes = 0
+        LOCAL_CACHE_BYTES.set(0)
+
+    @classmethod
+    def on_invalidate(
+        cls, namespace: str, handler: Callable[[str | None], None]
+    ) -> None:
+        """
+        Call ``handler`` with keys of ``namespace`` invalidated by other workers.
+
+        The handler gets None when messages may have been missed (the
+        listener reconnected) and all state of the namespace is suspect.
+        """
+        cls._invalidation_handlers[namespace] = handler
+
+    @classmethod
+    def _invalidation_channel(cls) -> str:
+        return cls._make_key("invalidate")
+
+    @classmethod
+    def _invalidation(cls, key: str) -> str:
+        return json.dumps({"key": key, "sender": cls._worker_id})
+
+    @classmethod
+    async def publish_invalidation(cls, *keys: str) -> None:
+        """Tell the other workers to drop their local state for ``keys``."""
+        try:
+            r = await cls.get_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.publish(cls._invalidation_channel(), cls._invalidation(key))
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Redis publish error", exc_info=True)
+
+    @classmethod
+    def _handle_invalidation(cls, message: str) -> None:
+        payload = json.loads(message)
+        if payload["sender"] == cls._worker_id:
+            return
+        key = payload["key"]
+        cls._local_drop(key)
+        handler = cls._invalidation_handlers.get(cls._namespace(key))
+        if handler is not None:
+            handler(key)
+
+    @classmethod
+    def start(cls) -> None:
+        """Start listening for invalidations from other workers."""
+        for name in (settings.cache.codec, settings.cache.compression):
+            if not cache_codec.available(name):
+                logger.warning("Cache %s is not installed, falling back", name)
+        if cls._listener_task is None or cls._listener_task.done():
+            cls._listener_task = asyncio.create_task(cls._listen())
+
+    @classmethod
+    async def _listen(cls) -> None:
+        while True:
+            try:
+                r = await cls.get_redis()
+                async with r.pubsub() as pubsub:
+                    await pubsub.subscribe(cls._invalidation_channel())
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            cls._handle_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Cache invalidation listener error", exc_info=True)
+            # Invalidations may have been missed while disconnected
+            cls._local_clear()
+            for handler in cls._invalidation_handlers.values():
+                handler(None)
+            await asyncio.sleep(1)
+
+    @classmethod
+    async def get_or_compute(
+        cls,
+        compute: Callable[[], Awaitable[bytes]],
+        *key_parts: str | int,
+        ttl: int,
+        soft_ttl: int | None = None,
+    ) -> bytes:
+        """
+        Get cached bytes, computing them at most once at a time.
+
+        Identical calls in this process share one in-flight computation,
+        and a short Redis lock lets one worker compute a missing value
+        while the others wait for it. After ``soft_ttl`` seconds the value
+        is stale: it is still served until ``ttl`` while one worker
+        refreshes it in the background. ``compute`` must not use anything
+        scoped to the request, such as its DB session, since a refresh
+        outlives the request.
+
+        Values are stored prefixed with their freshness, so keys used here
+        must not be read with ``get_raw``.
+        """
+        key = cls._make_key(*key_parts)
+        task = cls._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                cls._get_or_compute(key, compute, ttl, soft_ttl or ttl)
+            )
+            cls._inflight[key] = task
+            task.add_done_callback(functools.partial(cls._forget_inflight, key))
+        # Shielded: one caller giving up must not cancel the others
+        return await asyncio.shield(task)
+
+    @classmethod
+    def _forget_inflight(cls, key: str, task: asyncio.Task) -> None:
+        if cls._inflight.get(key) is task:
+            del cls._inflight[key]
+        if not task.cancelled():
+            # Retrieved so it is not reported if every caller gave up
+            task.exception()
+
+    @classmethod
+    async def _get_or_compute(
+        cls,
+        key: str,
+        compute: Callable[[], Awaitable[bytes]],
+        ttl: int,
+        soft_ttl: int,
+    ) -> bytes:
+        entry = await cls._read_raw(key)
+        if entry is not None:
+            (fresh_until,) = cls._FRESH_UNTIL.unpack_from(entry)
+            if fresh_until < time.time():
+                cls._refresh_in_background(key, compute, ttl, soft_ttl)
+            return entry[cls._FRESH_UNTIL.size :]
+
+        if await cls._lock(key):
+            try:
+                return await cls._compute_and_store(key, compute, ttl, soft_ttl)
+            finally:
+                await cls._unlock(key)
+
+        # Another worker is computing it
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.cache.lock_wait
+        while loop.time() < deadline:
+            await asyncio.sleep(cls._POLL_INTERVAL)
+            entry = await cls._read_raw(key)
+            if entry is not None:
+                return entry[cls._FRESH_UNTIL.size :]
+        return await cls._compute_and_store(key, compute, ttl, soft_ttl)
+
+    @classmethod
+    async def _compute_and_store(
+        cls,
+        key: str,
+        compute: Callable[[], Awaitable[bytes]],
+        ttl: int,
+        soft_ttl: int,
+    ) -> bytes:
+        data = await compute()
+        entry = cls._FRESH_UNTIL.pack(time.time() + soft_ttl) + data
+        await cls._write_raw(key, entry, ttl)
+        return data
+
+    @classmethod
+    def _refresh_in_background(
+        cls,
+        key: str,
+        compute: Callable[[], Awaitable[bytes]],
+        ttl: int,
+        soft_ttl: int,
+    ) -> None:
+        if key in cls._refreshing:
+            return
+
+        async def refresh() -> None:
+            try:
+                if not await cls._lock(key):
+                    return
+                try:
+                    await cls._compute_and_store(key, compute, ttl, soft_ttl)
+                finally:
+                    await cls._unlock(key)
+            except Exception:
+                logger.exception("Cache refresh failed for key=%s", key)
+            finally:
+                cls._refreshing.discard(key)
+
+        cls._refreshing.add(key)
+        task = asyncio.create_task(refresh())
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    async def _lock(cls, key: str) -> bool:
+        """Take the single-flight lock of ``key``; True if Redis is unavailable."""
+        try:
+            r = await cls.get_redis()
+            return bool(
+                await r.set(f"{key}:lock", 1, nx=True, ex=settings.cache.lock_ttl)
+            )
+        except redis.RedisError:
+            logger.warning("Redis lock error", exc_info=True)
+            return True
+
+    @classmethod
+    async def _unlock(cls, key: str) -> None:
+        try:
+            r = await cls.get_redis()
+            await r.delete(f"{key}:lock")
+        except redis.RedisError:
+            logger.warning("Redis unlock error", exc_info=True)
+
+    @classmethod
+    def _suggestions_version_key(cls, user_id: int) -> str:
+        return cls._make_key("suggestions", user_id, "version")
+
+    @classmethod
+    async def suggestions_key(cls, user_id: int, *key_parts: str | int) -> tuple | None:
+        """
+        Key parts for a cached suggestions page under the user's current version.
+
+        Read the key once, before computing the page: a page computed while
+        the version was bumped then lands under the old, unreachable version.
+        Returns None if the version cannot be read, so the cache is skipped.
+        """
+        try:
+            r = await cls.get_redis()
+            version = await r.get(cls._suggestions_version_key(user_id))
+        except redis.RedisError:
+            logger.warning("Redis read error", exc_info=True)
+            return None
+        return ("suggestions", user_id, f"v{version or 0}", *key_parts)
 
     @classmethod
     async def invalidate_suggestions(cls, user_id: int) -> None:
-        await cls.delete_pattern("suggestions", user_id, "")
+        """
+        Invalidate all cached suggestion pages of a user with a single INCR.
+
+        Pages of older versions are never read again and expire by their
+        TTL. The version key itself never expires: letting it lapse could
+        bring back a version number whose pages are still cached.
+        """
+        try:
+            r = await cls.get_redis()
+            await r.incr(cls._suggestions_version_key(user_id))
+        except redis.RedisError:
+            logger.warning("Redis write error", exc_info=True)
+
+
+class CachePipeline:
+    """
+    Cache operations queued by ``CacheService.pipeline``.
+
+    Reads go to Redis rather than the local tier, so they see writes queued
+    before them. After execution ``results`` has one entry per operation,
+    in order: the value (None on a miss) for reads and whether it was
+    applied for writes; ``misses`` lists the key parts of missed reads. If
+    Redis fails, ``ok`` is False, every read is a miss and written keys are
+    dropped from the local tier.
+    """
+
+    def __init__(self, transaction: bool = False) -> None:
+        self.transaction = transaction
+        # (operation, key parts, plain value to write, ttl)
+        self._ops: list[tuple[str, CacheKey, bytes | None, int | None]] = []
+        self.results: list = []
+        self.misses: list[CacheKey] = []
+        self.ok = True
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def get_json(self, *key_parts: str | int) -> None:
+        self._ops.append(("get_json", key_parts, None, None))
+
+    def get_raw(self, *key_parts: str | int) -> None:
+        self._ops.append(("get_raw", key_parts, None, None))
+
+    def set_json(
+        self, value: dict | list, *key_parts: str | int, ttl: int | None = None
+    ) -> None:
+        plain = cache_codec.encode(value, settings.cache.codec)
+        self._ops.append(("set", key_parts, plain, ttl))
+
+    def set_raw(
+        self, data: bytes, *key_parts: str | int, ttl: int | None = None
+    ) -> None:
+        self._ops.append(("set", key_parts, cache_codec.RAW + data, ttl))
+
+    def invalidate(self, *key_parts: str | int) -> None:
+        """Delete a key along with every worker's local copy of it."""
+        self._ops.append(("invalidate", key_parts, None, None))
+
+    async def execute(self) -> None:
+        ops, self._ops = self._ops, []
+        if not ops:
+            return
+        keys = [CacheService._make_key(*parts) for _, parts, _, _ in ops]
+        try:
+            r = await CacheService.get_binary_redis()
+            async with r.pipeline(transaction=self.transaction) as pipe:
+                for (op, _, plain, ttl), key in zip(ops, keys, strict=True):
+                    if op == "set":
+                        pipe.set(key, CacheService._compress(plain), ex=ttl)
+                    elif op == "invalidate":
+                        pipe.delete(key)
+                    else:
+                        pipe.get(key)
+                # Other workers drop their local copies of written keys
+                for (op, _, _, _), key in zip(ops, keys, strict=True):
+                    if op == "set":
+                        pipe.publish(
+                            CacheService._invalidation_channel(),
+                            CacheService._invalidation(key),
+                        )
+                replies = (await pipe.execute())[: len(ops)]
+        except redis.RedisError:
+            logger.warning("Redis pipeline error", exc_info=True)
+            self.ok = False
+            replies = [None] * len(ops)
+
+        invalidated = []
+        for (op, parts, plain, _), key, reply in zip(ops, keys, replies, strict=True):
+            if op == "set":
+                if self.ok:
+                    CacheService._local_put(key, plain)
+                else:
+                    CacheService._local_drop(key)
+                self.results.append(self.ok)
+            elif op == "invalidate":
+                CacheService._local_drop(key)
+                invalidated.append(key)
+                self.results.append(self.ok)
+            else:
+                value = plain = CacheService._load(key, reply)
+                if plain is not None and op == "get_json":
+                    value = CacheService._decode_json(plain)
+                elif plain is not None:
+                    value = CacheService._decode_raw(plain)
+                if value is None:
+                    self.misses.append(parts)
+                self.results.append(value)
+        if invalidated:
+            await CacheService.publish_invalidation(*invalidated)
@@ -1,8 +1,11 @@
-from sqlalchemy import and_, select, func, update
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.models import Match, Message
+from core.models import Match, Message, ReadCursor
 from core.types.user_id import UserIdType
+from crud.services.unread_service import UnreadService
+from utils import decode_cursor, encode_cursor
 
 
 class ChatService:
@@ -75,24 +78,95 @@ class ChatService:
 
         return messages, total
 
+    @staticmethod
+    async def get_history_by_cursor(
+        session: AsyncSession,
+        match_id: int,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> tuple[list[Message], int, str | None]:
+        """
+        Get message history newest first, seeking by (match_id, id).
+
+        Returns:
+            Tuple of (messages, total count, cursor for the older page).
+        """
+        total_result = await session.execute(
+            select(func.count())
+            .select_from(Message)
+            .where(Message.match_id == match_id)
+        )
+        total = total_result.scalar() or 0
+
+        query = select(Message).where(Message.match_id == match_id)
+        if cursor:
+            (before_id,) = decode_cursor(cursor, int)
+            query = query.where(Message.id < before_id)
+
+        result = await session.execute(query.order_by(Message.id.desc()).limit(limit))
+        messages = list(result.scalars().all())
+
+        next_cursor = None
+        if len(messages) == limit:
+            next_cursor = encode_cursor(messages[-1].id)
+
+        return messages, total, next_cursor
+
     @staticmethod
     async def mark_as_read(
         session: AsyncSession,
         match_id: int,
         reader_id: UserIdType,
     ) -> int:
-        """Mark all unread messages in a match as read (except own messages)."""
+        """
+        Move the reader's cursor to the latest message of the match.
+
+        One upsert of the reader's ``read_cursors`` row; the cursor never
+        moves back. Also clears the reader's unread counter for the match.
+
+        Returns:
+            ID of the last message read, 0 if the match has none.
+        """
+        latest = (
+            select(func.coalesce(func.max(Message.id), 0))
+            .where(Message.match_id == match_id)
+            .scalar_subquery()
+        )
+        stmt = insert(ReadCursor).values(
+            match_id=match_id, user_id=reader_id, last_read_message_id=latest
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ReadCursor.match_id, ReadCursor.user_id],
+            set_={
+                "last_read_message_id": func.greatest(
+                    ReadCursor.last_read_message_id,
+                    stmt.excluded.last_read_message_id,
+                ),
+                "updated_at": func.now(),
+            },
+        ).returning(ReadCursor.last_read_message_id)
+        result = await session.execute(stmt)
+        await session.commit()
+        await UnreadService.reset(match_id, reader_id)
+        return result.scalar_one()
+
+    @staticmethod
+    async def get_read_cursors(
+        session: AsyncSession, match_id: int
+    ) -> dict[UserIdType, int]:
+        """Last message read by each participant of a match who read any."""
         result = await session.execute(
-            update(Message)
-            .where(
-                and_(
-                    Message.match_id == match_id,
-                    Message.sender_id != reader_id,
-                    Message.is_read.is_(False),
-                )
+            select(ReadCursor.user_id, ReadCursor.last_read_message_id).where(
+                ReadCursor.match_id == match_id
             )
-            .values(is_read=True)
-            .returning(Message.id)
         )
-        await session.commit()
-        return len(result.all())
+        return dict(result.all())
+
+    @staticmethod
+    def is_read(match: Match, cursors: dict[UserIdType, int], message: Message) -> bool:
+        """Whether the participant who did not send ``message`` has read it."""
+        if message.sender_id == match.user_id:
+            recipient_id = match.matched_user_id
+        else:
+            recipient_id = match.user_id
+        return message.id <= cursors.get(recipient_id, 0)
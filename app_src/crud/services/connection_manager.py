@@ -1,6 +1,9 @@
 import asyncio
+import contextlib
 import json
 import logging
+from collections import Counter, deque
+from typing import NamedTuple
 
 import redis.asyncio as redis
 from fastapi import WebSocket
@@ -9,9 +12,24 @@ from core.config import settings
 
 logger = logging.getLogger(__name__)
 
+LISTENER_RETRY_DELAY = 1.0  # seconds before reading again after a Redis error
+
 
 class ConnectionManager:
-    """Manages WebSocket connections with Redis Pub/Sub for multi-worker support."""
+    """
+    Manages WebSocket connections with Redis Pub/Sub for multi-worker support.
+
+    A listener task blocks on the subscription and queues every message
+    for its match; each match with pending messages has its own delivery
+    task, so chats are delivered concurrently and in order within a chat,
+    and a socket slower than ``settings.chat.send_timeout`` is dropped
+    instead of holding up the others.
+
+    With ``settings.chat.routing = "shard"`` matches are hashed onto
+    ``settings.chat.shards`` channels and messages carry their match ID,
+    so a worker never holds more subscriptions than there are shards, no
+    matter how many chats are open.
+    """
 
     def __init__(self):
         self._connections: dict[int, dict[int, WebSocket]] = {}
@@ -19,6 +37,13 @@ class ConnectionManager:
         self._redis: redis.Redis | None = None
         self._pubsub: redis.client.PubSub | None = None
         self._listener_task: asyncio.Task | None = None
+        # match_id -> messages waiting for that match's delivery task
+        self._pending: dict[int, deque[dict]] = {}
+        self._delivery_tasks: set[asyncio.Task] = set()
+        # channel -> number of local matches routed through it
+        self._channel_matches: Counter[str] = Counter()
+        # Counted channels whose SUBSCRIBE failed, retried on the next connect
+        self._unsubscribed: set[str] = set()
 
     async def _get_redis(self) -> redis.Redis:
         if self._redis is None:
@@ -26,36 +51,90 @@ class ConnectionManager:
         return self._redis
 
     def _channel(self, match_id: int) -> str:
+        if settings.chat.routing == "shard":
+            return f"chat:shard:{match_id % settings.chat.shards}"
         return f"chat:{match_id}"
 
-    async def connect(self, websocket: WebSocket, match_id: int, user_id: int) -> None:
-        """Register a WebSocket connection and subscribe to Redis channel."""
+    def _pack(self, match_id: int, message: dict) -> str:
+        if settings.chat.routing == "shard":
+            return json.dumps({"match_id": match_id, "message": message})
+        return json.dumps(message)
+
+    def _unpack(self, channel: str, data: str) -> tuple[int, dict]:
+        payload = json.loads(data)
+        if settings.chat.routing == "shard":
+            return payload["match_id"], payload["message"]
+        # channel format: "chat:{match_id}"
+        return int(channel.split(":")[1]), payload
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        match_id: int,
+        user_id: int,
+        last_id: str | None = None,
+    ) -> None:
+        """
+        Register a WebSocket connection and subscribe to Redis channel.
+
+        ``last_id`` is only used by the stream transport; Pub/Sub keeps
+        nothing to replay.
+        """
         await websocket.accept()
 
+        channel = self._channel(match_id)
         if match_id not in self._connections:
             self._connections[match_id] = {}
+            self._channel_matches[channel] += 1
+            # Decided by our own count, not pubsub.channels: a channel stays
+            # there until its UNSUBSCRIBE is acknowledged, so a chat reopened
+            # within that window would never be subscribed again
+            if self._channel_matches[channel] == 1:
+                self._unsubscribed.add(channel)
         self._connections[match_id][user_id] = websocket
 
         try:
             r = await self._get_redis()
             if self._pubsub is None:
                 self._pubsub = r.pubsub()
-            await self._pubsub.subscribe(self._channel(match_id))
+            if channel in self._unsubscribed:
+                await self._pubsub.subscribe(channel)
+                self._unsubscribed.discard(channel)
 
             if self._listener_task is None or self._listener_task.done():
                 self._listener_task = asyncio.create_task(self._listen())
         except redis.RedisError:
             logger.warning("Redis unavailable, falling back to local-only mode")
 
-    async def disconnect(self, match_id: int, user_id: int) -> None:
-        """Remove a WebSocket connection."""
-        if match_id in self._connections:
-            self._connections[match_id].pop(user_id, None)
+    def _is_current(
+        self, match_id: int, user_id: int, websocket: WebSocket | None
+    ) -> bool:
+        """Whether ``websocket`` (any, if None) is the user's registered one."""
+        current = self._connections.get(match_id, {}).get(user_id)
+        return current is not None and (websocket is None or current is websocket)
+
+    async def disconnect(
+        self, match_id: int, user_id: int, websocket: WebSocket | None = None
+    ) -> None:
+        """
+        Remove a WebSocket connection.
+
+        With ``websocket``, only if it is still the one registered, so a
+        socket the user opened since is kept.
+        """
+        if self._is_current(match_id, user_id, websocket):
+            del self._connections[match_id][user_id]
             if not self._connections[match_id]:
                 del self._connections[match_id]
+                channel = self._channel(match_id)
+                self._channel_matches[channel] -= 1
+                if self._channel_matches[channel] > 0:
+                    return  # other local matches share the shard
+                del self._channel_matches[channel]
+                self._unsubscribed.discard(channel)
                 try:
                     if self._pubsub:
-                        await self._pubsub.unsubscribe(self._channel(match_id))
+                        await self._pubsub.unsubscribe(channel)
                 except redis.RedisError:
                     pass
 
@@ -67,7 +146,7 @@ class ConnectionManager:
 
         Falls back to local delivery if Redis is unavailable.
         """
-        payload = json.dumps(message)
+        payload = self._pack(match_id, message)
         try:
             r = await self._get_redis()
             await r.publish(self._channel(match_id), payload)
@@ -80,28 +159,75 @@ class ConnectionManager:
     ) -> None:
         """Deliver message to locally connected WebSockets."""
         connections = self._connections.get(match_id, {})
-        for uid, ws in list(connections.items()):
-            if exclude_user_id and uid == exclude_user_id:
-                continue
-            try:
-                await ws.send_json(message)
-            except Exception:
-                await self.disconnect(match_id, uid)
+        await asyncio.gather(
+            *(
+                self._send(match_id, uid, ws, message)
+                for uid, ws in list(connections.items())
+                if not (exclude_user_id and uid == exclude_user_id)
+            )
+        )
 
-    async def _listen(self) -> None:
-        """Listen for messages from Redis Pub/Sub and deliver to local WebSockets."""
+    async def _send(
+        self, match_id: int, user_id: int, websocket: WebSocket, message: dict
+    ) -> None:
         try:
-            while self._pubsub:
-                message = await self._pubsub.get_message(
-                    ignore_subscribe_messages=True, timeout=1.0
+            await asyncio.wait_for(
+                websocket.send_json(message), timeout=settings.chat.send_timeout
+            )
+        except Exception:
+            await self.disconnect(match_id, user_id, websocket)
+            # A cancelled send may have left part of a frame on the wire;
+            # close so the client reconnects instead of waiting forever
+            with contextlib.suppress(Exception):
+                await asyncio.wait_for(
+                    websocket.close(code=1013), timeout=settings.chat.send_timeout
                 )
-                if message and message["type"] == "message":
-                    channel = message["channel"]
-                    # channel format: "chat:{match_id}"
-                    match_id = int(channel.split(":")[1])
-                    data = json.loads(message["data"])
-                    await self._deliver_local(match_id, data)
-                await asyncio.sleep(0.01)
+
+    def _dispatch(self, match_id: int, message: dict) -> None:
+        """Queue a message for delivery, starting the match's task if idle."""
+        pending = self._pending.get(match_id)
+        if pending is None:
+            pending = deque(maxlen=settings.chat.max_pending)
+            self._pending[match_id] = pending
+            task = asyncio.create_task(self._drain(match_id, pending))
+            self._delivery_tasks.add(task)
+            task.add_done_callback(self._delivery_tasks.discard)
+        elif len(pending) == pending.maxlen:
+            logger.warning("Chat delivery behind for match_id=%s, dropping", match_id)
+        pending.append(message)
+
+    async def _drain(self, match_id: int, pending: deque[dict]) -> None:
+        """Deliver a match's queued messages one at a time, in order."""
+        try:
+            while pending:
+                await self._deliver_local(match_id, pending.popleft())
+        finally:
+            # Nothing awaits between the empty check and this, so a message
+            # dispatched meanwhile starts a new task
+            self._pending.pop(match_id, None)
+
+    async def _listen(self) -> None:
+        """
+        Read messages from Redis Pub/Sub and queue them for delivery.
+
+        Blocks on the connection rather than polling. Ends once the last
+        channel is unsubscribed; ``connect`` starts it again.
+        """
+        try:
+            while self._pubsub is not None and self._pubsub.subscribed:
+                try:
+                    async for message in self._pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        match_id, data = self._unpack(
+                            message["channel"], message["data"]
+                        )
+                        # Shards also carry chats held by other workers
+                        if match_id in self._connections:
+                            self._dispatch(match_id, data)
+                except redis.RedisError:
+                    logger.warning("Redis listener error, retrying", exc_info=True)
+                    await asyncio.sleep(LISTENER_RETRY_DELAY)
         except asyncio.CancelledError:
             pass
         except Exception:
@@ -115,6 +241,12 @@ class ConnectionManager:
                 await self._listener_task
             except asyncio.CancelledError:
                 pass
+        for task in list(self._delivery_tasks):
+            task.cancel()
+        await asyncio.gather(*self._delivery_tasks, return_exceptions=True)
+        self._pending.clear()
+        self._channel_matches.clear()
+        self._unsubscribed.clear()
         if self._pubsub:
             await self._pubsub.close()
             self._pubsub = None
@@ -123,4 +255,242 @@ class ConnectionManager:
             self._redis = None
 
 
-manager = ConnectionManager()
+class Replay(NamedTuple):
+    """Queued with a match's messages: resend what a reconnected socket missed."""
+
+    user_id: int
+    last_id: str
+
+
+def _stream_id(entry_id: str) -> tuple[int, int]:
+    """
+    Sortable form of a stream entry ID; raises ValueError if malformed.
+
+    >>> _stream_id("1700000000000-2") > _stream_id("1700000000000-10")
+    False
+    """
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class StreamConnectionManager(ConnectionManager):
+    """
+    Chat delivery through one Redis Stream per match.
+
+    Used with ``settings.chat.transport = "stream"``. Messages are appended
+    with XADD, trimmed to about ``settings.chat.stream_maxlen`` entries, and
+    each worker reads the streams of its local chats with one blocking
+    XREAD, so nothing published while its listener restarts is lost.
+
+    Delivered messages carry their ``stream_id``. A client reconnecting
+    with ``last_id`` first gets the entries it missed, queued in the
+    match's delivery order, then live ones. Delivery is at least once:
+    clients skip message IDs they already have.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # stream key -> ID of the last entry this worker read
+        self._positions: dict[str, str] = {}
+        # (match_id, user_id) -> last stream ID sent by the socket's replay;
+        # None until the replay has run
+        self._cursors: dict[tuple[int, int], str | None] = {}
+        # Dedicated connection for XREAD, woken with CLIENT UNBLOCK when a
+        # chat is added
+        self._reader: redis.Redis | None = None
+        self._reader_id: int | None = None
+
+    def _stream(self, match_id: int) -> str:
+        return f"chat:stream:{match_id}"
+
+    async def _get_reader(self) -> redis.Redis:
+        if self._reader is None:
+            self._reader = redis.from_url(
+                settings.REDIS_URL, decode_responses=True, single_connection_client=True
+            )
+            self._reader_id = await self._reader.client_id()
+        return self._reader
+
+    async def _reset_reader(self) -> None:
+        if self._reader is not None:
+            reader, self._reader, self._reader_id = self._reader, None, None
+            await reader.close()
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        match_id: int,
+        user_id: int,
+        last_id: str | None = None,
+    ) -> None:
+        """Register a WebSocket connection, replaying entries after ``last_id``."""
+        await websocket.accept()
+
+        if match_id not in self._connections:
+            self._connections[match_id] = {}
+        self._connections[match_id][user_id] = websocket
+
+        key = self._stream(match_id)
+        try:
+            r = await self._get_redis()
+            if key not in self._positions:
+                latest = await r.xrevrange(key, count=1)
+                # Read from the current end unless the chat closed meanwhile
+                if match_id in self._connections:
+                    self._positions[key] = latest[0][0] if latest else "0-0"
+                if self._reader_id is not None:
+                    await r.client_unblock(self._reader_id)
+
+            if self._listener_task is None or self._listener_task.done():
+                self._listener_task = asyncio.create_task(self._listen())
+        except redis.RedisError:
+            logger.warning("Redis unavailable, falling back to local-only mode")
+
+        if last_id is not None:
+            try:
+                _stream_id(last_id)
+            except ValueError:
+                logger.info("Ignoring malformed last_id=%r", last_id)
+                return
+            # After the position is set, so entries the listener has not
+            # read yet are in the replay
+            self._cursors[match_id, user_id] = None
+            self._dispatch(match_id, Replay(user_id, last_id))
+
+    async def disconnect(
+        self, match_id: int, user_id: int, websocket: WebSocket | None = None
+    ) -> None:
+        """Remove a WebSocket connection (only ``websocket``, if given)."""
+        if self._is_current(match_id, user_id, websocket):
+            self._cursors.pop((match_id, user_id), None)
+            del self._connections[match_id][user_id]
+            if not self._connections[match_id]:
+                del self._connections[match_id]
+                self._positions.pop(self._stream(match_id), None)
+
+    async def broadcast(
+        self, match_id: int, message: dict, exclude_user_id: int | None = None
+    ) -> None:
+        """
+        Append message to the match's stream.
+
+        Falls back to local delivery if Redis is unavailable.
+        """
+        key = self._stream(match_id)
+        try:
+            r = await self._get_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.xadd(
+                    key,
+                    {"data": json.dumps(message)},
+                    maxlen=settings.chat.stream_maxlen,
+                    approximate=True,
+                )
+                pipe.expire(key, settings.chat.stream_ttl)
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Redis XADD failed, delivering locally")
+            await self._deliver_local(match_id, message, exclude_user_id)
+
+    async def _deliver_local(
+        self, match_id: int, message: dict | Replay, exclude_user_id: int | None = None
+    ) -> None:
+        """Deliver message to local WebSockets that have not seen it."""
+        if isinstance(message, Replay):
+            await self._replay(match_id, message)
+            return
+
+        stream_id = message.get("stream_id")
+        targets = []
+        for uid, ws in list(self._connections.get(match_id, {}).items()):
+            if exclude_user_id and uid == exclude_user_id:
+                continue
+            if (match_id, uid) in self._cursors:
+                cursor = self._cursors[match_id, uid]
+                if (
+                    cursor is None
+                    or stream_id is None
+                    or _stream_id(stream_id) <= _stream_id(cursor)
+                ):
+                    continue  # replay pending, or already sent by it
+                del self._cursors[match_id, uid]
+            targets.append(self._send(match_id, uid, ws, message))
+        await asyncio.gather(*targets)
+
+    async def _replay(self, match_id: int, replay: Replay) -> None:
+        """Send a reconnected socket the entries after its ``last_id``."""
+        key = (match_id, replay.user_id)
+        websocket = self._connections.get(match_id, {}).get(replay.user_id)
+        if websocket is None or key not in self._cursors:
+            return
+
+        try:
+            r = await self._get_redis()
+            entries = await r.xrange(
+                self._stream(match_id),
+                min=f"({replay.last_id}",
+                count=settings.chat.stream_maxlen,
+            )
+        except redis.RedisError:
+            logger.warning(
+                "Chat replay failed for match_id=%s", match_id, exc_info=True
+            )
+            entries = []
+
+        cursor = replay.last_id
+        for entry_id, fields in entries:
+            message = json.loads(fields["data"])
+            message["stream_id"] = entry_id
+            await self._send(match_id, replay.user_id, websocket, message)
+            if key not in self._cursors:
+                return  # disconnected
+            cursor = entry_id
+        self._cursors[key] = cursor
+
+    async def _listen(self) -> None:
+        """
+        Read new entries of every local chat's stream and queue them.
+
+        Ends once no chat is open; ``connect`` starts it again.
+        """
+        try:
+            while self._positions:
+                try:
+                    reader = await self._get_reader()
+                    response = await reader.xread(
+                        dict(self._positions), block=settings.chat.stream_block_ms
+                    )
+                except redis.RedisError:
+                    logger.warning("Redis listener error, retrying", exc_info=True)
+                    await self._reset_reader()
+                    await asyncio.sleep(LISTENER_RETRY_DELAY)
+                    continue
+
+                for key, entries in response or []:
+                    if key not in self._positions:
+                        continue  # chat closed while reading
+                    # key format: "chat:stream:{match_id}"
+                    match_id = int(key.rsplit(":", 1)[1])
+                    for entry_id, fields in entries:
+                        message = json.loads(fields["data"])
+                        message["stream_id"] = entry_id
+                        self._dispatch(match_id, message)
+                    self._positions[key] = entries[-1][0]
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Redis listener error")
+
+    async def close(self) -> None:
+        """Cleanup all connections and Redis resources."""
+        await super().close()
+        self._positions.clear()
+        self._cursors.clear()
+        await self._reset_reader()
+
+
+manager = (
+    StreamConnectionManager()
+    if settings.chat.transport == "stream"
+    else ConnectionManager()
+)
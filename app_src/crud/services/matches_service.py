@@ -1,17 +1,161 @@
-from sqlalchemy import and_, func, or_, select
+import asyncio
+import logging
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    Select,
+    all_,
+    and_,
+    bindparam,
+    exists,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.models import Match, User
+from core.config import settings
+from core.models import (
+    GenderEnum,
+    Match,
+    Message,
+    ReadCursor,
+    SwipeActionEnum,
+    SwipeStatusEnum,
+    User,
+    db_helper,
+)
 from core.models.associations import user_interests
 from core.types.user_id import UserIdType
 from crud.services.cache_service import CacheService
 from crud.services.block_report_service import BlockReportService
 from crud.services.notification_service import NotificationService
+from crud.services.rating_service import RatingService
+from crud.services.seen_service import SeenService
+from crud.services.suggestion_queue_service import SuggestionQueueService
+from utils import decode_cursor, encode_cursor
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed for the bitset engine
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Characters of the last message shown in the matches inbox
+INBOX_PREVIEW_LENGTH = 100
 
 
 class MatchingService:
     """Service class for handling matching logic and operations."""
 
+    @staticmethod
+    def _candidate_filter(
+        user: User, seen_ids: list[UserIdType] | None = None
+    ) -> ColumnElement[bool]:
+        """Users that may be suggested to ``user``."""
+        condition = and_(
+            # IN rather than != and a bare is_active (not IS true) so the
+            # partial gender-led index applies
+            User.gender.in_([g for g in GenderEnum if g != user.gender]),
+            User.id != user.id,
+            User.is_active,
+            BlockReportService.not_blocked(user.id, User.id),
+            # Already liked (one-way or mutual)
+            ~exists().where(
+                Match.user_id == user.id,
+                Match.matched_user_id == User.id,
+            ),
+        )
+        if seen_ids:
+            # One array parameter instead of a bind parameter per ID
+            condition = and_(
+                condition,
+                User.id != all_(bindparam("seen_ids", seen_ids, ARRAY(Integer))),
+            )
+        return condition
+
+    @staticmethod
+    def _candidates_query(
+        user: User, *entities, seen_ids: list[UserIdType] | None = None
+    ) -> tuple[Select, ColumnElement[int]]:
+        """
+        Build the suggestion candidate query for ``user``.
+
+        Interest overlap is LEFT JOINed, so users without shared interests
+        stay in the result with overlap 0 and interest matches and the
+        rating fallback are a single ordering. Blocks are anti-joined in
+        both directions instead of being fetched up front.
+
+        Returns:
+            Tuple of (unordered query, overlap column).
+        """
+        query = select(*entities)
+        if user.interests:
+            user_interest_ids = [interest.id for interest in user.interests]
+            overlap_subquery = (
+                select(
+                    user_interests.c.user_id,
+                    func.count().label("overlap"),
+                )
+                .where(user_interests.c.interest_id.in_(user_interest_ids))
+                .group_by(user_interests.c.user_id)
+                .subquery()
+            )
+            overlap_col = func.coalesce(overlap_subquery.c.overlap, 0)
+            query = query.outerjoin(
+                overlap_subquery, overlap_subquery.c.user_id == User.id
+            )
+        else:
+            overlap_col = literal(0)
+
+        query = query.where(MatchingService._candidate_filter(user, seen_ids))
+        return query, overlap_col
+
+    @staticmethod
+    def _suggestion_order(overlap_col: ColumnElement[int]) -> tuple:
+        return (
+            overlap_col.desc(),
+            User.rating.desc(),
+            User.created_at.desc(),
+            User.id.desc(),
+        )
+
+    @staticmethod
+    async def _engine_excluded_ids(
+        session: AsyncSession, user: User, seen_ids: list[UserIdType]
+    ) -> list[UserIdType]:
+        """
+        Users the in-memory engine must skip, as ``_candidate_filter`` does.
+
+        Blocked (both ways), already liked (one-way or mutual) and seen.
+        """
+        # Получаем ID заблокированных пользователей (в обе стороны)
+        blocked_ids = await BlockReportService.get_blocked_user_ids(session, user.id)
+        liked_result = await session.execute(
+            select(Match.matched_user_id).where(Match.user_id == user.id)
+        )
+        return [*blocked_ids, *liked_result.scalars(), *seen_ids]
+
+    @staticmethod
+    async def _count_candidates(
+        session: AsyncSession, user: User, seen_ids: list[UserIdType] | None = None
+    ) -> int:
+        result = await session.execute(
+            select(func.count())
+            .select_from(User)
+            .where(MatchingService._candidate_filter(user, seen_ids))
+        )
+        return result.scalar() or 0
+
     @staticmethod
     async def find_matches_by_interests_and_rating(
         session: AsyncSession,
@@ -22,126 +166,143 @@ class MatchingService:
         """
         Find potential matches based on common interests and sorted by rating.
 
+        Users sharing the most interests come first, the rest follow by
+        rating. The page and the total come back in one statement.
+
         Returns:
             Tuple of (matched users list, total count).
         """
-        # Получаем ID заблокированных пользователей (в обе стороны)
-        blocked_ids = await BlockReportService.get_blocked_user_ids(session, user.id)
+        seen_ids = await SeenService.get_ids(user.id)
 
-        base_filter = and_(
-            User.gender != user.gender,
-            User.id != user.id,
-            User.is_active.is_(True),
-        )
-        if blocked_ids:
-            base_filter = and_(base_filter, User.id.notin_(blocked_ids))
-
-        # Total count of all potential matches
-        total_result = await session.execute(
-            select(func.count()).select_from(User).where(base_filter)
-        )
-        total = total_result.scalar() or 0
-
-        if not user.interests:
-            matches = await MatchingService._find_basic_matches(
-                session, user, limit, offset=offset, blocked_ids=blocked_ids
+        if interest_engine.ready:
+            excluded_ids = await MatchingService._engine_excluded_ids(
+                session, user, seen_ids
             )
+            ranked_ids, total = interest_engine.rank(user, excluded_ids, limit, offset)
+            matches = await MatchingService.get_users_by_ids(session, ranked_ids)
             return matches, total
 
-        user_interest_ids = [interest.id for interest in user.interests]
-
+        query, overlap_col = MatchingService._candidates_query(
+            user, User, func.count().over().label("total"), seen_ids=seen_ids
+        )
         query = (
-            select(User)
-            .join(user_interests, User.id == user_interests.c.user_id)
-            .where(
-                and_(
-                    base_filter,
-                    user_interests.c.interest_id.in_(user_interest_ids),
-                )
-            )
-            .group_by(User.id)
-            .order_by(
-                func.count(user_interests.c.interest_id).desc(),
-                User.rating.desc(),
-                User.created_at.desc(),
-            )
+            query.order_by(*MatchingService._suggestion_order(overlap_col))
             .limit(limit)
             .offset(offset)
         )
 
-        result = await session.execute(query)
-        matched_users = list(result.scalars().all())
+        rows = (await session.execute(query)).all()
+        if rows:
+            return [row[0] for row in rows], rows[0][1]
 
-        # Fill remaining slots with basic matches if needed
-        if len(matched_users) < limit:
-            remaining_limit = limit - len(matched_users)
-            matched_user_ids = [u.id for u in matched_users]
+        # Past the last page the window has no row to report the total on
+        total = (
+            await MatchingService._count_candidates(session, user, seen_ids)
+            if offset
+            else 0
+        )
+        return [], total
 
-            basic_matches = await MatchingService._find_basic_matches(
-                session,
-                user,
-                remaining_limit,
-                exclude_ids=matched_user_ids,
-                blocked_ids=blocked_ids,
+    @staticmethod
+    async def find_matches_by_cursor(
+        session: AsyncSession,
+        user: User,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[User], int, str | None]:
+        """
+        Keyset-paginated variant of ``find_matches_by_interests_and_rating``.
+
+        Each page seeks past the (overlap, rating, created_at, id) key of
+        the last row of the previous one instead of skipping ``offset`` rows.
+
+        Returns:
+            Tuple of (matched users list, total count, next page cursor).
+        """
+        after = decode_cursor(cursor, int, int, datetime, int) if cursor else None
+
+        seen_ids = await SeenService.get_ids(user.id)
+        total = await MatchingService._count_candidates(session, user, seen_ids)
+
+        query, overlap_col = MatchingService._candidates_query(
+            user, User, seen_ids=seen_ids
+        )
+        query = query.add_columns(overlap_col.label("overlap"))
+        if after is not None:
+            query = query.where(
+                tuple_(overlap_col, User.rating, User.created_at, User.id)
+                < tuple_(*after)
             )
-            matched_users.extend(basic_matches)
+        query = query.order_by(*MatchingService._suggestion_order(overlap_col)).limit(
+            limit
+        )
 
-        return matched_users, total
+        rows = (await session.execute(query)).all()
+        matched_users = [row[0] for row in rows]
+
+        next_cursor = None
+        if len(rows) == limit:
+            last, last_overlap = rows[-1]
+            next_cursor = encode_cursor(
+                last_overlap, last.rating, last.created_at, last.id
+            )
+
+        return matched_users, total, next_cursor
 
     @staticmethod
-    async def _find_basic_matches(
+    async def rank_candidate_ids(
         session: AsyncSession,
         user: User,
         limit: int,
-        exclude_ids: list[int] | None = None,
-        offset: int = 0,
-        blocked_ids: list[int] | None = None,
-    ) -> list[User]:
-        """Find basic matches without interest filtering, sorted by rating."""
-        query = select(User).where(
-            and_(
-                User.gender != user.gender, User.id != user.id, User.is_active.is_(True)
-            )
-        )
+    ) -> tuple[list[UserIdType], int]:
+        """
+        Rank candidate IDs with the same ordering as suggestions.
 
-        if exclude_ids:
-            query = query.where(User.id.notin_(exclude_ids))
+        Only IDs are selected, so the result is cheap enough to precompute
+        a whole suggestion queue at once.
 
-        if blocked_ids:
-            query = query.where(User.id.notin_(blocked_ids))
+        Returns:
+            Tuple of (ranked candidate IDs, total count of potential matches).
+        """
+        seen_ids = await SeenService.get_ids(user.id)
 
-        query = (
-            query.order_by(
-                User.rating.desc(),
-                User.created_at.desc(),
+        if interest_engine.ready:
+            excluded_ids = await MatchingService._engine_excluded_ids(
+                session, user, seen_ids
             )
-            .limit(limit)
-            .offset(offset)
+            return interest_engine.rank(user, excluded_ids, limit)
+
+        query, overlap_col = MatchingService._candidates_query(
+            user, User.id, func.count().over().label("total"), seen_ids=seen_ids
+        )
+        query = query.order_by(*MatchingService._suggestion_order(overlap_col)).limit(
+            limit
         )
 
-        result = await session.execute(query)
-        return list(result.scalars().all())
+        rows = (await session.execute(query)).all()
+        return [row[0] for row in rows], rows[0][1] if rows else 0
 
     @staticmethod
-    async def _get_existing_match(
-        session: AsyncSession, user_id: UserIdType, matched_user_id: UserIdType
-    ) -> Match | None:
-        """Check if a match already exists between two users."""
-        result = await session.execute(
-            select(Match).where(
-                or_(
-                    and_(
-                        Match.user_id == matched_user_id,
-                        Match.matched_user_id == user_id,
-                    ),
-                    and_(
-                        Match.user_id == user_id,
-                        Match.matched_user_id == matched_user_id,
-                    ),
-                )
-            )
-        )
-        return result.scalars().first()
+    async def get_users_by_ids(
+        session: AsyncSession,
+        user_ids: list[UserIdType],
+        suggested_to: User | None = None,
+    ) -> list[User]:
+        """
+        Load users by ID, preserving the order of ``user_ids``.
+
+        With ``suggested_to``, only users that may still be suggested to
+        that user (see ``_candidate_filter``) are returned.
+        """
+        if not user_ids:
+            return []
+
+        query = select(User).where(User.id.in_(user_ids))
+        if suggested_to is not None:
+            query = query.where(MatchingService._candidate_filter(suggested_to))
+        result = await session.execute(query)
+        users_by_id = {u.id: u for u in result.scalars().all()}
+        return [users_by_id[uid] for uid in user_ids if uid in users_by_id]
 
     @staticmethod
     async def _get_user_by_id(session: AsyncSession, user_id: UserIdType) -> User:
@@ -152,6 +313,97 @@ class MatchingService:
             raise ValueError(f"User with ID {user_id} not found")
         return user
 
+    @staticmethod
+    async def _lock_pairs(
+        session: AsyncSession, user_id: UserIdType, other_ids: Iterable[UserIdType]
+    ) -> None:
+        """
+        Serialize like resolution per unordered user pair until commit.
+
+        Two reciprocal likes racing each other would otherwise both miss
+        the other's uncommitted row and never become mutual. Locks are
+        taken in ID order in a single statement.
+        """
+        others = (
+            select(
+                func.unnest(
+                    bindparam("other_ids", sorted(set(other_ids)), ARRAY(Integer))
+                ).label("other_id")
+            )
+            .order_by("other_id")
+            .subquery()
+        )
+        await session.execute(
+            select(
+                func.pg_advisory_xact_lock(
+                    func.least(user_id, others.c.other_id),
+                    func.greatest(user_id, others.c.other_id),
+                )
+            )
+        )
+
+    @staticmethod
+    def _like_statement(user_id: UserIdType, matched_user_id: UserIdType) -> Select:
+        """
+        Resolve a like in one statement.
+
+        Inserts the like unless the target is missing or blocked (either
+        direction). ON CONFLICT turns a repeated like into a no-op, and a
+        reciprocal like is created mutual and flips the other row. The
+        result row reports which of these cases applied.
+        """
+        target = (
+            select(User.id, User.first_name, User.telegram_id)
+            .where(User.id == matched_user_id)
+            .cte("target")
+        )
+        blocked = BlockReportService.blocked(user_id, matched_user_id)
+        reciprocal = (
+            select(Match.id)
+            .where(
+                Match.user_id == matched_user_id,
+                Match.matched_user_id == user_id,
+            )
+            .cte("reciprocal")
+        )
+        inserted = (
+            insert(Match)
+            .from_select(
+                ["user_id", "matched_user_id", "is_mutual"],
+                select(
+                    literal(user_id),
+                    target.c.id,
+                    exists(select(reciprocal.c.id)),
+                ).where(~blocked),
+            )
+            .on_conflict_do_nothing(index_elements=["user_id", "matched_user_id"])
+            .returning(Match.id, Match.is_mutual, Match.created_at)
+            .cte("inserted")
+        )
+        flipped = (
+            update(Match)
+            .where(
+                Match.id.in_(select(reciprocal.c.id)),
+                exists(select(inserted.c.id).where(inserted.c.is_mutual)),
+            )
+            .values(is_mutual=True)
+            .returning(Match.id)
+            .cte("flipped")
+        )
+        return select(
+            exists(select(target.c.id)).label("target_exists"),
+            blocked.label("blocked"),
+            select(target.c.first_name).scalar_subquery().label("first_name"),
+            select(target.c.telegram_id).scalar_subquery().label("telegram_id"),
+            select(inserted.c.id).scalar_subquery().label("id"),
+            select(inserted.c.is_mutual).scalar_subquery().label("is_mutual"),
+            select(inserted.c.created_at).scalar_subquery().label("created_at"),
+            select(func.count())
+            .select_from(flipped)
+            .scalar_subquery()
+            .label("flipped"),
+        )
+
     @staticmethod
     async def process_like(
         session: AsyncSession, user: User, matched_user_id: UserIdType
@@ -159,97 +411,228 @@ class MatchingService:
         """
         Process a like action between users.
 
-        This method:
-        1. Validates the like action
-        2. Increments the liked user's rating
-        3. Creates or updates match records
-        4. Handles mutual match logic
+        The like is resolved by a single INSERT ... ON CONFLICT statement
+        (see ``_like_statement``) under a per-pair advisory lock, so
+        double taps and simultaneous reciprocal likes stay correct.
+        Likes of blocked users are turned away by the cached block set
+        before that; the statement still checks blocks itself.
+        Ratings, caches and notifications are updated after the commit.
         """
-        # Validation
         if user.id == matched_user_id:
             raise ValueError("Cannot match with yourself")
-
-        # Проверяем блокировку в обе стороны
-        blocked_ids = await BlockReportService.get_blocked_user_ids(session, user.id)
-        if matched_user_id in blocked_ids:
+        if await BlockReportService.is_blocked(session, user.id, matched_user_id):
             raise ValueError("Cannot like a blocked user")
 
-        # Get the user being liked
-        matched_user = await MatchingService._get_user_by_id(session, matched_user_id)
-
-        # Check for existing match
-        existing_match = await MatchingService._get_existing_match(
-            session, user.id, matched_user_id
+        await MatchingService._lock_pairs(session, user.id, [matched_user_id])
+        result = await session.execute(
+            MatchingService._like_statement(user.id, matched_user_id)
         )
+        row = result.one()
 
-        if existing_match:
-            return await MatchingService._handle_existing_match(
-                session, existing_match, user, matched_user
+        if not row.target_exists:
+            raise ValueError(f"User with ID {matched_user_id} not found")
+        if row.blocked:
+            raise ValueError("Cannot like a blocked user")
+        if row.id is None:
+            # We already liked this user
+            result = await session.execute(
+                select(Match).where(
+                    Match.user_id == user.id,
+                    Match.matched_user_id == matched_user_id,
+                )
             )
+            return result.scalar_one()
 
-        # Create new match and increment rating
-        return await MatchingService._create_new_match(session, user, matched_user)
-
-    @staticmethod
-    async def _handle_existing_match(
-        session: AsyncSession, existing_match: Match, user: User, matched_user: User
-    ) -> Match:
-        """Handle cases where a match already exists."""
-        if existing_match.user_id == matched_user.id:
-            # The other user already liked us - make it mutual
-            existing_match.is_mutual = True
+        await session.commit()
 
+        match = Match(
+            id=row.id,
+            user_id=user.id,
+            matched_user_id=matched_user_id,
+            is_mutual=row.is_mutual,
+            created_at=row.created_at,
+        )
+        if match.is_mutual:
             # Increment ratings for both users when match becomes mutual
-            user.increment_rating()
-            matched_user.increment_rating()
-
-            # Create the reverse match
-            reverse_match = Match(
-                user_id=user.id,
-                matched_user_id=matched_user.id,
-                is_mutual=True,
-            )
-            session.add(reverse_match)
-            await session.commit()
+            await RatingService.increment(session, user.id, matched_user_id)
+        else:
+            await RatingService.increment(session, matched_user_id)
 
-            await CacheService.invalidate_suggestions(user.id)
-            await CacheService.invalidate_suggestions(matched_user.id)
+        await CacheService.invalidate_suggestions(user.id)
+        await CacheService.invalidate_suggestions(matched_user_id)
+        await SeenService.mark(user.id, matched_user_id)
+        await SuggestionQueueService.remove(user.id, matched_user_id)
 
+        if match.is_mutual:
             # Notify both users about mutual match
             await NotificationService.notify_mutual_match(
                 user.telegram_id,
-                matched_user.first_name,
+                row.first_name,
             )
             await NotificationService.notify_mutual_match(
-                matched_user.telegram_id,
+                row.telegram_id,
                 user.first_name,
             )
 
-            return reverse_match
-        else:
-            # We already liked this user
-            return existing_match
+        return match
 
     @staticmethod
-    async def _create_new_match(
-        session: AsyncSession, user: User, matched_user: User
-    ) -> Match:
-        """Create a new one-way match."""
-        # Increment the liked user's rating
-        matched_user.increment_rating()
+    async def process_pass(
+        session: AsyncSession, user: User, passed_user_id: UserIdType
+    ) -> None:
+        """
+        Skip a suggested user without liking them.
 
-        # Create new one-way match
-        new_match = Match(
-            user_id=user.id,
-            matched_user_id=matched_user.id,
-            is_mutual=False,
+        Only the seen set is updated, no ``Match`` row is written and the
+        passed user's rating is left alone.
+        """
+        if user.id == passed_user_id:
+            raise ValueError("Cannot pass yourself")
+
+        await MatchingService._get_user_by_id(session, passed_user_id)
+
+        await SeenService.mark(user.id, passed_user_id)
+        await SuggestionQueueService.remove(user.id, passed_user_id)
+        await CacheService.invalidate_suggestions(user.id)
+
+    @staticmethod
+    async def process_swipes(
+        session: AsyncSession,
+        user: User,
+        actions: Sequence[tuple[SwipeActionEnum, UserIdType]],
+    ) -> list[dict]:
+        """
+        Apply an ordered batch of likes and passes in one transaction.
+
+        Target users and existing matches for the whole batch are loaded
+        with one set-based query each, under the same per-pair locks as
+        ``process_like`` whose rules every like follows: blocked users are
+        turned away by the cached block set and by a block check in the
+        target query itself. Caches and queues are updated once after the
+        commit. Invalid items are rejected on their own without failing
+        the batch.
+
+        Returns:
+            One result dict per action, in input order.
+        """
+        target_ids = {target_id for _, target_id in actions} - {user.id}
+
+        blocked_ids = set(
+            await BlockReportService.get_blocked_user_ids(session, user.id)
         )
-        session.add(new_match)
+        users_by_id: dict[UserIdType, User] = {}
+        liked: dict[UserIdType, Match] = {}
+        liked_me: dict[UserIdType, Match] = {}
+        if target_ids:
+            await MatchingService._lock_pairs(session, user.id, target_ids)
+            # The cached block set can miss a block made in the meantime
+            result = await session.execute(
+                select(
+                    User, BlockReportService.blocked(user.id, User.id).label("blocked")
+                ).where(User.id.in_(target_ids))
+            )
+            for target, blocked in result.all():
+                users_by_id[target.id] = target
+                if blocked:
+                    blocked_ids.add(target.id)
+
+            result = await session.execute(
+                select(Match).where(
+                    or_(
+                        and_(
+                            Match.user_id == user.id,
+                            Match.matched_user_id.in_(target_ids),
+                        ),
+                        and_(
+                            Match.user_id.in_(target_ids),
+                            Match.matched_user_id == user.id,
+                        ),
+                    )
+                )
+            )
+            for match in result.scalars().all():
+                if match.user_id == user.id:
+                    liked[match.matched_user_id] = match
+                else:
+                    liked_me[match.user_id] = match
+
+        results = []
+        new_mutual: list[User] = []
+        rated_ids: list[UserIdType] = []
+        for action, target_id in actions:
+            item = {"user_id": target_id, "action": action}
+            results.append(item)
+
+            target = users_by_id.get(target_id)
+            if target_id == user.id:
+                detail = "Cannot match with yourself"
+            elif target is None:
+                detail = f"User with ID {target_id} not found"
+            elif action == SwipeActionEnum.LIKE and target_id in blocked_ids:
+                detail = "Cannot like a blocked user"
+            else:
+                detail = None
+            if detail is not None:
+                item.update(status=SwipeStatusEnum.REJECTED, detail=detail)
+                continue
+
+            if action == SwipeActionEnum.PASS:
+                item["status"] = SwipeStatusEnum.PASSED
+            elif target_id in liked:
+                item.update(
+                    status=SwipeStatusEnum.ALREADY_LIKED, match=liked[target_id]
+                )
+            elif target_id in liked_me:
+                # The other user already liked us - make it mutual
+                liked_me[target_id].is_mutual = True
+                rated_ids.extend((user.id, target_id))
+                match = Match(
+                    user_id=user.id, matched_user_id=target_id, is_mutual=True
+                )
+                session.add(match)
+                liked[target_id] = match
+                new_mutual.append(target)
+                item.update(status=SwipeStatusEnum.MUTUAL, match=match)
+            else:
+                rated_ids.append(target_id)
+                match = Match(
+                    user_id=user.id, matched_user_id=target_id, is_mutual=False
+                )
+                session.add(match)
+                liked[target_id] = match
+                item.update(status=SwipeStatusEnum.LIKED, match=match)
+
+        acted_ids = [
+            item["user_id"]
+            for item in results
+            if item["status"] != SwipeStatusEnum.REJECTED
+        ]
+        if not acted_ids:
+            return results
+
         await session.commit()
 
+        await RatingService.increment(session, *rated_ids)
+
         await CacheService.invalidate_suggestions(user.id)
-        await CacheService.invalidate_suggestions(matched_user.id)
-        return new_match
+        for matched_user in new_mutual:
+            await CacheService.invalidate_suggestions(matched_user.id)
+        # Seen before the queue version changes, so a rebuild that starts
+        # after the removal skips them
+        await SeenService.mark(user.id, *acted_ids)
+        await SuggestionQueueService.remove(user.id, *acted_ids)
+
+        for matched_user in new_mutual:
+            await NotificationService.notify_mutual_match(
+                user.telegram_id,
+                matched_user.first_name,
+            )
+            await NotificationService.notify_mutual_match(
+                matched_user.telegram_id,
+                user.first_name,
+            )
+
+        return results
 
     @staticmethod
     async def get_user_matches(
@@ -280,3 +663,458 @@ class MatchingService:
         matches = list(result.scalars().all())
 
         return matches, total
+
+    @staticmethod
+    async def get_user_matches_by_cursor(
+        session: AsyncSession,
+        user_id: UserIdType,
+        limit: int = 20,
+        cursor: str | None = None,
+    ) -> tuple[list[Match], int, str | None]:
+        """Keyset-paginated variant of ``get_user_matches``."""
+        from sqlalchemy.orm import joinedload
+
+        total_result = await session.execute(
+            select(func.count()).select_from(Match).where(Match.user_id == user_id)
+        )
+        total = total_result.scalar() or 0
+
+        query = select(Match).where(Match.user_id == user_id)
+        if cursor:
+            after = decode_cursor(cursor, datetime, int)
+            query = query.where(tuple_(Match.created_at, Match.id) < tuple_(*after))
+        query = (
+            query.options(joinedload(Match.matched_user))
+            .order_by(Match.created_at.desc(), Match.id.desc())
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        matches = list(result.scalars().all())
+
+        next_cursor = None
+        if len(matches) == limit:
+            last = matches[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+        return matches, total, next_cursor
+
+    @staticmethod
+    async def get_user_inbox(
+        session: AsyncSession,
+        user_id: UserIdType,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> tuple[list[dict], int]:
+        """
+        Get a user's matches by last activity, each with a preview of its
+        latest message and the number of messages the user has not read.
+
+        Both come from LATERAL subqueries in the page query over
+        ``ix_messages_match_id_id``: the latest message is one backward
+        step, unread messages the range above the user's read cursor.
+
+        Returns:
+            Tuple of (inbox items, total count of matches).
+        """
+        from sqlalchemy.orm import joinedload
+
+        total_result = await session.execute(
+            select(func.count()).select_from(Match).where(Match.user_id == user_id)
+        )
+        total = total_result.scalar() or 0
+
+        last_message = (
+            select(
+                func.left(Message.text, INBOX_PREVIEW_LENGTH).label("text"),
+                Message.sender_id,
+                Message.created_at,
+            )
+            .where(Message.match_id == Match.id)
+            .order_by(Message.id.desc())
+            .limit(1)
+            .lateral("last_message")
+        )
+        read_cursor = (
+            select(ReadCursor.last_read_message_id)
+            .where(ReadCursor.match_id == Match.id, ReadCursor.user_id == user_id)
+            .correlate(Match)
+            .scalar_subquery()
+        )
+        unread = (
+            select(func.count().label("count"))
+            .where(
+                Message.match_id == Match.id,
+                Message.id > func.coalesce(read_cursor, 0),
+                Message.sender_id != user_id,
+            )
+            .lateral("unread")
+        )
+        query = (
+            select(Match, last_message, unread.c.count)
+            .select_from(Match)
+            .outerjoin(last_message, true())
+            .join(unread, true())
+            .where(Match.user_id == user_id)
+            .options(joinedload(Match.matched_user))
+            .order_by(
+                func.coalesce(last_message.c.created_at, Match.created_at).desc(),
+                Match.id.desc(),
+            )
+            .limit(limit)
+            .offset(offset)
+        )
+        result = await session.execute(query)
+
+        items = [
+            {
+                "id": match.id,
+                "user_id": match.user_id,
+                "matched_user_id": match.matched_user_id,
+                "is_mutual": match.is_mutual,
+                "matched_user": match.matched_user,
+                "last_message": (
+                    None
+                    if created_at is None
+                    else {
+                        "text": text,
+                        "sender_id": sender_id,
+                        "created_at": created_at,
+                    }
+                ),
+                "unread_count": unread_count,
+            }
+            for match, text, sender_id, created_at, unread_count in result.all()
+        ]
+        return items, total
+
+
+class InterestBitsetEngine:
+    """
+    Optional in-memory interest-overlap scoring engine.
+
+    Every user is one row: interests are packed into uint64 words, so
+    overlap with all candidates is a vectorized AND + popcount, and the
+    gender/active/block filters are boolean masks. Rows are loaded from
+    ``user_interests`` in batches and kept fresh by ``sync``.
+    Requires NumPy and ``settings.matching.engine == "bitset"``.
+    """
+
+    NO_GENDER = -1
+    GENDER_CODES = {GenderEnum.MALE: 0, GenderEnum.FEMALE: 1}
+
+    def __init__(self) -> None:
+        self._row_of: dict[UserIdType, int] = {}
+        self._bit_of: dict[int, int] = {}
+        self._stale: set[UserIdType] = set()
+        self._size = 0
+        self._max_loaded_id: UserIdType = 0
+        self._sync_task: asyncio.Task | None = None
+        self.loaded = False
+
+        if np is not None:
+            self._ids = np.zeros(0, dtype=np.int64)
+            self._gender = np.zeros(0, dtype=np.int8)
+            self._active = np.zeros(0, dtype=bool)
+            self._rating = np.zeros(0, dtype=np.int64)
+            self._created_at = np.zeros(0, dtype=np.float64)
+            self._interest_count = np.zeros(0, dtype=np.int64)
+            self._bits = np.zeros((0, 1), dtype=np.uint64)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.matching.engine == "bitset" and np is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.enabled and self.loaded
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _ensure_capacity(self, rows: int, words: int) -> None:
+        capacity, current_words = self._bits.shape
+        if rows <= capacity and words <= current_words:
+            return
+
+        new_capacity = max(rows, capacity * 2, 1024)
+        new_words = max(words, current_words)
+
+        def grow(array):
+            grown = np.zeros(new_capacity, dtype=array.dtype)
+            grown[: self._size] = array[: self._size]
+            return grown
+
+        self._ids = grow(self._ids)
+        self._gender = grow(self._gender)
+        self._active = grow(self._active)
+        self._rating = grow(self._rating)
+        self._created_at = grow(self._created_at)
+        self._interest_count = grow(self._interest_count)
+
+        bits = np.zeros((new_capacity, new_words), dtype=np.uint64)
+        bits[: self._size, :current_words] = self._bits[: self._size]
+        self._bits = bits
+
+    def _bit(self, interest_id: int) -> int:
+        bit = self._bit_of.get(interest_id)
+        if bit is None:
+            bit = self._bit_of[interest_id] = len(self._bit_of)
+        return bit
+
+    def upsert(
+        self,
+        user_id: UserIdType,
+        gender: GenderEnum | None,
+        is_active: bool,
+        rating: int,
+        created_at: float,
+        interest_ids: Iterable[int],
+    ) -> None:
+        """Insert or replace a single user's row."""
+        self.upsert_many(
+            [(user_id, gender, is_active, rating, created_at)],
+            [(user_id, interest_id) for interest_id in interest_ids],
+        )
+
+    def upsert_many(
+        self,
+        users: Sequence[tuple[UserIdType, GenderEnum | None, bool, int, float]],
+        interests: Iterable[tuple[UserIdType, int]],
+    ) -> None:
+        """
+        Insert or replace rows in bulk.
+
+        Args:
+            users: (id, gender, is_active, rating, created_at timestamp) rows
+            interests: (user_id, interest_id) pairs for exactly those users
+        """
+        if not users:
+            return
+
+        rows = []
+        next_row = self._size
+        for user_id, *_ in users:
+            row = self._row_of.get(user_id)
+            if row is None:
+                row = self._row_of[user_id] = next_row
+                next_row += 1
+            rows.append(row)
+
+        pair_rows = []
+        pair_bits = []
+        for user_id, interest_id in interests:
+            pair_rows.append(self._row_of[user_id])
+            pair_bits.append(self._bit(interest_id))
+
+        self._ensure_capacity(next_row, len(self._bit_of) // 64 + 1)
+        self._size = next_row
+
+        row_index = np.asarray(rows, dtype=np.int64)
+        ids, genders, active, ratings, created_at = zip(*users, strict=True)
+        self._ids[row_index] = ids
+        self._gender[row_index] = [
+            self.GENDER_CODES.get(gender, self.NO_GENDER) for gender in genders
+        ]
+        self._active[row_index] = active
+        self._rating[row_index] = ratings
+        self._created_at[row_index] = created_at
+        self._bits[row_index] = 0
+
+        bit_rows = np.asarray(pair_rows, dtype=np.int64)
+        bits = np.asarray(pair_bits, dtype=np.uint64)
+        np.bitwise_or.at(
+            self._bits,
+            (bit_rows, (bits // 64).astype(np.int64)),
+            np.left_shift(np.uint64(1), bits % np.uint64(64)),
+        )
+        self._interest_count[row_index] = np.bitwise_count(self._bits[row_index]).sum(
+            axis=1
+        )
+
+        self._max_loaded_id = max(self._max_loaded_id, max(ids))
+
+    def deactivate(self, user_id: UserIdType) -> None:
+        row = self._row_of.get(user_id)
+        if row is not None:
+            self._active[row] = False
+
+    def mark_stale(self, *user_ids: UserIdType) -> None:
+        """Reload the users' rows on the next ``sync``."""
+        if self.enabled:
+            self._stale.update(user_ids)
+
+    async def _load_users(
+        self, session: AsyncSession, query: Select
+    ) -> list[UserIdType]:
+        result = await session.execute(query)
+        users = result.all()
+        if not users:
+            return []
+
+        user_ids = [row.id for row in users]
+        interests_result = await session.execute(
+            select(user_interests.c.user_id, user_interests.c.interest_id).where(
+                user_interests.c.user_id.in_(user_ids)
+            )
+        )
+        self.upsert_many(
+            [
+                (
+                    row.id,
+                    row.gender,
+                    row.is_active,
+                    row.rating,
+                    row.created_at.timestamp(),
+                )
+                for row in users
+            ],
+            interests_result.tuples().all(),
+        )
+        return user_ids
+
+    @staticmethod
+    def _user_columns() -> Select:
+        return select(
+            User.id, User.gender, User.is_active, User.rating, User.created_at
+        )
+
+    async def load(self, session: AsyncSession) -> None:
+        """Load every user not loaded yet, in keyset batches by ID."""
+        batch_size = settings.matching.engine_load_batch_size
+        while True:
+            loaded = await self._load_users(
+                session,
+                self._user_columns()
+                .where(User.id > self._max_loaded_id)
+                .order_by(User.id)
+                .limit(batch_size),
+            )
+            if len(loaded) < batch_size:
+                break
+        self.loaded = True
+
+    async def sync(self, session: AsyncSession) -> None:
+        """Load new users and reload rows marked stale."""
+        await self.load(session)
+
+        stale, self._stale = self._stale, set()
+        if stale:
+            reloaded = await self._load_users(
+                session, self._user_columns().where(User.id.in_(stale))
+            )
+            # Users deleted since they were loaded are no longer candidates
+            for user_id in stale.difference(reloaded):
+                self.deactivate(user_id)
+
+    def rank(
+        self,
+        user: User,
+        excluded_ids: Iterable[UserIdType] = (),
+        limit: int = 20,
+        offset: int = 0,
+    ) -> tuple[list[UserIdType], int]:
+        """
+        Rank candidates the same way as the SQL path.
+
+        Ordering is by score (overlap or Jaccard), then rating, then
+        newest account first, then highest ID. ``excluded_ids`` (blocked, liked, seen) are
+        left out, since the engine holds no matches or blocks.
+
+        Returns:
+            Tuple of (ranked candidate IDs, total count of potential matches).
+        """
+        size = self._size
+        ids = self._ids[:size]
+        gender = self._gender[:size]
+        user_gender = self.GENDER_CODES.get(user.gender, self.NO_GENDER)
+
+        if user_gender == self.NO_GENDER:
+            # Mirrors SQL semantics: comparing with NULL gender matches nothing
+            return [], 0
+
+        mask = (
+            self._active[:size]
+            & (gender != user_gender)
+            & (gender != self.NO_GENDER)
+            & (ids != user.id)
+        )
+        excluded = np.fromiter(excluded_ids, dtype=np.int64)
+        if excluded.size:
+            mask &= ~np.isin(ids, excluded)
+
+        candidates = np.flatnonzero(mask)
+        total = int(candidates.size)
+        if total == 0 or offset >= total:
+            return [], total
+
+        # Interests nobody else has never contribute to the overlap
+        user_bits = [
+            self._bit_of[interest.id]
+            for interest in user.interests
+            if interest.id in self._bit_of
+        ]
+        words = sorted({bit // 64 for bit in user_bits})
+        if words:
+            query = np.zeros(len(words), dtype=np.uint64)
+            for bit in user_bits:
+                query[words.index(bit // 64)] |= np.uint64(1 << (bit % 64))
+            overlap = (
+                np.bitwise_count(self._bits[np.ix_(candidates, words)] & query)
+                .sum(axis=1)
+                .astype(np.float64)
+            )
+        else:
+            overlap = np.zeros(total, dtype=np.float64)
+
+        if settings.matching.engine_metric == "jaccard":
+            union = self._interest_count[candidates] + len(user.interests) - overlap
+            score = overlap / np.maximum(union, 1)
+        else:
+            score = overlap
+
+        # Only candidates scoring at least the k-th best can reach the page
+        needed = offset + limit
+        if needed < total:
+            threshold = np.partition(score, total - needed)[total - needed]
+            keep = score >= threshold
+            candidates, score = candidates[keep], score[keep]
+
+        # Last key is primary; the ID breaks full ties as ``id DESC`` does
+        order = np.lexsort(
+            (
+                -self._ids[candidates],
+                -self._created_at[candidates],
+                -self._rating[candidates],
+                -score,
+            )
+        )
+        page = candidates[order[offset:needed]]
+        return self._ids[page].tolist(), total
+
+    async def run_sync(self) -> None:
+        """Keep the engine in sync with the database until cancelled."""
+        while True:
+            try:
+                async with db_helper.session_factory() as session:
+                    await self.sync(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Interest engine sync failed")
+            await asyncio.sleep(settings.matching.engine_sync_interval)
+
+    def start(self) -> None:
+        if self.enabled and self._sync_task is None:
+            self._sync_task = asyncio.create_task(self.run_sync())
+
+    async def stop(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+
+
+interest_engine = InterestBitsetEngine()
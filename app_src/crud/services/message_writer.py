@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from typing import NamedTuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import Message, db_helper
+from core.types.user_id import UserIdType
+from crud.services.chat_service import ChatService
+
+logger = logging.getLogger(__name__)
+
+
+class PendingMessage(NamedTuple):
+    match_id: int
+    sender_id: UserIdType
+    text: str
+    future: asyncio.Future[Message]
+
+
+class MessageWriter:
+    """
+    Group commit for chat messages.
+
+    ``save`` queues a message and waits for it to be written. A background
+    task in every worker takes whatever arrived from all sockets within
+    ``settings.chat.write_max_delay`` seconds, up to ``write_batch_size``
+    messages, and inserts it with one multi-row ``INSERT ... RETURNING``,
+    so a busy worker pays one round trip and one commit per batch rather
+    than per message. A failed batch is retried row by row, so a bad
+    message only fails its own sender. With ``settings.chat.write_batching``
+    off, or before ``start``, messages are saved directly.
+    """
+
+    _queue: asyncio.Queue[PendingMessage | None] | None = None
+    _writer_task: asyncio.Task | None = None
+
+    @classmethod
+    async def save(cls, match_id: int, sender_id: UserIdType, text: str) -> Message:
+        """Persist a message and return it with its ``id`` and ``created_at``."""
+        if cls._writer_task is None or cls._queue is None:
+            async with db_helper.session_factory() as session:
+                return await ChatService.save_message(
+                    session, match_id, sender_id, text
+                )
+
+        future = asyncio.get_running_loop().create_future()
+        await cls._queue.put(PendingMessage(match_id, sender_id, text, future))
+        return await future
+
+    @classmethod
+    async def insert(
+        cls, session: AsyncSession, batch: list[PendingMessage]
+    ) -> list[Message]:
+        """Insert a batch with one statement and commit it."""
+        result = await session.execute(
+            insert(Message).returning(
+                Message.id, Message.created_at, sort_by_parameter_order=True
+            ),
+            [
+                {"match_id": m.match_id, "sender_id": m.sender_id, "text": m.text}
+                for m in batch
+            ],
+        )
+        rows = result.all()
+        await session.commit()
+        return [
+            Message(
+                id=row.id,
+                match_id=pending.match_id,
+                sender_id=pending.sender_id,
+                text=pending.text,
+                created_at=row.created_at,
+            )
+            for pending, row in zip(batch, rows, strict=True)
+        ]
+
+    @classmethod
+    async def write(cls, batch: list[PendingMessage]) -> None:
+        """Write a batch and resolve its senders' futures."""
+        try:
+            async with db_helper.session_factory() as session:
+                messages = await cls.insert(session, batch)
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0].future.done():
+                    batch[0].future.set_exception(e)
+                return
+            logger.warning("Message batch failed, writing one by one", exc_info=True)
+            for pending in batch:
+                await cls.write([pending])
+            return
+
+        for pending, message in zip(batch, messages, strict=True):
+            # A sender whose socket closed meanwhile no longer waits
+            if not pending.future.done():
+                pending.future.set_result(message)
+
+    @classmethod
+    async def run_writer(cls, queue: asyncio.Queue[PendingMessage | None]) -> None:
+        """Write queued messages in batches until ``None`` is queued."""
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            first = await queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = loop.time() + settings.chat.write_max_delay
+            while len(batch) < settings.chat.write_batch_size:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        pending = await queue.get()
+                except TimeoutError:
+                    break
+                if pending is None:
+                    closing = True
+                    break
+                batch.append(pending)
+            await cls.write(batch)
+
+    @classmethod
+    def start(cls) -> None:
+        if settings.chat.write_batching and cls._writer_task is None:
+            cls._queue = asyncio.Queue(maxsize=10 * settings.chat.write_batch_size)
+            cls._writer_task = asyncio.create_task(cls.run_writer(cls._queue))
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Write everything queued so far, then save directly."""
+        if cls._writer_task is None or cls._queue is None:
+            return
+        queue, task = cls._queue, cls._writer_task
+        cls._queue = cls._writer_task = None
+        await queue.put(None)
+        await task
+        # Senders that were blocked on a full queue got in after the None
+        leftovers = []
+        while not queue.empty():
+            pending = queue.get_nowait()
+            if pending is not None:
+                leftovers.append(pending)
+        if leftovers:
+            await cls.write(leftovers)
@@ -0,0 +1,64 @@
+from collections.abc import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import User
+from core.schemas.user import UserRead
+from core.types.user_id import UserIdType
+from crud.services.cache_service import CacheKey, CacheService
+
+
+class ProfileCardService:
+    """
+    Rendered profile cards (``UserRead`` as JSON) cached per user.
+
+    Suggestion pages are cached as ordered ID lists and filled in with
+    cards on every request, so a profile edit only invalidates the one
+    card and popular profiles are stored once rather than in every page
+    that shows them.
+    """
+
+    @staticmethod
+    def _card_key(user_id: UserIdType) -> CacheKey:
+        return ("cards", user_id)
+
+    @staticmethod
+    def render(user: User) -> dict:
+        return UserRead.model_validate(user).model_dump(mode="json")
+
+    @classmethod
+    async def store(cls, users: Iterable[User]) -> list[dict]:
+        """Render and cache the cards of users already loaded."""
+        cards = {cls._card_key(user.id): cls.render(user) for user in users}
+        if cards:
+            await CacheService.mset_json(cards, ttl=settings.cache.cards_ttl)
+        return list(cards.values())
+
+    @classmethod
+    async def get_cards(
+        cls, session: AsyncSession, user_ids: list[UserIdType]
+    ) -> list[dict]:
+        """
+        Cards of ``user_ids`` in order, skipping users that no longer exist.
+
+        Reads every card with one MGET and loads only the missed ones from
+        the database.
+        """
+        found, misses = await CacheService.mget_json(
+            cls._card_key(user_id) for user_id in user_ids
+        )
+        if misses:
+            missed_ids = [user_id for _, user_id in misses]
+            result = await session.execute(select(User).where(User.id.in_(missed_ids)))
+            users = result.scalars().all()
+            cards = await cls.store(users)
+            for user, card in zip(users, cards, strict=True):
+                found[cls._card_key(user.id)] = card
+        return [found[key] for key in map(cls._card_key, user_ids) if key in found]
+
+    @classmethod
+    async def invalidate(cls, user_id: UserIdType) -> None:
+        """Drop a user's card after their profile, interests or photo change."""
+        await CacheService.invalidate(*cls._card_key(user_id))
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from collections import Counter
+
+import redis.asyncio as redis
+from sqlalchemy import Integer, column, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import User, db_helper
+from core.types.user_id import UserIdType
+from crud.services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class RatingService:
+    """
+    Write-behind rating counters.
+
+    Likes only HINCRBY a shared Redis hash of pending deltas. A background
+    task in every worker atomically takes the whole hash and applies it to
+    ``users.rating`` with one batched UPDATE, so concurrent likes of a
+    popular user never contend for its row. Without Redis, or with
+    ``settings.rating.write_behind`` off, increments fall back to an atomic
+    ``rating = rating + n`` UPDATE.
+    """
+
+    _flush_task: asyncio.Task | None = None
+
+    @classmethod
+    def _pending_key(cls) -> str:
+        return CacheService._make_key("rating", "pending")
+
+    @classmethod
+    async def increment(cls, session: AsyncSession, *user_ids: UserIdType) -> None:
+        """
+        Add one rating point per occurrence of each user ID.
+
+        Call after the transaction that caused the change has committed.
+        """
+        deltas = Counter(user_ids)
+        if not deltas:
+            return
+        if settings.rating.write_behind:
+            try:
+                r = await CacheService.get_redis()
+                async with r.pipeline(transaction=False) as pipe:
+                    for user_id, delta in deltas.items():
+                        pipe.hincrby(cls._pending_key(), str(user_id), delta)
+                    await pipe.execute()
+                return
+            except redis.RedisError:
+                logger.warning("Rating counter write error", exc_info=True)
+
+        await cls._apply(session, deltas)
+        await session.commit()
+
+    @classmethod
+    async def _apply(cls, session: AsyncSession, deltas: dict[int, int]) -> None:
+        """
+        Add ``deltas`` to ``users.rating`` in batched atomic UPDATEs.
+
+        Rows are updated in user ID order, so concurrent flushers lock them
+        in the same order and cannot deadlock each other.
+        """
+        items = sorted(deltas.items())
+        batch_size = settings.rating.flush_batch_size
+        for start in range(0, len(items), batch_size):
+            batch = values(
+                column("id", Integer), column("delta", Integer), name="deltas"
+            ).data(items[start : start + batch_size])
+            await session.execute(
+                update(User)
+                .where(User.id == batch.c.id)
+                .values(rating=User.rating + batch.c.delta)
+                .execution_options(synchronize_session=False)
+            )
+
+    @classmethod
+    async def flush(cls, session: AsyncSession) -> int:
+        """
+        Move pending deltas from Redis into ``users.rating``.
+
+        The hash is read and deleted in one MULTI, so concurrent flushers
+        in other workers never apply the same delta twice. Deltas are put
+        back if the UPDATE fails.
+
+        Returns:
+            Number of users whose rating changed.
+        """
+        from crud.services.matches_service import interest_engine
+
+        r = await CacheService.get_redis()
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.hgetall(cls._pending_key())
+            pipe.delete(cls._pending_key())
+            pending, _ = await pipe.execute()
+
+        deltas = {int(user_id): int(delta) for user_id, delta in pending.items()}
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+
+        try:
+            await cls._apply(session, deltas)
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            async with r.pipeline(transaction=False) as pipe:
+                for user_id, delta in deltas.items():
+                    pipe.hincrby(cls._pending_key(), str(user_id), delta)
+                await pipe.execute()
+            raise
+
+        interest_engine.mark_stale(*deltas)
+        return len(deltas)
+
+    @classmethod
+    async def run_flusher(cls) -> None:
+        """Flush pending deltas periodically until cancelled."""
+        while True:
+            await asyncio.sleep(settings.rating.flush_interval)
+            try:
+                async with db_helper.session_factory() as session:
+                    await cls.flush(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Rating flush failed")
+
+    @classmethod
+    def start(cls) -> None:
+        if settings.rating.write_behind and cls._flush_task is None:
+            cls._flush_task = asyncio.create_task(cls.run_flusher())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._flush_task is None:
+            return
+        cls._flush_task.cancel()
+        try:
+            await cls._flush_task
+        except asyncio.CancelledError:
+            pass
+        cls._flush_task = None
+        # Don't leave this worker's last increments waiting for another one
+        try:
+            async with db_helper.session_factory() as session:
+                await cls.flush(session)
+        except Exception:
+            logger.exception("Final rating flush failed")
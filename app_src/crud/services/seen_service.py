@@ -0,0 +1,83 @@
+import logging
+import time
+from collections.abc import Iterable
+
+import redis.asyncio as redis
+
+from core.config import settings
+from core.types.user_id import UserIdType
+from crud.services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class SeenService:
+    """
+    Per-user set of profiles already acted on (liked or passed).
+
+    Stored as a Redis sorted set of the seen user IDs scored by swipe time,
+    so it grows with the user's own swipes rather than with the highest
+    user ID. Each ID counts as seen for ``settings.matching.seen_ttl``
+    after its swipe, letting passed profiles resurface eventually; older
+    members are pruned on the next swipe and the key expires with the
+    last one. Likes are also excluded durably by the ``matchs`` table.
+    """
+
+    @classmethod
+    def _seen_key(cls, user_id: UserIdType) -> str:
+        return CacheService._make_key("seen_ids", user_id)
+
+    @staticmethod
+    def _oldest_seen() -> float:
+        return time.time() - settings.matching.seen_ttl
+
+    @classmethod
+    async def mark(cls, user_id: UserIdType, *seen_user_ids: UserIdType) -> None:
+        """Mark profiles as seen by the user."""
+        if not seen_user_ids:
+            return
+        key = cls._seen_key(user_id)
+        now = time.time()
+        try:
+            r = await CacheService.get_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.zadd(key, dict.fromkeys(seen_user_ids, now))
+                pipe.zremrangebyscore(key, "-inf", f"({cls._oldest_seen()}")
+                pipe.expire(key, settings.matching.seen_ttl)
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Seen set write error", exc_info=True)
+
+    @classmethod
+    async def get_ids(cls, user_id: UserIdType) -> list[UserIdType]:
+        """Get IDs of all profiles the user has seen."""
+        try:
+            r = await CacheService.get_redis()
+            members = await r.zrangebyscore(
+                cls._seen_key(user_id), cls._oldest_seen(), "+inf"
+            )
+        except redis.RedisError:
+            logger.warning("Seen set read error", exc_info=True)
+            return []
+        return [int(member) for member in members]
+
+    @classmethod
+    async def seen_among(
+        cls, user_id: UserIdType, candidate_ids: Iterable[UserIdType]
+    ) -> set[UserIdType]:
+        """Which of ``candidate_ids`` the user has seen, in one ZMSCORE."""
+        candidate_ids = list(candidate_ids)
+        if not candidate_ids:
+            return set()
+        try:
+            r = await CacheService.get_redis()
+            scores = await r.zmscore(cls._seen_key(user_id), candidate_ids)
+        except redis.RedisError:
+            logger.warning("Seen set read error", exc_info=True)
+            return set()
+        oldest = cls._oldest_seen()
+        return {
+            candidate_id
+            for candidate_id, score in zip(candidate_ids, scores, strict=True)
+            if score is not None and score >= oldest
+        }
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import User, db_helper
+from core.types.user_id import UserIdType
+from crud.services.cache_service import CacheService
+from crud.services.seen_service import SeenService
+
+logger = logging.getLogger(__name__)
+
+
+class SuggestionQueueService:
+    """
+    Precomputed per-user suggestion queues stored as Redis sorted sets.
+
+    The ranking query runs once per queue build. Candidates are stored with
+    their inverse rank as score, so any limit/offset page is a single
+    ZRANGE. Candidates that did not fit into the queue are only counted
+    (``overflow``), which keeps ``total`` accurate.
+
+    Every removal bumps the queue's version, and a build only writes its
+    ranking if the version is still the one it started from, so a slow
+    build cannot bring back a candidate removed meanwhile. Pages are still
+    checked against the candidate filter and the seen set when served.
+    """
+
+    _rebuilding: set[UserIdType] = set()
+    _tasks: set[asyncio.Task] = set()
+
+    @classmethod
+    def _queue_key(cls, user_id: UserIdType) -> str:
+        return CacheService._make_key("suggestion_queue", user_id)
+
+    @classmethod
+    def _overflow_key(cls, user_id: UserIdType) -> str:
+        return CacheService._make_key("suggestion_queue", user_id, "overflow")
+
+    @classmethod
+    def _lock_key(cls, user_id: UserIdType) -> str:
+        return CacheService._make_key("suggestion_queue", user_id, "lock")
+
+    @classmethod
+    def _version_key(cls, user_id: UserIdType) -> str:
+        return CacheService._make_key("suggestion_queue", user_id, "version")
+
+    @classmethod
+    async def get_page(
+        cls,
+        session: AsyncSession,
+        user: User,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> tuple[list[User], int]:
+        """
+        Get a page of suggestions from the user's queue.
+
+        Builds the queue on first use and schedules a background rebuild
+        when it runs low. Falls back to the ranking query if Redis is
+        unavailable or the page reaches past the precomputed candidates.
+        """
+        from crud.services.matches_service import MatchingService
+
+        queue_key = cls._queue_key(user.id)
+        try:
+            r = await CacheService.get_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.get(cls._overflow_key(user.id))
+                pipe.zcard(queue_key)
+                pipe.zrange(queue_key, offset, offset + limit - 1, desc=True)
+                overflow, size, members = await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Suggestion queue read error", exc_info=True)
+            return await MatchingService.find_matches_by_interests_and_rating(
+                session=session, user=user, limit=limit, offset=offset
+            )
+
+        if overflow is None:
+            # Queue not built yet or expired
+            candidate_ids, total = await cls.build(session, user)
+            size = len(candidate_ids)
+            overflow = total - size
+            page_ids = candidate_ids[offset : offset + limit]
+        else:
+            overflow = int(overflow)
+            total = size + overflow
+            page_ids = [int(member) for member in members]
+
+        if overflow and offset + limit > size:
+            # Page reaches past the precomputed candidates
+            cls.schedule_rebuild(user.id)
+            return await MatchingService.find_matches_by_interests_and_rating(
+                session=session, user=user, limit=limit, offset=offset
+            )
+
+        # Queued candidates may have been liked, passed, blocked or
+        # deactivated since the queue was built
+        users = await MatchingService.get_users_by_ids(
+            session, page_ids, suggested_to=user
+        )
+        seen_ids = await SeenService.seen_among(user.id, page_ids)
+        users = [u for u in users if u.id not in seen_ids]
+        stale_ids = set(page_ids) - {u.id for u in users}
+        if stale_ids:
+            await cls.remove(user.id, *stale_ids)
+            size -= len(stale_ids)
+            total -= len(stale_ids)
+
+        remaining = size - offset - len(users)
+        if overflow and remaining < settings.matching.queue_refill_threshold:
+            cls.schedule_rebuild(user.id)
+
+        return users, total
+
+    @classmethod
+    async def build(
+        cls, session: AsyncSession, user: User
+    ) -> tuple[list[UserIdType], int]:
+        """
+        Run the ranking query and store the result as the user's queue.
+
+        Returns:
+            Tuple of (ranked candidate IDs, total count of potential matches).
+        """
+        from crud.services.matches_service import MatchingService
+
+        version_key = cls._version_key(user.id)
+        try:
+            r = await CacheService.get_redis()
+            version = await r.get(version_key)
+        except redis.RedisError:
+            logger.warning("Suggestion queue read error", exc_info=True)
+            version = None
+
+        candidate_ids, total = await MatchingService.rank_candidate_ids(
+            session, user, limit=settings.matching.queue_size
+        )
+
+        queue_key = cls._queue_key(user.id)
+        ttl = settings.matching.queue_ttl
+        try:
+            r = await CacheService.get_redis()
+            async with r.pipeline(transaction=True) as pipe:
+                await pipe.watch(version_key)
+                if await pipe.get(version_key) != version:
+                    # Candidates were removed while ranking
+                    logger.debug("Suggestion queue of user_id=%s changed", user.id)
+                    return candidate_ids, total
+                pipe.multi()
+                pipe.delete(queue_key)
+                if candidate_ids:
+                    pipe.zadd(
+                        queue_key,
+                        {
+                            candidate_id: len(candidate_ids) - rank
+                            for rank, candidate_id in enumerate(candidate_ids)
+                        },
+                    )
+                    pipe.expire(queue_key, ttl)
+                pipe.set(
+                    cls._overflow_key(user.id),
+                    total - len(candidate_ids),
+                    ex=ttl,
+                )
+                await pipe.execute()
+        except redis.WatchError:
+            logger.debug("Suggestion queue of user_id=%s changed", user.id)
+        except redis.RedisError:
+            logger.warning("Suggestion queue write error", exc_info=True)
+
+        return candidate_ids, total
+
+    @classmethod
+    def schedule_rebuild(cls, user_id: UserIdType) -> None:
+        """Rebuild the user's queue in the background (once per worker)."""
+        if user_id in cls._rebuilding:
+            return
+        cls._rebuilding.add(user_id)
+        task = asyncio.create_task(cls._rebuild(user_id))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    @classmethod
+    async def _rebuild(cls, user_id: UserIdType) -> None:
+        from crud.services.matches_service import MatchingService
+
+        try:
+            r = await CacheService.get_redis()
+            # Only one worker rebuilds a given queue at a time
+            acquired = await r.set(
+                cls._lock_key(user_id),
+                1,
+                nx=True,
+                ex=settings.matching.queue_lock_ttl,
+            )
+            if not acquired:
+                return
+            async with db_helper.session_factory() as session:
+                user = await MatchingService._get_user_by_id(session, user_id)
+                await cls.build(session, user)
+            await r.delete(cls._lock_key(user_id))
+        except Exception:
+            logger.exception("Suggestion queue rebuild failed for user_id=%s", user_id)
+        finally:
+            cls._rebuilding.discard(user_id)
+
+    @classmethod
+    async def remove(cls, user_id: UserIdType, *candidate_ids: UserIdType) -> None:
+        """Remove candidates (liked, blocked) from the user's queue."""
+        if not candidate_ids:
+            return
+        version_key = cls._version_key(user_id)
+        try:
+            r = await CacheService.get_redis()
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.zrem(cls._queue_key(user_id), *candidate_ids)
+                pipe.incr(version_key)
+                pipe.expire(version_key, settings.matching.queue_ttl)
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Suggestion queue write error", exc_info=True)
+
+    @classmethod
+    async def drop(cls, *user_ids: UserIdType) -> None:
+        """Drop queues so they are rebuilt on the next request."""
+        if not user_ids:
+            return
+        try:
+            r = await CacheService.get_redis()
+            async with r.pipeline(transaction=True) as pipe:
+                for user_id in user_ids:
+                    version_key = cls._version_key(user_id)
+                    pipe.delete(cls._queue_key(user_id), cls._overflow_key(user_id))
+                    pipe.incr(version_key)
+                    pipe.expire(version_key, settings.matching.queue_ttl)
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Suggestion queue delete error", exc_info=True)
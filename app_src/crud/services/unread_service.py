@@ -0,0 +1,233 @@
+import asyncio
+import logging
+from collections.abc import Iterable
+
+import redis.asyncio as redis
+from sqlalchemy import and_, func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import Match, Message, ReadCursor, db_helper
+from core.types.user_id import UserIdType
+from crud.services.cache_service import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadService:
+    """
+    Unread message counters per user and match.
+
+    Every user has a Redis hash of match ID to the number of messages
+    they have not read there. Sending a message HINCRBYs the recipient's
+    field and marking a chat as read deletes the reader's, so reading the
+    counts is one HGETALL instead of an aggregate over ``messages``.
+
+    A hash loaded from the database carries a baseline field; one without
+    it (expired, or only ever incremented) is reloaded on the next read.
+    Counts can still drift, e.g. when an increment fails or a message
+    lands while its chat is being marked read, so a background task
+    rewrites every hash from the database now and then, in one worker at
+    a time. With ``settings.unread.counters`` off, counts are computed
+    from the database on every read.
+    """
+
+    _BASELINE = "baseline"
+    _reconcile_task: asyncio.Task | None = None
+
+    @classmethod
+    def _key(cls, user_id: UserIdType | str) -> str:
+        return CacheService._make_key("unread", user_id)
+
+    @classmethod
+    def _lock_key(cls) -> str:
+        return CacheService._make_key("unread_reconcile", "lock")
+
+    @classmethod
+    async def increment(cls, match_id: int, user_id: UserIdType) -> None:
+        """Count one more message ``user_id`` has not read in the match."""
+        if not settings.unread.counters:
+            return
+        try:
+            r = await CacheService.get_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.hincrby(cls._key(user_id), str(match_id), 1)
+                pipe.expire(cls._key(user_id), settings.unread.ttl)
+                await pipe.execute()
+        except redis.RedisError:
+            logger.warning("Unread counter write error", exc_info=True)
+
+    @classmethod
+    async def reset(cls, match_id: int, user_id: UserIdType) -> None:
+        """Clear the user's unread count for the match."""
+        if not settings.unread.counters:
+            return
+        try:
+            r = await CacheService.get_redis()
+            await r.hdel(cls._key(user_id), str(match_id))
+        except redis.RedisError:
+            logger.warning("Unread counter write error", exc_info=True)
+
+    @classmethod
+    async def get_counts(
+        cls, session: AsyncSession, user_id: UserIdType
+    ) -> dict[int, int]:
+        """
+        Unread messages of the user by match ID, leaving out read chats.
+
+        Served from the user's hash; a hash without a baseline is rebuilt
+        from the database first.
+        """
+        if settings.unread.counters:
+            try:
+                r = await CacheService.get_redis()
+                stored = await r.hgetall(cls._key(user_id))
+                if cls._BASELINE in stored:
+                    counts = {
+                        int(match_id): int(count)
+                        for match_id, count in stored.items()
+                        if match_id != cls._BASELINE
+                    }
+                    return {m: count for m, count in counts.items() if count > 0}
+            except redis.RedisError:
+                logger.warning("Unread counter read error", exc_info=True)
+
+        counts = (await cls.count_from_db(session, [user_id])).get(user_id, {})
+        if settings.unread.counters:
+            try:
+                await cls._store({user_id: counts})
+            except redis.RedisError:
+                logger.warning("Unread counter write error", exc_info=True)
+        return counts
+
+    @staticmethod
+    async def count_from_db(
+        session: AsyncSession, user_ids: Iterable[UserIdType]
+    ) -> dict[UserIdType, dict[int, int]]:
+        """
+        Unread messages by user and match ID, as the inbox counts them.
+
+        For every mutual match of the users, the messages from the other
+        participant above the user's read cursor: one range of
+        ``ix_messages_match_id_id`` per match.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        participants = union_all(
+            select(Match.id.label("match_id"), Match.user_id.label("user_id")).where(
+                Match.user_id.in_(user_ids), Match.is_mutual
+            ),
+            select(Match.id, Match.matched_user_id).where(
+                Match.matched_user_id.in_(user_ids), Match.is_mutual
+            ),
+        ).subquery("participants")
+        result = await session.execute(
+            select(participants.c.user_id, participants.c.match_id, func.count())
+            .select_from(participants)
+            .outerjoin(
+                ReadCursor,
+                and_(
+                    ReadCursor.match_id == participants.c.match_id,
+                    ReadCursor.user_id == participants.c.user_id,
+                ),
+            )
+            .join(
+                Message,
+                and_(
+                    Message.match_id == participants.c.match_id,
+                    Message.id > func.coalesce(ReadCursor.last_read_message_id, 0),
+                    Message.sender_id != participants.c.user_id,
+                ),
+            )
+            .group_by(participants.c.user_id, participants.c.match_id)
+        )
+        counts: dict[UserIdType, dict[int, int]] = {}
+        for user_id, match_id, count in result.all():
+            counts.setdefault(user_id, {})[match_id] = count
+        return counts
+
+    @classmethod
+    async def _store(cls, counts: dict[UserIdType, dict[int, int]]) -> None:
+        """Replace the users' hashes with ``counts``, marked as baseline."""
+        r = await CacheService.get_redis()
+        async with r.pipeline(transaction=True) as pipe:
+            for user_id, user_counts in counts.items():
+                key = cls._key(user_id)
+                pipe.delete(key)
+                pipe.hset(key, mapping={cls._BASELINE: 0, **user_counts})
+                pipe.expire(key, settings.unread.ttl)
+            await pipe.execute()
+
+    @classmethod
+    async def reconcile(cls, session: AsyncSession) -> int:
+        """
+        Rewrite every counter hash in Redis from the database.
+
+        Users are recounted in batches of
+        ``settings.unread.reconcile_batch_size``. An increment that lands
+        between a batch's query and its write is lost until the next run.
+
+        Returns:
+            Number of users reconciled.
+        """
+        r = await CacheService.get_redis()
+        batch_size = settings.unread.reconcile_batch_size
+        reconciled = 0
+        user_ids: list[int] = []
+        async for key in r.scan_iter(match=cls._key("*"), count=batch_size):
+            user_ids.append(int(key.rsplit(":", 1)[1]))
+            if len(user_ids) >= batch_size:
+                reconciled += await cls._reconcile_users(session, user_ids)
+                user_ids = []
+        if user_ids:
+            reconciled += await cls._reconcile_users(session, user_ids)
+        return reconciled
+
+    @classmethod
+    async def _reconcile_users(
+        cls, session: AsyncSession, user_ids: list[UserIdType]
+    ) -> int:
+        counts = await cls.count_from_db(session, user_ids)
+        await cls._store({user_id: counts.get(user_id, {}) for user_id in user_ids})
+        return len(user_ids)
+
+    @classmethod
+    async def run_reconciler(cls) -> None:
+        """Reconcile periodically until cancelled."""
+        while True:
+            await asyncio.sleep(settings.unread.reconcile_interval)
+            try:
+                r = await CacheService.get_redis()
+                # The lock outlives the run, so one worker reconciles per
+                # interval
+                acquired = await r.set(
+                    cls._lock_key(),
+                    1,
+                    nx=True,
+                    ex=settings.unread.reconcile_interval,
+                )
+                if not acquired:
+                    continue
+                async with db_helper.session_factory() as session:
+                    await cls.reconcile(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Unread counter reconciliation failed")
+
+    @classmethod
+    def start(cls) -> None:
+        if settings.unread.counters and cls._reconcile_task is None:
+            cls._reconcile_task = asyncio.create_task(cls.run_reconciler())
+
+    @classmethod
+    async def stop(cls) -> None:
+        if cls._reconcile_task is None:
+            return
+        cls._reconcile_task.cancel()
+        try:
+            await cls._reconcile_task
+        except asyncio.CancelledError:
+            pass
+        cls._reconcile_task = None
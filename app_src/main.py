@@ -20,6 +20,10 @@ from api import ws_router as api_ws_router
 from core.config import settings
 from crud.services.cache_service import CacheService
 from crud.services.connection_manager import manager as ws_manager
+from crud.services.matches_service import interest_engine
+from crud.services.message_writer import MessageWriter
+from crud.services.rating_service import RatingService
+from crud.services.unread_service import UnreadService
 
 logging.basicConfig(
     level=logging.INFO,
@@ -73,9 +77,22 @@ main_app.include_router(
 )
 
 
+@main_app.on_event("startup")
+async def startup_services():
+    interest_engine.start()
+    RatingService.start()
+    CacheService.start()
+    MessageWriter.start()
+    UnreadService.start()
+
+
 @main_app.on_event("shutdown")
 async def shutdown_services():
+    await interest_engine.stop()
+    await RatingService.stop()
     await CacheService.close()
+    await MessageWriter.stop()
+    await UnreadService.stop()
     await ws_manager.close()
 
 
@@ -1,12 +1,38 @@
 """Unit tests for BlockReportService."""
 
-from unittest.mock import AsyncMock, MagicMock
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+import redis.asyncio as redis
 
-from core.models import Block
+from core.config import settings
+from core.models import Block, User
 from core.models.enums import ReportReasonEnum
 from crud.services.block_report_service import BlockReportService
+from crud.services.cache_service import CacheService
+from crud.services.suggestion_queue_service import SuggestionQueueService
+
+
+def make_pipeline():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    return pipe
+
+
+@pytest.fixture(autouse=True)
+def mock_redis():
+    """Redis client with no cached block sets; the LRU starts empty."""
+    r = MagicMock()
+    r.smembers = AsyncMock(return_value=set())
+    r.pipeline.return_value = make_pipeline()
+    BlockReportService._local.clear()
+    CacheService._redis = r
+    yield r
+    BlockReportService._local.clear()
+    CacheService._redis = None
 
 
 class TestBlockUser:
@@ -34,12 +60,36 @@ class TestBlockUser:
         mock_result.scalar_one_or_none.return_value = None
         session.execute.return_value = mock_result
 
-        result = await BlockReportService.block_user(session, 1, 2)
+        with patch.object(
+            SuggestionQueueService, "remove", new_callable=AsyncMock
+        ) as mock_remove:
+            result = await BlockReportService.block_user(session, 1, 2)
 
         assert result.user_id == 1
         assert result.blocked_user_id == 2
         session.add.assert_called_once()
         session.commit.assert_awaited_once()
+        mock_remove.assert_any_await(1, 2)
+        mock_remove.assert_any_await(2, 1)
+
+    async def test_block_updates_both_block_sets(self, session, mock_redis):
+        BlockReportService._remember(1, frozenset({5}))
+        mock_result = MagicMock()
+        mock_result.scalar_one_or_none.return_value = None
+        session.execute.return_value = mock_result
+
+        with patch.object(SuggestionQueueService, "remove", new_callable=AsyncMock):
+            await BlockReportService.block_user(session, 1, 2)
+
+        assert BlockReportService._local[1][1] == {2, 5}
+        # Not cached locally, so it is left to the next read
+        assert 2 not in BlockReportService._local
+        pipe = mock_redis.pipeline.return_value
+        assert [c.args for c in pipe.sadd.call_args_list] == [
+            ("dating:blocks:1", 2),
+            ("dating:blocks:2", 1),
+        ]
+        assert pipe.publish.call_count == 2
 
 
 class TestUnblockUser:
@@ -61,54 +111,197 @@ class TestUnblockUser:
         mock_result.scalar_one_or_none.return_value = existing
         session.execute.return_value = mock_result
 
-        await BlockReportService.unblock_user(session, 1, 2)
+        with patch.object(
+            SuggestionQueueService, "drop", new_callable=AsyncMock
+        ) as mock_drop:
+            await BlockReportService.unblock_user(session, 1, 2)
 
         session.delete.assert_awaited_once_with(existing)
         session.commit.assert_awaited_once()
+        mock_drop.assert_awaited_once_with(1, 2)
+
+    async def test_unblock_updates_both_block_sets(self, session, mock_redis):
+        BlockReportService._remember(1, frozenset({2, 5}))
+        BlockReportService._remember(2, frozenset({1}))
+        existing = Block(user_id=1, blocked_user_id=2)
+        found, not_found = MagicMock(), MagicMock()
+        found.scalar_one_or_none.return_value = existing
+        not_found.scalar_one_or_none.return_value = None
+        session.execute.side_effect = [found, not_found]
+
+        with patch.object(SuggestionQueueService, "drop", new_callable=AsyncMock):
+            await BlockReportService.unblock_user(session, 1, 2)
+
+        assert BlockReportService._local[1][1] == {5}
+        assert BlockReportService._local[2][1] == set()
+        pipe = mock_redis.pipeline.return_value
+        assert [c.args for c in pipe.srem.call_args_list] == [
+            ("dating:blocks:1", 2),
+            ("dating:blocks:2", 1),
+        ]
+
+    async def test_unblock_keeps_pair_blocked_the_other_way(self, session, mock_redis):
+        BlockReportService._remember(1, frozenset({2}))
+        mock_result = MagicMock()
+        mock_result.scalar_one_or_none.return_value = Block(
+            user_id=1, blocked_user_id=2
+        )
+        session.execute.return_value = mock_result
+
+        with patch.object(SuggestionQueueService, "drop", new_callable=AsyncMock):
+            await BlockReportService.unblock_user(session, 1, 2)
+
+        assert BlockReportService._local[1][1] == {2}
+        mock_redis.pipeline.assert_not_called()
 
 
 class TestGetBlockedUserIds:
     async def test_returns_ids_from_both_directions(self):
         session = AsyncMock()
 
-        # Первый вызов — заблокированные мной
-        mock_result1 = MagicMock()
-        mock_result1.scalars.return_value.all.return_value = [2, 3]
-        # Второй вызов — заблокировавшие меня
-        mock_result2 = MagicMock()
-        mock_result2.scalars.return_value.all.return_value = [4]
-
-        session.execute.side_effect = [mock_result1, mock_result2]
+        mock_result = MagicMock()
+        mock_result.scalars.return_value.all.return_value = [2, 3, 4]
+        session.execute.return_value = mock_result
 
         result = await BlockReportService.get_blocked_user_ids(session, 1)
 
-        assert set(result) == {2, 3, 4}
+        assert result == {2, 3, 4}
+        session.execute.assert_awaited_once()
+        query = str(session.execute.await_args.args[0])
+        assert "blocks.user_id = " in query
+        assert "OR blocks.blocked_user_id = " in query
 
     async def test_returns_empty_when_no_blocks(self):
         session = AsyncMock()
 
         mock_result = MagicMock()
         mock_result.scalars.return_value.all.return_value = []
+        session.execute.return_value = mock_result
 
-        session.execute.side_effect = [mock_result, mock_result]
+        result = await BlockReportService.get_blocked_user_ids(session, 1)
+
+        assert result == frozenset()
+
+    async def test_deduplicates_in_sql(self):
+        session = AsyncMock()
+        session.execute.return_value = MagicMock()
+
+        await BlockReportService.get_blocked_user_ids(session, 1)
+
+        assert "SELECT DISTINCT" in str(session.execute.await_args.args[0])
+
+    async def test_miss_populates_redis_with_marker(self, mock_redis):
+        session = AsyncMock()
+        mock_result = MagicMock()
+        mock_result.scalars.return_value.all.return_value = [2]
+        session.execute.return_value = mock_result
+
+        await BlockReportService.get_blocked_user_ids(session, 1)
+
+        pipe = mock_redis.pipeline.return_value
+        pipe.sadd.assert_called_once_with("dating:blocks:1", "*", 2)
+        pipe.expire.assert_called_once_with(
+            "dating:blocks:1", settings.cache.blocks_ttl
+        )
+
+    async def test_redis_hit_skips_database(self, mock_redis):
+        mock_redis.smembers.return_value = {"*", "2", "7"}
+        session = AsyncMock()
 
         result = await BlockReportService.get_blocked_user_ids(session, 1)
 
-        assert result == []
+        assert result == {2, 7}
+        session.execute.assert_not_awaited()
 
-    async def test_deduplicates_ids(self):
+    async def test_set_without_marker_is_reloaded(self, mock_redis):
+        # Created by block_user's SADD before the set was ever loaded
+        mock_redis.smembers.return_value = {"2"}
         session = AsyncMock()
+        mock_result = MagicMock()
+        mock_result.scalars.return_value.all.return_value = [2, 3]
+        session.execute.return_value = mock_result
 
-        mock_result1 = MagicMock()
-        mock_result1.scalars.return_value.all.return_value = [2]
-        mock_result2 = MagicMock()
-        mock_result2.scalars.return_value.all.return_value = [2]
+        result = await BlockReportService.get_blocked_user_ids(session, 1)
 
-        session.execute.side_effect = [mock_result1, mock_result2]
+        assert result == {2, 3}
+
+    async def test_local_hit_skips_redis(self, mock_redis):
+        BlockReportService._remember(1, frozenset({2}))
+        session = AsyncMock()
 
         result = await BlockReportService.get_blocked_user_ids(session, 1)
 
-        assert result == [2]
+        assert result == {2}
+        mock_redis.smembers.assert_not_awaited()
+
+    async def test_expired_local_entry_is_refreshed(self, mock_redis):
+        BlockReportService._local[1] = (time.monotonic() - 1, frozenset({2}))
+        mock_redis.smembers.return_value = {"*"}
+
+        result = await BlockReportService.get_blocked_user_ids(AsyncMock(), 1)
+
+        assert result == frozenset()
+
+    async def test_local_cache_evicts_least_recently_used(self):
+        with patch.object(settings.cache, "blocks_local_size", 2):
+            BlockReportService._remember(1, frozenset())
+            BlockReportService._remember(2, frozenset())
+            await BlockReportService.get_blocked_user_ids(AsyncMock(), 1)
+            BlockReportService._remember(3, frozenset())
+
+        assert list(BlockReportService._local) == [1, 3]
+
+    async def test_redis_error_falls_back_to_database(self, mock_redis):
+        mock_redis.smembers.side_effect = redis.ConnectionError("down")
+        mock_redis.pipeline.side_effect = redis.ConnectionError("down")
+        session = AsyncMock()
+        mock_result = MagicMock()
+        mock_result.scalars.return_value.all.return_value = [2]
+        session.execute.return_value = mock_result
+
+        result = await BlockReportService.get_blocked_user_ids(session, 1)
+
+        assert result == {2}
+
+
+class TestForget:
+    def test_drops_entry_changed_by_another_worker(self):
+        BlockReportService._remember(1, frozenset({2}))
+        BlockReportService._remember(3, frozenset())
+
+        BlockReportService._forget("dating:blocks:1")
+
+        assert list(BlockReportService._local) == [3]
+
+    def test_drops_everything_after_missed_messages(self):
+        BlockReportService._remember(1, frozenset({2}))
+
+        BlockReportService._forget(None)
+
+        assert not BlockReportService._local
+
+    def test_registered_for_block_keys(self):
+        assert CacheService._invalidation_handlers["blocks"] == (
+            BlockReportService._forget
+        )
+
+
+class TestIsBlocked:
+    async def test_checks_membership_of_block_set(self):
+        BlockReportService._remember(1, frozenset({2}))
+
+        assert await BlockReportService.is_blocked(AsyncMock(), 1, 2)
+        assert not await BlockReportService.is_blocked(AsyncMock(), 1, 3)
+
+
+class TestNotBlocked:
+    def test_anti_joins_both_directions(self):
+        clause = BlockReportService.not_blocked(1, User.id)
+
+        sql = str(clause)
+        assert sql.startswith("NOT (EXISTS")
+        assert "blocks.blocked_user_id = users.id" in sql
+        assert "blocks.user_id = users.id" in sql
 
 
 class TestReportUser:
@@ -0,0 +1,67 @@
+"""Unit tests for the cached value format."""
+
+from datetime import datetime
+
+import pytest
+
+from utils import cache_codec
+
+VALUE = {"items": [{"id": 1, "bio": "hello " * 100}], "total": 1}
+
+needs_msgpack = pytest.mark.skipif(
+    cache_codec.msgpack is None, reason="msgpack is not installed"
+)
+
+
+class TestEncode:
+    @pytest.mark.parametrize(
+        "codec", ["orjson", pytest.param("msgpack", marks=needs_msgpack)]
+    )
+    def test_round_trip(self, codec):
+        assert cache_codec.decode(cache_codec.encode(VALUE, codec)) == VALUE
+
+    def test_non_json_values_become_strings(self):
+        plain = cache_codec.encode({"at": datetime(2025, 1, 1)})
+
+        assert cache_codec.decode(plain) == {"at": "2025-01-01T00:00:00"}
+
+    @needs_msgpack
+    def test_marker_names_the_codec(self):
+        assert cache_codec.encode(VALUE, "msgpack")[:1] == b"m"
+        assert cache_codec.encode(VALUE, "orjson")[:1] == b"j"
+
+    def test_unknown_format_raises(self):
+        with pytest.raises(ValueError, match="Unknown cache format"):
+            cache_codec.decode(b'{"items": []}')
+
+
+class TestCompress:
+    @pytest.mark.parametrize("compression", ["none", "zstd", "lz4"])
+    def test_round_trip(self, compression):
+        if not cache_codec.available(compression):
+            pytest.skip(f"{compression} is not installed")
+        plain = cache_codec.encode(VALUE)
+
+        stored = cache_codec.compress(plain, compression, min_size=0)
+
+        assert cache_codec.decompress(stored) == plain
+
+    @pytest.mark.parametrize("compression", ["zstd", "lz4"])
+    def test_compresses_large_values(self, compression):
+        if not cache_codec.available(compression):
+            pytest.skip(f"{compression} is not installed")
+        plain = cache_codec.encode(VALUE)
+
+        stored = cache_codec.compress(plain, compression, min_size=100)
+
+        assert stored[:1] == cache_codec.COMPRESSIONS[compression]
+        assert len(stored) < len(plain)
+
+    def test_small_values_stay_uncompressed(self):
+        plain = cache_codec.encode({"id": 1})
+
+        assert cache_codec.compress(plain, "zstd", min_size=100) == b"-" + plain
+
+    def test_unknown_compression_raises(self):
+        with pytest.raises(ValueError, match="Unknown cache compression"):
+            cache_codec.decompress(b'{"items": []}')
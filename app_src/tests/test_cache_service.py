@@ -1,26 +1,49 @@
 """Unit tests for CacheService."""
 
-from unittest.mock import AsyncMock, patch
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 import pytest
+import redis.asyncio as redis
 
-from crud.services.cache_service import CacheService
+from core.config import settings
+
+from crud.services.cache_service import LOCAL_CACHE_REQUESTS, CacheService
+
+
+def make_pipeline():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    return pipe
+
+
+@pytest.fixture(autouse=True)
+def reset_local():
+    CacheService._local_clear()
+    yield
+    CacheService._local_clear()
 
 
 class TestCacheService:
     @pytest.fixture(autouse=True)
     def reset_redis(self):
-        CacheService._redis = None
+        CacheService._redis = CacheService._binary_redis = None
         yield
-        CacheService._redis = None
+        CacheService._redis = CacheService._binary_redis = None
 
     @pytest.fixture
     def mock_redis(self):
-        return AsyncMock()
+        r = AsyncMock()
+        r.pipeline = MagicMock(return_value=make_pipeline())
+        return r
 
     async def test_get_json_returns_cached_data(self, mock_redis):
-        mock_redis.get.return_value = '{"items": [1, 2, 3]}'
-        CacheService._redis = mock_redis
+        mock_redis.get.return_value = b'-j{"items": [1, 2, 3]}'
+        CacheService._redis = CacheService._binary_redis = mock_redis
 
         result = await CacheService.get_json("suggestions", 1, 20, 0)
 
@@ -29,7 +52,7 @@ class TestCacheService:
 
     async def test_get_json_returns_none_on_miss(self, mock_redis):
         mock_redis.get.return_value = None
-        CacheService._redis = mock_redis
+        CacheService._redis = CacheService._binary_redis = mock_redis
 
         result = await CacheService.get_json("suggestions", 1, 20, 0)
 
@@ -39,20 +62,20 @@ class TestCacheService:
         import redis.asyncio as redis
 
         mock_redis.get.side_effect = redis.RedisError("connection refused")
-        CacheService._redis = mock_redis
+        CacheService._redis = CacheService._binary_redis = mock_redis
 
         result = await CacheService.get_json("suggestions", 1, 20, 0)
 
         assert result is None
 
     async def test_set_json_stores_data_with_ttl(self, mock_redis):
-        CacheService._redis = mock_redis
+        CacheService._redis = CacheService._binary_redis = mock_redis
 
         await CacheService.set_json({"items": []}, "suggestions", 1, 20, 0, ttl=300)
 
         mock_redis.set.assert_awaited_once_with(
             "dating:suggestions:1:20:0",
-            '{"items": []}',
+            b'-j{"items":[]}',
             ex=300,
         )
 
@@ -60,40 +83,92 @@ class TestCacheService:
         import redis.asyncio as redis
 
         mock_redis.set.side_effect = redis.RedisError("connection refused")
-        CacheService._redis = mock_redis
+        CacheService._redis = CacheService._binary_redis = mock_redis
 
         # Should not raise
         await CacheService.set_json({"items": []}, "suggestions", 1, ttl=60)
 
-    async def test_delete_pattern_scans_and_deletes(self, mock_redis):
-        mock_redis.scan.return_value = (
-            0,
-            ["dating:suggestions:1:20:0", "dating:suggestions:1:20:20"],
-        )
-        CacheService._redis = mock_redis
+    async def test_raw_values_are_stored_as_is(self, mock_redis):
+        CacheService._redis = CacheService._binary_redis = mock_redis
 
-        await CacheService.delete_pattern("suggestions", 1, "")
+        await CacheService.set_raw(b'{"items":[]}', "interests", "popular", ttl=60)
 
-        mock_redis.scan.assert_awaited_once()
-        mock_redis.delete.assert_awaited_once_with(
-            "dating:suggestions:1:20:0", "dating:suggestions:1:20:20"
+        mock_redis.set.assert_awaited_once_with(
+            "dating:interests:popular", b'-r{"items":[]}', ex=60
         )
+        assert await CacheService.get_raw("interests", "popular") == b'{"items":[]}'
+        mock_redis.get.assert_not_awaited()
 
-    async def test_delete_pattern_handles_empty_result(self, mock_redis):
-        mock_redis.scan.return_value = (0, [])
-        CacheService._redis = mock_redis
+    async def test_compressed_values_are_read_back(self, mock_redis):
+        CacheService._redis = CacheService._binary_redis = mock_redis
+        value = {"items": ["x" * 2000]}
+
+        with patch.object(settings.cache, "compression", "zstd"):
+            await CacheService.set_json(value, "k", ttl=60)
+        stored = mock_redis.set.await_args.args[1]
+        CacheService._local_clear()
+        mock_redis.get.return_value = stored
+
+        assert stored[:1] == b"z"
+        assert len(stored) < 2000
+        assert await CacheService.get_json("k") == value
+
+    async def test_unreadable_value_is_a_miss(self, mock_redis):
+        # e.g. written before values had format markers
+        mock_redis.get.return_value = b'{"items": []}'
+        CacheService._redis = CacheService._binary_redis = mock_redis
+
+        assert await CacheService.get_json("k") is None
+        assert await CacheService.get_raw("k") is None
+
+    async def test_json_value_is_not_read_as_raw(self, mock_redis):
+        mock_redis.get.return_value = b'-j{"items": []}'
+        CacheService._redis = CacheService._binary_redis = mock_redis
+
+        assert await CacheService.get_raw("k") is None
+
+    async def test_suggestions_key_embeds_version(self, mock_redis):
+        mock_redis.get.return_value = "3"
+        CacheService._redis = CacheService._binary_redis = mock_redis
+
+        key = await CacheService.suggestions_key(1, 20, 0)
+
+        assert key == ("suggestions", 1, "v3", 20, 0)
+        mock_redis.get.assert_awaited_once_with("dating:suggestions:1:version")
+
+    async def test_suggestions_key_starts_at_version_zero(self, mock_redis):
+        mock_redis.get.return_value = None
+        CacheService._redis = CacheService._binary_redis = mock_redis
+
+        key = await CacheService.suggestions_key(1, 20, 0)
 
-        await CacheService.delete_pattern("suggestions", 1, "")
+        assert key == ("suggestions", 1, "v0", 20, 0)
 
+    async def test_suggestions_key_none_on_redis_error(self, mock_redis):
+        import redis.asyncio as redis
+
+        mock_redis.get.side_effect = redis.RedisError("connection refused")
+        CacheService._redis = CacheService._binary_redis = mock_redis
+
+        assert await CacheService.suggestions_key(1, 20, 0) is None
+
+    async def test_invalidate_suggestions_bumps_version(self, mock_redis):
+        CacheService._redis = CacheService._binary_redis = mock_redis
+
+        await CacheService.invalidate_suggestions(42)
+
+        mock_redis.incr.assert_awaited_once_with("dating:suggestions:42:version")
+        mock_redis.scan.assert_not_awaited()
         mock_redis.delete.assert_not_awaited()
 
-    async def test_invalidate_suggestions_delegates_to_delete_pattern(self, mock_redis):
-        mock_redis.scan.return_value = (0, [])
-        CacheService._redis = mock_redis
+    async def test_invalidate_suggestions_silent_on_redis_error(self, mock_redis):
+        import redis.asyncio as redis
 
-        with patch.object(CacheService, "delete_pattern") as mock_delete:
-            await CacheService.invalidate_suggestions(42)
-            mock_delete.assert_awaited_once_with("suggestions", 42, "")
+        mock_redis.incr.side_effect = redis.RedisError("connection refused")
+        CacheService._redis = CacheService._binary_redis = mock_redis
+
+        # Should not raise
+        await CacheService.invalidate_suggestions(42)
 
     async def test_make_key_builds_correct_format(self):
         key = CacheService._make_key("suggestions", 1, 20, 0)
@@ -110,3 +185,356 @@ class TestCacheService:
     async def test_close_noop_when_no_connection(self):
         CacheService._redis = None
         await CacheService.close()  # Should not raise
+
+
+class TestGetOrCompute:
+    @pytest.fixture(autouse=True)
+    def mock_redis(self):
+        r = AsyncMock()
+        r.get.return_value = None
+        r.set.return_value = True
+        r.pipeline = MagicMock(return_value=make_pipeline())
+        CacheService._redis = CacheService._binary_redis = r
+        yield r
+        CacheService._redis = CacheService._binary_redis = None
+
+    @staticmethod
+    def entry(body: bytes, fresh_for: float) -> bytes:
+        fresh_until = CacheService._FRESH_UNTIL.pack(time.time() + fresh_for)
+        return b"-r" + fresh_until + body
+
+    async def test_miss_computes_and_stores_under_lock(self, mock_redis):
+        compute = AsyncMock(return_value=b"page 1")
+
+        result = await CacheService.get_or_compute(
+            compute, "suggestions", 1, ttl=300, soft_ttl=60
+        )
+
+        assert result == b"page 1"
+        compute.assert_awaited_once()
+        lock_call, store_call = mock_redis.set.await_args_list
+        assert lock_call.args[0] == "dating:suggestions:1:lock"
+        assert lock_call.kwargs == {"nx": True, "ex": settings.cache.lock_ttl}
+        key, data = store_call.args
+        assert key == "dating:suggestions:1"
+        assert data.endswith(b"page 1")
+        assert store_call.kwargs == {"ex": 300}
+        mock_redis.delete.assert_awaited_once_with("dating:suggestions:1:lock")
+
+    async def test_fresh_hit_skips_compute(self, mock_redis):
+        mock_redis.get.return_value = self.entry(b"page 1", 60)
+        compute = AsyncMock()
+
+        result = await CacheService.get_or_compute(compute, "k", ttl=300, soft_ttl=60)
+
+        assert result == b"page 1"
+        compute.assert_not_awaited()
+
+    async def test_stale_hit_is_served_and_refreshed(self, mock_redis):
+        mock_redis.get.return_value = self.entry(b"page 1", -1)
+        compute = AsyncMock(return_value=b"page 2")
+
+        result = await CacheService.get_or_compute(compute, "k", ttl=300, soft_ttl=60)
+
+        assert result == b"page 1"
+        await asyncio.gather(*CacheService._tasks)
+        compute.assert_awaited_once()
+        assert mock_redis.set.await_args_list[-1].args[1].endswith(b"page 2")
+
+    async def test_stale_refresh_skipped_when_locked_elsewhere(self, mock_redis):
+        mock_redis.get.return_value = self.entry(b"page 1", -1)
+        mock_redis.set.return_value = None
+        compute = AsyncMock()
+
+        await CacheService.get_or_compute(compute, "k", ttl=300)
+        await asyncio.gather(*CacheService._tasks)
+
+        compute.assert_not_awaited()
+
+    async def test_identical_calls_share_one_computation(self):
+        release = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return b"page 1"
+
+        pending = [
+            asyncio.create_task(CacheService.get_or_compute(compute, "k", ttl=300))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await asyncio.gather(*pending) == [b"page 1"] * 5
+        assert calls == 1
+        assert CacheService._inflight == {}
+
+    async def test_waits_for_value_computed_by_another_worker(self, mock_redis):
+        mock_redis.get.side_effect = [None, None, self.entry(b"page 1", 60)]
+        mock_redis.set.return_value = None
+        compute = AsyncMock()
+
+        with patch.object(CacheService, "_POLL_INTERVAL", 0):
+            result = await CacheService.get_or_compute(compute, "k", ttl=300)
+
+        assert result == b"page 1"
+        compute.assert_not_awaited()
+
+    async def test_computes_itself_when_waiting_times_out(self, mock_redis):
+        mock_redis.set.return_value = None
+        compute = AsyncMock(return_value=b"page 1")
+
+        with (
+            patch.object(CacheService, "_POLL_INTERVAL", 0),
+            patch.object(settings.cache, "lock_wait", 0.01),
+        ):
+            result = await CacheService.get_or_compute(compute, "k", ttl=300)
+
+        assert result == b"page 1"
+        compute.assert_awaited_once()
+
+    async def test_computes_when_redis_is_down(self, mock_redis):
+        mock_redis.get.side_effect = redis.RedisError("connection refused")
+        mock_redis.set.side_effect = redis.RedisError("connection refused")
+        mock_redis.delete.side_effect = redis.RedisError("connection refused")
+        compute = AsyncMock(return_value=b"page 1")
+
+        result = await CacheService.get_or_compute(compute, "k", ttl=300)
+
+        assert result == b"page 1"
+
+    async def test_compute_error_propagates_and_releases_lock(self, mock_redis):
+        compute = AsyncMock(side_effect=ValueError("Invalid cursor"))
+
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            await CacheService.get_or_compute(compute, "k", ttl=300)
+
+        mock_redis.delete.assert_awaited_once_with("dating:k:lock")
+        assert CacheService._inflight == {}
+
+
+class TestLocalTier:
+    @pytest.fixture(autouse=True)
+    def mock_redis(self):
+        r = AsyncMock()
+        r.get.return_value = b'-j{"items": [1]}'
+        r.pipeline = MagicMock(return_value=make_pipeline())
+        CacheService._redis = CacheService._binary_redis = r
+        yield r
+        CacheService._redis = CacheService._binary_redis = None
+
+    @staticmethod
+    def requests(namespace: str, result: str) -> float:
+        return LOCAL_CACHE_REQUESTS.labels(namespace, result)._value.get()
+
+    async def test_second_read_is_served_locally(self, mock_redis):
+        hits = self.requests("interests", "hit")
+
+        first = await CacheService.get_json("interests", "popular", 20, 0)
+        second = await CacheService.get_json("interests", "popular", 20, 0)
+
+        assert first == second == {"items": [1]}
+        mock_redis.get.assert_awaited_once()
+        assert self.requests("interests", "hit") == hits + 1
+
+    async def test_write_is_served_locally(self, mock_redis):
+        await CacheService.set_json({"items": [2]}, "interests", "popular", ttl=60)
+
+        assert await CacheService.get_json("interests", "popular") == {"items": [2]}
+        mock_redis.get.assert_not_awaited()
+
+    async def test_write_broadcasts_invalidation(self, mock_redis):
+        await CacheService.set_json({"items": [2]}, "interests", "popular", ttl=60)
+
+        pipe = mock_redis.pipeline.return_value
+        channel, message = pipe.publish.call_args.args
+        assert channel == "dating:invalidate"
+        assert json.loads(message)["key"] == "dating:interests:popular"
+
+    async def test_failed_write_is_not_broadcast(self, mock_redis):
+        mock_redis.set.side_effect = redis.RedisError("connection refused")
+
+        await CacheService.set_json({"items": [2]}, "k", ttl=60)
+
+        mock_redis.pipeline.return_value.publish.assert_not_called()
+
+    async def test_failed_write_drops_local_copy(self, mock_redis):
+        await CacheService.get_json("k")
+        mock_redis.set.side_effect = redis.RedisError("connection refused")
+
+        await CacheService.set_json({"items": [2]}, "k", ttl=60)
+
+        assert "dating:k" not in CacheService._local
+
+    async def test_expired_entry_is_read_from_redis(self, mock_redis):
+        with patch.object(settings.cache, "local_ttl", 0):
+            await CacheService.get_json("k")
+            await CacheService.get_json("k")
+
+        assert mock_redis.get.await_count == 2
+
+    async def test_evicts_least_recently_used_beyond_byte_limit(self):
+        size = len('j{"items": [1]}')
+        with patch.object(settings.cache, "local_max_bytes", size * 2):
+            await CacheService.get_json("a")
+            await CacheService.get_json("b")
+            await CacheService.get_json("a")
+            await CacheService.get_json("c")
+
+        assert list(CacheService._local) == ["dating:a", "dating:c"]
+        assert CacheService._local_bytes == size * 2
+
+    async def test_disabled(self, mock_redis):
+        with patch.object(settings.cache, "local_enabled", False):
+            await CacheService.get_json("k")
+            await CacheService.get_json("k")
+
+        assert mock_redis.get.await_count == 2
+        assert CacheService._local == {}
+
+    async def test_invalidate_deletes_and_broadcasts(self, mock_redis):
+        await CacheService.get_json("interests", "popular")
+
+        await CacheService.invalidate("interests", "popular")
+
+        assert CacheService._local == {}
+        mock_redis.delete.assert_awaited_once_with("dating:interests:popular")
+        pipe = mock_redis.pipeline.return_value
+        channel, message = pipe.publish.call_args.args
+        assert channel == "dating:invalidate"
+        assert json.loads(message)["key"] == "dating:interests:popular"
+
+    async def test_invalidation_from_other_worker_drops_local_copy(self):
+        await CacheService.get_json("blocks", 5)
+        handler = MagicMock()
+        message = json.dumps({"key": "dating:blocks:5", "sender": "other"})
+
+        with patch.dict(CacheService._invalidation_handlers, {"blocks": handler}):
+            CacheService._handle_invalidation(message)
+
+        assert CacheService._local == {}
+        handler.assert_called_once_with("dating:blocks:5")
+
+    async def test_own_invalidations_are_ignored(self):
+        await CacheService.get_json("k")
+        message = json.dumps({"key": "dating:k", "sender": CacheService._worker_id})
+
+        CacheService._handle_invalidation(message)
+
+        assert "dating:k" in CacheService._local
+
+
+class TestBulk:
+    @pytest.fixture(autouse=True)
+    def mock_redis(self):
+        r = AsyncMock()
+        r.pipeline = MagicMock(return_value=make_pipeline())
+        CacheService._redis = CacheService._binary_redis = r
+        yield r
+        CacheService._redis = CacheService._binary_redis = None
+
+    async def test_mget_json_reports_misses(self, mock_redis):
+        mock_redis.mget.return_value = [b'-j{"id": 1}', None, b'-j{"id": 3}']
+
+        found, misses = await CacheService.mget_json(
+            [("cards", 1), ("cards", 2), ("cards", 3)]
+        )
+
+        assert found == {("cards", 1): {"id": 1}, ("cards", 3): {"id": 3}}
+        assert misses == [("cards", 2)]
+        mock_redis.mget.assert_awaited_once_with(
+            ["dating:cards:1", "dating:cards:2", "dating:cards:3"]
+        )
+
+    async def test_mget_json_reads_only_keys_not_held_locally(self, mock_redis):
+        CacheService._local_put("dating:cards:1", b'j{"id": 1}')
+        mock_redis.mget.return_value = [b'-j{"id": 2}']
+
+        found, misses = await CacheService.mget_json([("cards", 1), ("cards", 2)])
+
+        assert found == {("cards", 1): {"id": 1}, ("cards", 2): {"id": 2}}
+        assert misses == []
+        mock_redis.mget.assert_awaited_once_with(["dating:cards:2"])
+        assert "dating:cards:2" in CacheService._local
+
+    async def test_mget_json_misses_all_remote_keys_on_redis_error(self, mock_redis):
+        CacheService._local_put("dating:cards:1", b'j{"id": 1}')
+        mock_redis.mget.side_effect = redis.RedisError("connection refused")
+
+        found, misses = await CacheService.mget_json([("cards", 1), ("cards", 2)])
+
+        assert found == {("cards", 1): {"id": 1}}
+        assert misses == [("cards", 2)]
+
+    async def test_mget_json_skips_redis_when_all_local(self, mock_redis):
+        CacheService._local_put("dating:cards:1", b'j{"id": 1}')
+
+        found, misses = await CacheService.mget_json([("cards", 1)])
+
+        assert found == {("cards", 1): {"id": 1}}
+        mock_redis.mget.assert_not_awaited()
+
+    async def test_mset_json_sets_per_key_ttl(self, mock_redis):
+        mock_redis.pipeline.return_value.execute.return_value = [True, True]
+
+        await CacheService.mset_json(
+            {("cards", 1): {"id": 1}, ("cards", 2): {"id": 2}},
+            ttl={("cards", 1): 60},
+        )
+
+        pipe = mock_redis.pipeline.return_value
+        mock_redis.pipeline.assert_called_once_with(transaction=False)
+        assert pipe.set.call_args_list == [
+            call("dating:cards:1", b'-j{"id":1}', ex=60),
+            call("dating:cards:2", b'-j{"id":2}', ex=None),
+        ]
+        pipe.execute.assert_awaited_once()
+        assert await CacheService.get_json("cards", 2) == {"id": 2}
+
+    async def test_pipeline_results_in_order(self, mock_redis):
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.return_value = [True, b'-j{"id": 2}', None, b"-rbody", 1]
+
+        async with CacheService.pipeline(transaction=True) as cache:
+            cache.set_json({"id": 1}, "cards", 1, ttl=60)
+            cache.get_json("cards", 2)
+            cache.get_json("cards", 3)
+            cache.get_raw("pages", 1)
+            cache.invalidate("cards", 4)
+
+        assert mock_redis.pipeline.call_args_list[0] == call(transaction=True)
+        assert cache.results == [True, {"id": 2}, None, b"body", True]
+        assert cache.misses == [("cards", 3)]
+        assert cache.ok
+        pipe.delete.assert_called_once_with("dating:cards:4")
+        # Written and invalidated keys are both dropped by other workers
+        assert [json.loads(c.args[1])["key"] for c in pipe.publish.call_args_list] == [
+            "dating:cards:1",
+            "dating:cards:4",
+        ]
+        assert "dating:cards:1" in CacheService._local
+
+    async def test_pipeline_tolerates_redis_error(self, mock_redis):
+        CacheService._local_put("dating:cards:1", b'j{"id": 0}')
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.side_effect = redis.RedisError("connection refused")
+
+        async with CacheService.pipeline() as cache:
+            cache.set_json({"id": 1}, "cards", 1)
+            cache.get_json("cards", 2)
+
+        assert not cache.ok
+        assert cache.results == [False, None]
+        assert cache.misses == [("cards", 2)]
+        assert "dating:cards:1" not in CacheService._local
+
+    async def test_pipeline_not_sent_when_block_raises(self, mock_redis):
+        with pytest.raises(RuntimeError):
+            async with CacheService.pipeline() as cache:
+                cache.set_json({"id": 1}, "cards", 1)
+                raise RuntimeError
+
+        mock_redis.pipeline.assert_not_called()
@@ -1,11 +1,14 @@
 """Unit tests for ChatService."""
 
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from sqlalchemy.dialects import postgresql
 
 from core.models import Match, Message
 from crud.services.chat_service import ChatService
+from crud.services.unread_service import UnreadService
+from utils import decode_cursor, encode_cursor
 
 
 class TestValidateMatchParticipant:
@@ -116,23 +119,86 @@ class TestGetHistory:
 
 
 class TestMarkAsRead:
-    async def test_marks_unread_messages(self):
+    async def test_upserts_cursor_to_latest_message(self):
         session = AsyncMock()
         mock_result = MagicMock()
-        mock_result.all.return_value = [(1,), (2,), (3,)]
+        mock_result.scalar_one.return_value = 42
         session.execute.return_value = mock_result
 
-        count = await ChatService.mark_as_read(session, 1, 20)
+        with patch.object(UnreadService, "reset", new_callable=AsyncMock) as reset:
+            last_read = await ChatService.mark_as_read(session, 1, 20)
 
-        assert count == 3
+        assert last_read == 42
+        reset.assert_awaited_once_with(1, 20)
+        session.execute.assert_awaited_once()
         session.commit.assert_awaited_once()
+        statement = str(
+            session.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+        )
+        assert "INSERT INTO read_cursors" in statement
+        assert "ON CONFLICT (match_id, user_id) DO UPDATE" in statement
+        assert "greatest(read_cursors.last_read_message_id" in statement
 
-    async def test_no_unread_messages(self):
+
+class TestReadCursors:
+    async def test_maps_participants_to_cursors(self):
         session = AsyncMock()
         mock_result = MagicMock()
-        mock_result.all.return_value = []
+        mock_result.all.return_value = [(10, 5), (20, 7)]
         session.execute.return_value = mock_result
 
-        count = await ChatService.mark_as_read(session, 1, 20)
+        cursors = await ChatService.get_read_cursors(session, 1)
+
+        assert cursors == {10: 5, 20: 7}
+
+    def test_is_read_by_recipient_cursor(self):
+        match = Match(id=1, user_id=10, matched_user_id=20, is_mutual=True)
+        cursors = {20: 5}
+
+        assert ChatService.is_read(match, cursors, Message(id=5, sender_id=10))
+        assert not ChatService.is_read(match, cursors, Message(id=6, sender_id=10))
+        # user 10 has no cursor yet, so nothing user 20 sent is read
+        assert not ChatService.is_read(match, cursors, Message(id=1, sender_id=20))
+
+
+class TestGetHistoryByCursor:
+    async def test_seeks_before_cursor_and_returns_next(self):
+        session = AsyncMock()
+        mock_total = MagicMock()
+        mock_total.scalar.return_value = 10
+        msg1 = Message(id=8, match_id=1, sender_id=10, text="hi")
+        msg2 = Message(id=7, match_id=1, sender_id=20, text="hello")
+        mock_messages = MagicMock()
+        mock_messages.scalars.return_value.all.return_value = [msg1, msg2]
+        session.execute.side_effect = [mock_total, mock_messages]
+
+        messages, total, next_cursor = await ChatService.get_history_by_cursor(
+            session, 1, limit=2, cursor=encode_cursor(9)
+        )
+
+        assert [m.id for m in messages] == [8, 7]
+        assert total == 10
+        assert decode_cursor(next_cursor, int) == [7]
+        query = session.execute.await_args_list[1].args[0]
+        assert "messages.id < " in str(query)
+
+    async def test_short_page_has_no_cursor(self):
+        session = AsyncMock()
+        mock_total = MagicMock()
+        mock_total.scalar.return_value = 1
+        mock_messages = MagicMock()
+        mock_messages.scalars.return_value.all.return_value = [
+            Message(id=1, match_id=1, sender_id=10, text="hi")
+        ]
+        session.execute.side_effect = [mock_total, mock_messages]
+
+        _, _, next_cursor = await ChatService.get_history_by_cursor(session, 1)
+
+        assert next_cursor is None
+
+    async def test_invalid_cursor_raises(self):
+        session = AsyncMock()
+        session.execute.return_value = MagicMock()
 
-        assert count == 0
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            await ChatService.get_history_by_cursor(session, 1, cursor="%%%")
@@ -1,10 +1,34 @@
 """Unit tests for ConnectionManager."""
 
+import asyncio
 import json
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
+import redis.asyncio as redis
 
-from crud.services.connection_manager import ConnectionManager
+from core.config import settings
+from crud.services.connection_manager import ConnectionManager, StreamConnectionManager
+
+
+def make_pubsub(*messages):
+    """A subscription that yields ``messages`` once, then unsubscribes."""
+    pubsub = MagicMock()
+    pubsub.subscribe = AsyncMock()
+    pubsub.unsubscribe = AsyncMock()
+    pubsub.subscribed = True
+
+    async def listen():
+        for message in messages:
+            yield message
+        pubsub.subscribed = False
+
+    pubsub.listen = listen
+    return pubsub
+
+
+def pubsub_message(match_id, data):
+    return {"type": "message", "channel": f"chat:{match_id}", "data": json.dumps(data)}
 
 
 class TestConnect:
@@ -15,8 +39,7 @@ class TestConnect:
         with patch.object(cm, "_get_redis", new_callable=AsyncMock) as mock_redis:
             mock_r = AsyncMock()
             mock_redis.return_value = mock_r
-            cm._pubsub = AsyncMock()
-            cm._pubsub.subscribe = AsyncMock()
+            cm._pubsub = make_pubsub()
 
             await cm.connect(ws, match_id=1, user_id=10)
 
@@ -30,8 +53,7 @@ class TestConnect:
         ws2 = AsyncMock()
 
         with patch.object(cm, "_get_redis", new_callable=AsyncMock):
-            cm._pubsub = AsyncMock()
-            cm._pubsub.subscribe = AsyncMock()
+            cm._pubsub = make_pubsub()
 
             await cm.connect(ws1, match_id=1, user_id=10)
             await cm.connect(ws2, match_id=1, user_id=20)
@@ -59,6 +81,15 @@ class TestDisconnect:
 
         assert 1 not in cm._connections
 
+    async def test_keeps_socket_that_replaced_the_given_one(self):
+        cm = ConnectionManager()
+        new = AsyncMock()
+        cm._connections = {1: {10: new}}
+
+        await cm.disconnect(1, 10, AsyncMock())
+
+        assert cm._connections == {1: {10: new}}
+
     async def test_noop_for_unknown_match(self):
         cm = ConnectionManager()
         cm._connections = {}
@@ -100,6 +131,130 @@ class TestDeliverLocal:
         await cm._deliver_local(1, {"text": "hi"})
 
         assert 1 not in cm._connections
+        ws.close.assert_awaited_once_with(code=1013)
+
+    async def test_failed_send_keeps_newer_socket(self):
+        cm = ConnectionManager()
+        old = AsyncMock()
+        new = AsyncMock()
+
+        async def reconnect(message):
+            # The user reconnects while the old socket's send is failing
+            cm._connections[1][10] = new
+            raise Exception("connection closed")
+
+        old.send_json.side_effect = reconnect
+        cm._connections = {1: {10: old}}
+
+        await cm._deliver_local(1, {"text": "hi"})
+
+        old.close.assert_awaited_once()
+        assert cm._connections == {1: {10: new}}
+
+    async def test_slow_socket_is_disconnected(self):
+        cm = ConnectionManager()
+        slow = AsyncMock()
+
+        async def stall(message):
+            await asyncio.sleep(1)
+
+        slow.send_json.side_effect = stall
+        fast = AsyncMock()
+        cm._connections = {1: {10: slow, 20: fast}}
+
+        with patch.object(settings.chat, "send_timeout", 0.01):
+            await cm._deliver_local(1, {"text": "hi"})
+
+        fast.send_json.assert_awaited_once_with({"text": "hi"})
+        assert cm._connections == {1: {20: fast}}
+        slow.close.assert_awaited_once_with(code=1013)
+
+
+class TestListen:
+    async def test_dispatches_messages_per_match_in_order(self):
+        cm = ConnectionManager()
+        ws1 = AsyncMock()
+        ws2 = AsyncMock()
+        cm._connections = {1: {10: ws1}, 2: {20: ws2}}
+        cm._pubsub = make_pubsub(
+            {"type": "subscribe", "channel": "chat:1", "data": 1},
+            pubsub_message(1, {"text": "a"}),
+            pubsub_message(2, {"text": "b"}),
+            pubsub_message(1, {"text": "c"}),
+        )
+
+        await cm._listen()
+        await asyncio.gather(*cm._delivery_tasks)
+
+        assert [c.args[0]["text"] for c in ws1.send_json.await_args_list] == [
+            "a",
+            "c",
+        ]
+        ws2.send_json.assert_awaited_once_with({"text": "b"})
+        assert cm._pending == {}
+
+    async def test_slow_match_does_not_block_others(self):
+        cm = ConnectionManager()
+        release = asyncio.Event()
+        slow = AsyncMock()
+
+        async def wait_for_release(message):
+            await release.wait()
+
+        slow.send_json.side_effect = wait_for_release
+        fast = AsyncMock()
+        cm._connections = {1: {10: slow}, 2: {20: fast}}
+        cm._pubsub = make_pubsub(
+            pubsub_message(1, {"text": "a"}),
+            pubsub_message(2, {"text": "b"}),
+        )
+
+        await cm._listen()
+        await asyncio.sleep(0.01)
+
+        fast.send_json.assert_awaited_once_with({"text": "b"})
+        assert 1 in cm._pending
+        release.set()
+        await asyncio.gather(*cm._delivery_tasks)
+        assert cm._pending == {}
+
+    async def test_drops_oldest_when_behind(self):
+        cm = ConnectionManager()
+        ws = AsyncMock()
+        cm._connections = {1: {10: ws}}
+
+        with patch.object(settings.chat, "max_pending", 2):
+            for text in "abc":
+                cm._dispatch(1, {"text": text})
+            await asyncio.gather(*cm._delivery_tasks)
+
+        assert [c.args[0]["text"] for c in ws.send_json.await_args_list] == ["b", "c"]
+
+    async def test_retries_after_redis_error(self):
+        import redis
+
+        cm = ConnectionManager()
+        ws = AsyncMock()
+        cm._connections = {1: {10: ws}}
+        pubsub = make_pubsub(pubsub_message(1, {"text": "a"}))
+        listen = pubsub.listen
+        attempts = []
+
+        async def failing_listen():
+            if not attempts:
+                attempts.append(1)
+                raise redis.ConnectionError("reset")
+            async for message in listen():
+                yield message
+
+        pubsub.listen = failing_listen
+        cm._pubsub = pubsub
+
+        with patch("crud.services.connection_manager.LISTENER_RETRY_DELAY", 0):
+            await cm._listen()
+        await asyncio.gather(*cm._delivery_tasks)
+
+        ws.send_json.assert_awaited_once_with({"text": "a"})
 
 
 class TestBroadcast:
@@ -144,3 +299,194 @@ class TestClose:
         mock_pubsub.close.assert_awaited_once()
         assert cm._redis is None
         assert cm._pubsub is None
+
+
+class TestShardRouting:
+    @pytest.fixture(autouse=True)
+    def shard_routing(self):
+        with (
+            patch.object(settings.chat, "routing", "shard"),
+            patch.object(settings.chat, "shards", 4),
+        ):
+            yield
+
+    def test_matches_share_shard_channels(self):
+        cm = ConnectionManager()
+
+        assert cm._channel(1) == "chat:shard:1"
+        assert cm._channel(5) == "chat:shard:1"
+        assert cm._channel(6) == "chat:shard:2"
+
+    async def test_subscribes_once_per_shard(self):
+        cm = ConnectionManager()
+        cm._pubsub = make_pubsub()
+
+        with patch.object(cm, "_get_redis", new_callable=AsyncMock):
+            await cm.connect(AsyncMock(), match_id=1, user_id=10)
+            await cm.connect(AsyncMock(), match_id=5, user_id=20)
+            await cm.connect(AsyncMock(), match_id=5, user_id=30)
+
+        cm._pubsub.subscribe.assert_awaited_once_with("chat:shard:1")
+
+        await cm.disconnect(1, 10)
+        cm._pubsub.unsubscribe.assert_not_awaited()
+
+        await cm.disconnect(5, 20)
+        await cm.disconnect(5, 30)
+        cm._pubsub.unsubscribe.assert_awaited_once_with("chat:shard:1")
+        assert cm._channel_matches == {}
+
+    async def test_reopened_chat_subscribes_before_unsubscribe_ack(self):
+        cm = ConnectionManager()
+        cm._pubsub = make_pubsub()
+        # redis-py keeps a channel listed until its UNSUBSCRIBE is acknowledged
+        cm._pubsub.channels = {"chat:shard:1": None}
+
+        with patch.object(cm, "_get_redis", new_callable=AsyncMock):
+            await cm.connect(AsyncMock(), match_id=1, user_id=10)
+            await cm.disconnect(1, 10)
+            await cm.connect(AsyncMock(), match_id=1, user_id=10)
+
+        assert cm._pubsub.subscribe.await_count == 2
+
+    async def test_failed_subscribe_is_retried_on_next_connect(self):
+        cm = ConnectionManager()
+        cm._pubsub = make_pubsub()
+        cm._pubsub.subscribe.side_effect = [redis.RedisError("down"), None]
+
+        with patch.object(cm, "_get_redis", new_callable=AsyncMock):
+            await cm.connect(AsyncMock(), match_id=1, user_id=10)
+            await cm.connect(AsyncMock(), match_id=1, user_id=20)
+            await cm.connect(AsyncMock(), match_id=5, user_id=30)
+
+        assert cm._pubsub.subscribe.await_count == 2
+        assert cm._unsubscribed == set()
+
+    async def test_publishes_match_id_with_message(self):
+        cm = ConnectionManager()
+        mock_r = AsyncMock()
+        cm._redis = mock_r
+
+        msg = {"text": "hello"}
+        await cm.broadcast(5, msg)
+
+        mock_r.publish.assert_awaited_once_with(
+            "chat:shard:1", json.dumps({"match_id": 5, "message": msg})
+        )
+
+    async def test_delivers_only_local_matches(self):
+        cm = ConnectionManager()
+        ws = AsyncMock()
+        cm._connections = {5: {10: ws}}
+        cm._pubsub = make_pubsub(
+            {
+                "type": "message",
+                "channel": "chat:shard:1",
+                "data": json.dumps({"match_id": 1, "message": {"text": "a"}}),
+            },
+            {
+                "type": "message",
+                "channel": "chat:shard:1",
+                "data": json.dumps({"match_id": 5, "message": {"text": "b"}}),
+            },
+        )
+
+        await cm._listen()
+        await asyncio.gather(*cm._delivery_tasks)
+
+        ws.send_json.assert_awaited_once_with({"text": "b"})
+
+
+def stream_entry(entry_id, text):
+    return (entry_id, {"data": json.dumps({"text": text})})
+
+
+class TestStreamTransport:
+    async def test_broadcast_appends_trimmed_entry(self):
+        cm = StreamConnectionManager()
+        pipe = MagicMock()
+        pipe.execute = AsyncMock()
+        cm._redis = MagicMock()
+        cm._redis.pipeline.return_value.__aenter__.return_value = pipe
+
+        await cm.broadcast(1, {"text": "hello"})
+
+        pipe.xadd.assert_called_once_with(
+            "chat:stream:1",
+            {"data": json.dumps({"text": "hello"})},
+            maxlen=settings.chat.stream_maxlen,
+            approximate=True,
+        )
+        pipe.expire.assert_called_once_with("chat:stream:1", settings.chat.stream_ttl)
+        pipe.execute.assert_awaited_once()
+
+    async def test_connect_reads_from_stream_end_and_wakes_reader(self):
+        cm = StreamConnectionManager()
+        cm._redis = AsyncMock()
+        cm._redis.xrevrange.return_value = [stream_entry("5-0", "old")]
+        cm._reader_id = 42
+
+        with patch.object(cm, "_listen", new_callable=AsyncMock):
+            await cm.connect(AsyncMock(), match_id=1, user_id=10)
+
+        assert cm._positions == {"chat:stream:1": "5-0"}
+        cm._redis.client_unblock.assert_awaited_once_with(42)
+
+    async def test_listener_dispatches_entries_with_stream_id(self):
+        cm = StreamConnectionManager()
+        ws = AsyncMock()
+        cm._connections = {1: {10: ws}}
+        cm._positions = {"chat:stream:1": "0-0"}
+        reader = AsyncMock()
+
+        async def xread(streams, block):
+            if streams["chat:stream:1"] == "0-0":
+                return [["chat:stream:1", [stream_entry("1-0", "a")]]]
+            cm._positions.clear()
+            return []
+
+        reader.xread.side_effect = xread
+
+        with patch.object(cm, "_get_reader", return_value=reader):
+            await cm._listen()
+        await asyncio.gather(*cm._delivery_tasks)
+
+        ws.send_json.assert_awaited_once_with({"text": "a", "stream_id": "1-0"})
+
+    async def test_reconnect_replays_missed_entries_once(self):
+        cm = StreamConnectionManager()
+        ws = AsyncMock()
+        cm._redis = AsyncMock()
+        cm._redis.xrevrange.return_value = [stream_entry("3-0", "c")]
+        cm._redis.xrange.return_value = [
+            stream_entry("2-0", "b"),
+            stream_entry("3-0", "c"),
+        ]
+
+        with patch.object(cm, "_listen", new_callable=AsyncMock):
+            await cm.connect(ws, match_id=1, user_id=10, last_id="1-0")
+        cm._dispatch(1, {"text": "c", "stream_id": "3-0"})
+        cm._dispatch(1, {"text": "d", "stream_id": "4-0"})
+        await asyncio.gather(*cm._delivery_tasks)
+
+        cm._redis.xrange.assert_awaited_once_with(
+            "chat:stream:1", min="(1-0", count=settings.chat.stream_maxlen
+        )
+        assert [c.args[0]["stream_id"] for c in ws.send_json.await_args_list] == [
+            "2-0",
+            "3-0",
+            "4-0",
+        ]
+        assert cm._cursors == {}
+
+    async def test_malformed_last_id_is_ignored(self):
+        cm = StreamConnectionManager()
+        cm._redis = AsyncMock()
+        cm._redis.xrevrange.return_value = []
+
+        with patch.object(cm, "_listen", new_callable=AsyncMock):
+            await cm.connect(AsyncMock(), match_id=1, user_id=10, last_id="latest")
+
+        assert cm._positions == {"chat:stream:1": "0-0"}
+        assert cm._cursors == {}
+        assert cm._pending == {}
@@ -0,0 +1,47 @@
+"""Unit tests for the pre-serialized JSON responses."""
+
+from fastapi import Request
+
+from utils import json_response
+from utils.etag import etag
+
+BODY = b'{"items":[1]}'
+
+
+def make_request(if_none_match: str | None = None) -> Request:
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+class TestJsonResponse:
+    def test_returns_body_as_is(self):
+        response = json_response(make_request(), BODY)
+
+        assert response.status_code == 200
+        assert response.body == BODY
+        assert response.media_type == "application/json"
+        assert response.headers["etag"] == etag(BODY)
+        assert response.headers["cache-control"] == "private, no-cache"
+
+    def test_not_modified_when_etag_matches(self):
+        response = json_response(make_request(etag(BODY)), BODY)
+
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == etag(BODY)
+
+    def test_matches_any_listed_etag(self):
+        request = make_request(f'"other", {etag(BODY)}')
+
+        assert json_response(request, BODY).status_code == 304
+
+    def test_changed_body_is_sent(self):
+        request = make_request(etag(b"{}"))
+
+        assert json_response(request, BODY).status_code == 200
+
+    def test_etag_depends_on_body_only(self):
+        assert etag(BODY) == etag(bytes(BODY))
+        assert etag(BODY) != etag(b'{"items":[2]}')
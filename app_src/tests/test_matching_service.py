@@ -1,12 +1,14 @@
 """Unit tests for MatchingService business logic."""
 
 import sys
+from datetime import datetime
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from core.config import settings
 from core.models import Match, User
-from core.models.enums import GenderEnum
+from core.models.enums import GenderEnum, SwipeActionEnum, SwipeStatusEnum
 
 # Avoid circular import: matches_service imports from api.api_v1.fastapi_users
 # which triggers the full API router chain. Mock it before importing.
@@ -15,15 +17,39 @@ sys.modules.setdefault("api.api_v1.fastapi_users", MagicMock())
 from crud.services.block_report_service import BlockReportService  # noqa: E402
 from crud.services.cache_service import CacheService  # noqa: E402
 from crud.services.matches_service import MatchingService  # noqa: E402
+from crud.services.notification_service import NotificationService  # noqa: E402
+from crud.services.rating_service import RatingService  # noqa: E402
+from crud.services.seen_service import SeenService  # noqa: E402
+from crud.services.suggestion_queue_service import (  # noqa: E402
+    SuggestionQueueService,
+)
+from utils import decode_cursor, encode_cursor  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def rating_counter():
+    with patch.object(RatingService, "increment") as mock_increment:
+        yield mock_increment
+
+
+@pytest.fixture(autouse=True)
+def seen_set():
+    with (
+        patch.object(SeenService, "get_ids", return_value=[]) as mock_get_ids,
+        patch.object(SeenService, "mark") as mock_mark,
+    ):
+        yield mock_get_ids, mock_mark
 
 
-class TestProcessLike:
-    @pytest.fixture
-    def session(self):
-        s = AsyncMock()
-        s.add = MagicMock()
-        return s
+@pytest.fixture(autouse=True)
+def block_set():
+    with patch.object(
+        BlockReportService, "get_blocked_user_ids", return_value=frozenset()
+    ) as mock_get_blocked:
+        yield mock_get_blocked
+
 
+class TestProcessLike:
     @pytest.fixture
     def user(self, make_user):
         return make_user(
@@ -33,192 +59,303 @@ class TestProcessLike:
             rating=5,
         )
 
-    @pytest.fixture
-    def other_user(self, make_user):
-        return make_user(
-            id=2,
-            email="alice@example.com",
-            gender=GenderEnum.FEMALE,
-            rating=3,
-        )
-
-    async def test_cannot_like_yourself(self, session, user):
-        with pytest.raises(ValueError, match="Cannot match with yourself"):
-            await MatchingService.process_like(session, user, user.id)
-
-    async def test_new_like_creates_match(self, session, user, other_user):
+    @pytest.fixture(autouse=True)
+    def side_effects(self):
         with (
             patch.object(
-                BlockReportService,
-                "get_blocked_user_ids",
-                return_value=[],
-            ),
+                CacheService, "invalidate_suggestions", new_callable=AsyncMock
+            ) as mock_invalidate,
             patch.object(
-                MatchingService,
-                "_get_user_by_id",
-                return_value=other_user,
-            ),
-            patch.object(
-                MatchingService,
-                "_get_existing_match",
-                return_value=None,
-            ),
+                SuggestionQueueService, "remove", new_callable=AsyncMock
+            ) as mock_remove,
             patch.object(
-                CacheService,
-                "invalidate_suggestions",
-                new_callable=AsyncMock,
-            ),
+                NotificationService, "notify_mutual_match", new_callable=AsyncMock
+            ) as mock_notify,
         ):
-            result = await MatchingService.process_like(session, user, other_user.id)
+            yield mock_invalidate, mock_remove, mock_notify
+
+    def make_session(self, **row):
+        values = {
+            "target_exists": True,
+            "blocked": False,
+            "first_name": "Alice",
+            "telegram_id": 222,
+            "id": 10,
+            "is_mutual": False,
+            "created_at": datetime(2025, 1, 1),
+            "flipped": 0,
+        }
+        values.update(row)
+        session = AsyncMock()
+        session.add = MagicMock()
+        lock_result = MagicMock()
+        like_result = MagicMock()
+        like_result.one.return_value = MagicMock(**values)
+        session.execute.side_effect = [lock_result, like_result]
+        return session
+
+    async def test_cannot_like_yourself(self, user):
+        session = AsyncMock()
+
+        with pytest.raises(ValueError, match="Cannot match with yourself"):
+            await MatchingService.process_like(session, user, user.id)
+
+        session.execute.assert_not_awaited()
+
+    async def test_new_like_creates_match(self, user, side_effects):
+        _, mock_remove, mock_notify = side_effects
+        session = self.make_session()
+
+        result = await MatchingService.process_like(session, user, 2)
 
+        assert result.id == 10
         assert result.user_id == user.id
-        assert result.matched_user_id == other_user.id
+        assert result.matched_user_id == 2
         assert result.is_mutual is False
-        assert other_user.rating == 4  # incremented from 3
-        session.add.assert_called_once()
         session.commit.assert_awaited_once()
+        # Only the liked user's rating goes up
+        RatingService.increment.assert_awaited_once_with(session, 2)
+        mock_remove.assert_awaited_once_with(user.id, 2)
+        SeenService.mark.assert_awaited_once_with(user.id, 2)
+        mock_notify.assert_not_awaited()
 
-    async def test_mutual_like_sets_mutual_flag(self, session, user, other_user):
-        existing = Match(
-            user_id=other_user.id,
-            matched_user_id=user.id,
-            is_mutual=False,
+    async def test_like_runs_lock_then_single_upsert(self, user):
+        session = self.make_session()
+
+        await MatchingService.process_like(session, user, 2)
+
+        lock_sql, like_sql = (
+            str(call.args[0]) for call in session.execute.await_args_list
         )
+        assert "pg_advisory_xact_lock" in lock_sql
+        assert "ON CONFLICT (user_id, matched_user_id) DO NOTHING" in like_sql
+        assert "UPDATE matchs SET is_mutual" in like_sql
+        session.add.assert_not_called()
 
-        with (
-            patch.object(
-                BlockReportService,
-                "get_blocked_user_ids",
-                return_value=[],
-            ),
-            patch.object(
-                MatchingService,
-                "_get_user_by_id",
-                return_value=other_user,
-            ),
-            patch.object(
-                MatchingService,
-                "_get_existing_match",
-                return_value=existing,
-            ),
-            patch.object(
-                CacheService,
-                "invalidate_suggestions",
-                new_callable=AsyncMock,
-            ),
-        ):
-            result = await MatchingService.process_like(session, user, other_user.id)
+    async def test_reciprocal_like_is_mutual(self, user, side_effects):
+        _, _, mock_notify = side_effects
+        session = self.make_session(is_mutual=True, flipped=1)
+
+        result = await MatchingService.process_like(session, user, 2)
 
-        assert existing.is_mutual is True
         assert result.is_mutual is True
-        assert user.rating == 6  # incremented from 5
-        assert other_user.rating == 4  # incremented from 3
-
-    async def test_duplicate_like_returns_existing(self, session, user, other_user):
-        existing = Match(
-            user_id=user.id,
-            matched_user_id=other_user.id,
-            is_mutual=False,
-        )
+        # Both ratings go up once the match becomes mutual
+        RatingService.increment.assert_awaited_once_with(session, user.id, 2)
+        assert [c.args for c in mock_notify.await_args_list] == [
+            (user.telegram_id, "Alice"),
+            (222, user.first_name),
+        ]
+
+    async def test_duplicate_like_returns_existing(self, user):
+        existing = Match(id=7, user_id=1, matched_user_id=2, is_mutual=False)
+        session = self.make_session(id=None, is_mutual=None, created_at=None)
+        existing_result = MagicMock()
+        existing_result.scalar_one.return_value = existing
+        session.execute.side_effect = [
+            *session.execute.side_effect,
+            existing_result,
+        ]
+
+        result = await MatchingService.process_like(session, user, 2)
+
+        assert result is existing
+        session.commit.assert_not_awaited()
+        RatingService.increment.assert_not_awaited()
+
+    async def test_like_nonexistent_user_raises(self, user):
+        session = self.make_session(target_exists=False, id=None)
+
+        with pytest.raises(ValueError, match="not found"):
+            await MatchingService.process_like(session, user, 999)
+
+        session.commit.assert_not_awaited()
+
+    async def test_like_blocked_user_raises(self, user):
+        session = self.make_session(blocked=True, id=None)
+
+        with pytest.raises(ValueError, match="Cannot like a blocked user"):
+            await MatchingService.process_like(session, user, 2)
+
+        session.commit.assert_not_awaited()
+
+    async def test_like_cached_block_skips_statement(self, user, block_set):
+        block_set.return_value = frozenset({2})
+        session = self.make_session()
+
+        with pytest.raises(ValueError, match="Cannot like a blocked user"):
+            await MatchingService.process_like(session, user, 2)
+
+        session.execute.assert_not_awaited()
+
+
+class TestProcessPass:
+    async def test_cannot_pass_yourself(self, make_user):
+        user = make_user(id=1)
+
+        with pytest.raises(ValueError, match="Cannot pass yourself"):
+            await MatchingService.process_pass(AsyncMock(), user, user.id)
+
+    async def test_marks_seen_without_match_row(self, make_user):
+        user = make_user(id=1)
+        other_user = make_user(id=2, rating=3)
+        session = AsyncMock()
+        session.add = MagicMock()
 
         with (
+            patch.object(MatchingService, "_get_user_by_id", return_value=other_user),
             patch.object(
-                BlockReportService,
-                "get_blocked_user_ids",
-                return_value=[],
-            ),
-            patch.object(
-                MatchingService,
-                "_get_user_by_id",
-                return_value=other_user,
-            ),
+                SuggestionQueueService, "remove", new_callable=AsyncMock
+            ) as mock_remove,
             patch.object(
-                MatchingService,
-                "_get_existing_match",
-                return_value=existing,
+                CacheService, "invalidate_suggestions", new_callable=AsyncMock
             ),
         ):
-            result = await MatchingService.process_like(session, user, other_user.id)
+            await MatchingService.process_pass(session, user, other_user.id)
 
-        assert result is existing
-        assert user.rating == 5  # unchanged
+        SeenService.mark.assert_awaited_once_with(user.id, other_user.id)
+        mock_remove.assert_awaited_once_with(user.id, other_user.id)
+        session.add.assert_not_called()
         assert other_user.rating == 3  # unchanged
 
-    async def test_like_nonexistent_user_raises(self, session, user):
-        with (
-            patch.object(
-                BlockReportService,
-                "get_blocked_user_ids",
-                return_value=[],
-            ),
-            patch.object(
-                MatchingService,
-                "_get_user_by_id",
-                side_effect=ValueError("User with ID 999 not found"),
-            ),
+    async def test_pass_nonexistent_user_raises(self, make_user):
+        with patch.object(
+            MatchingService,
+            "_get_user_by_id",
+            side_effect=ValueError("User with ID 999 not found"),
         ):
             with pytest.raises(ValueError, match="not found"):
-                await MatchingService.process_like(session, user, 999)
+                await MatchingService.process_pass(AsyncMock(), make_user(id=1), 999)
+
+        SeenService.mark.assert_not_awaited()
 
-    async def test_new_like_increments_only_matched_user_rating(
-        self, session, user, other_user
-    ):
-        initial_user_rating = user.rating
-        initial_other_rating = other_user.rating
 
+class TestProcessSwipes:
+    @pytest.fixture
+    def user(self, make_user):
+        return make_user(id=1, gender=GenderEnum.MALE, rating=5)
+
+    def make_session(self, users, matches, blocked_ids=()):
+        session = AsyncMock()
+        session.add = MagicMock()
+        users_result = MagicMock()
+        users_result.all.return_value = [(u, u.id in blocked_ids) for u in users]
+        matches_result = MagicMock()
+        matches_result.scalars.return_value.all.return_value = matches
+        lock_result = MagicMock()
+        session.execute.side_effect = [lock_result, users_result, matches_result]
+        return session
+
+    @pytest.fixture(autouse=True)
+    def side_effects(self):
         with (
+            patch.object(BlockReportService, "get_blocked_user_ids", return_value=[4]),
             patch.object(
-                BlockReportService,
-                "get_blocked_user_ids",
-                return_value=[],
-            ),
-            patch.object(
-                MatchingService,
-                "_get_user_by_id",
-                return_value=other_user,
-            ),
+                CacheService, "invalidate_suggestions", new_callable=AsyncMock
+            ) as mock_invalidate,
             patch.object(
-                MatchingService,
-                "_get_existing_match",
-                return_value=None,
-            ),
+                SuggestionQueueService, "remove", new_callable=AsyncMock
+            ) as mock_remove,
             patch.object(
-                CacheService,
-                "invalidate_suggestions",
-                new_callable=AsyncMock,
-            ),
+                NotificationService, "notify_mutual_match", new_callable=AsyncMock
+            ) as mock_notify,
         ):
-            await MatchingService.process_like(session, user, other_user.id)
-
-        assert user.rating == initial_user_rating  # unchanged
-        assert other_user.rating == initial_other_rating + 1
-
+            yield mock_invalidate, mock_remove, mock_notify
+
+    async def test_mixed_batch_in_one_commit(self, user, make_user, side_effects):
+        mock_invalidate, mock_remove, mock_notify = side_effects
+        liker = make_user(id=2, rating=3)
+        fresh = make_user(id=3, rating=7)
+        passed = make_user(id=5, rating=1)
+        liked_me = Match(id=10, user_id=2, matched_user_id=1, is_mutual=False)
+        session = self.make_session([liker, fresh, passed], [liked_me])
+
+        results = await MatchingService.process_swipes(
+            session,
+            user,
+            [
+                (SwipeActionEnum.LIKE, 2),
+                (SwipeActionEnum.LIKE, 3),
+                (SwipeActionEnum.PASS, 5),
+                (SwipeActionEnum.LIKE, 3),
+            ],
+        )
 
-class TestGetExistingMatch:
-    async def test_finds_match_either_direction(self):
-        session = AsyncMock()
-        mock_result = MagicMock()
-        mock_scalars = MagicMock()
-        mock_scalars.first.return_value = Match(
-            user_id=1, matched_user_id=2, is_mutual=False
+        assert [r["status"] for r in results] == [
+            SwipeStatusEnum.MUTUAL,
+            SwipeStatusEnum.LIKED,
+            SwipeStatusEnum.PASSED,
+            SwipeStatusEnum.ALREADY_LIKED,
+        ]
+        assert liked_me.is_mutual is True
+        assert results[0]["match"].is_mutual is True
+        assert results[3]["match"] is results[1]["match"]
+        RatingService.increment.assert_awaited_once_with(session, 1, 2, 3)
+        assert session.add.call_count == 2
+        session.commit.assert_awaited_once()
+        # Own caches once, plus the new mutual partner
+        assert [c.args for c in mock_invalidate.await_args_list] == [(1,), (2,)]
+        mock_remove.assert_awaited_once_with(1, 2, 3, 5, 3)
+        SeenService.mark.assert_awaited_once_with(1, 2, 3, 5, 3)
+        assert mock_notify.await_count == 2
+        lock_sql = str(session.execute.await_args_list[0].args[0])
+        assert "pg_advisory_xact_lock" in lock_sql
+
+    async def test_invalid_items_are_rejected_individually(
+        self, user, make_user, side_effects
+    ):
+        blocked = make_user(id=4)
+        session = self.make_session([blocked], [])
+
+        results = await MatchingService.process_swipes(
+            session,
+            user,
+            [
+                (SwipeActionEnum.LIKE, 1),
+                (SwipeActionEnum.LIKE, 4),
+                (SwipeActionEnum.LIKE, 999),
+            ],
         )
-        mock_result.scalars.return_value = mock_scalars
-        session.execute.return_value = mock_result
 
-        result = await MatchingService._get_existing_match(session, 1, 2)
-        assert result is not None
-        session.execute.assert_awaited_once()
+        assert [r["status"] for r in results] == [SwipeStatusEnum.REJECTED] * 3
+        assert [r["detail"] for r in results] == [
+            "Cannot match with yourself",
+            "Cannot like a blocked user",
+            "User with ID 999 not found",
+        ]
+        session.commit.assert_not_awaited()
+        SeenService.mark.assert_not_awaited()
+
+    async def test_block_missed_by_cache_is_rejected(self, user, make_user):
+        # Blocked after the cached block set was loaded
+        blocked = make_user(id=6)
+        session = self.make_session([blocked], [], blocked_ids={6})
+
+        results = await MatchingService.process_swipes(
+            session, user, [(SwipeActionEnum.LIKE, 6), (SwipeActionEnum.PASS, 6)]
+        )
 
-    async def test_returns_none_when_no_match(self):
-        session = AsyncMock()
-        mock_result = MagicMock()
-        mock_scalars = MagicMock()
-        mock_scalars.first.return_value = None
-        mock_result.scalars.return_value = mock_scalars
-        session.execute.return_value = mock_result
+        assert [r["status"] for r in results] == [
+            SwipeStatusEnum.REJECTED,
+            SwipeStatusEnum.PASSED,
+        ]
+        assert results[0]["detail"] == "Cannot like a blocked user"
+        session.add.assert_not_called()
+        users_sql = str(session.execute.await_args_list[1].args[0])
+        assert "blocks.blocked_user_id" in users_sql
+
+    async def test_existing_like_is_not_duplicated(self, user, make_user):
+        other = make_user(id=2, rating=3)
+        existing = Match(id=11, user_id=1, matched_user_id=2, is_mutual=False)
+        session = self.make_session([other], [existing])
+
+        results = await MatchingService.process_swipes(
+            session, user, [(SwipeActionEnum.LIKE, 2)]
+        )
 
-        result = await MatchingService._get_existing_match(session, 1, 2)
-        assert result is None
+        assert results[0]["status"] == SwipeStatusEnum.ALREADY_LIKED
+        assert results[0]["match"] is existing
+        RatingService.increment.assert_awaited_once_with(session)
+        session.add.assert_not_called()
 
 
 class TestGetUserById:
@@ -240,3 +377,354 @@ class TestGetUserById:
 
         with pytest.raises(ValueError, match="not found"):
             await MatchingService._get_user_by_id(session, 999)
+
+
+class TestInterestBitsetEngine:
+    @pytest.fixture(autouse=True)
+    def numpy_required(self):
+        pytest.importorskip("numpy")
+
+    @pytest.fixture
+    def engine(self):
+        from crud.services.matches_service import InterestBitsetEngine
+
+        engine = InterestBitsetEngine()
+        engine.upsert(2, GenderEnum.FEMALE, True, 1, 100.0, [1, 2, 3])
+        engine.upsert(3, GenderEnum.FEMALE, True, 9, 200.0, [1])
+        engine.upsert(4, GenderEnum.FEMALE, True, 5, 300.0, [])
+        engine.upsert(5, GenderEnum.FEMALE, False, 50, 400.0, [1, 2, 3])
+        engine.upsert(6, GenderEnum.MALE, True, 50, 500.0, [1, 2, 3])
+        engine.upsert(7, None, True, 50, 600.0, [1, 2, 3])
+        return engine
+
+    def test_ranks_by_overlap_then_rating(self, engine, make_user, sample_interests):
+        user = make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+
+        ids, total = engine.rank(user, limit=10)
+
+        # Inactive, same-gender and gender-less users are filtered out
+        assert ids == [2, 3, 4]
+        assert total == 3
+
+    def test_user_without_interests_ranks_by_rating(self, engine, make_user):
+        user = make_user(id=1, gender=GenderEnum.MALE)
+
+        ids, _ = engine.rank(user, limit=10)
+
+        assert ids == [3, 4, 2]
+
+    def test_excludes_given_users(self, engine, make_user, sample_interests):
+        user = make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+
+        ids, total = engine.rank(user, excluded_ids=[2], limit=10)
+
+        assert ids == [3, 4]
+        assert total == 2
+
+    def test_limit_and_offset(self, engine, make_user, sample_interests):
+        user = make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+
+        ids, total = engine.rank(user, limit=1, offset=1)
+
+        assert ids == [3]
+        assert total == 3
+
+    def test_upsert_replaces_existing_row(self, engine, make_user, sample_interests):
+        engine.upsert(4, GenderEnum.FEMALE, True, 5, 300.0, [1, 2, 3])
+        user = make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+
+        ids, _ = engine.rank(user, limit=10)
+
+        assert ids == [4, 2, 3]  # same overlap as 2, higher rating
+        assert len(engine) == 6
+
+    def test_full_ties_rank_by_id_desc(self, engine, make_user, sample_interests):
+        # Same overlap, rating and created_at as user 2
+        engine.upsert(8, GenderEnum.FEMALE, True, 1, 100.0, [1, 2, 3])
+        engine.upsert(9, GenderEnum.FEMALE, True, 1, 100.0, [1, 2, 3])
+        user = make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+
+        ids, _ = engine.rank(user, limit=10)
+        second_page, _ = engine.rank(user, limit=2, offset=1)
+
+        assert ids == [9, 8, 2, 3, 4]
+        assert second_page == [8, 2]
+
+    def test_jaccard_metric_prefers_tighter_overlap(
+        self, engine, make_user, make_interest
+    ):
+        engine.upsert(8, GenderEnum.FEMALE, True, 0, 700.0, list(range(1, 11)))
+        user = make_user(
+            id=1,
+            gender=GenderEnum.MALE,
+            interests=[make_interest(id=1), make_interest(id=2)],
+        )
+
+        overlap_ids, _ = engine.rank(user, limit=2)
+        with patch.object(settings.matching, "engine_metric", "jaccard"):
+            jaccard_ids, _ = engine.rank(user, limit=2)
+
+        # Two shared out of ten interests loses to one shared out of two
+        assert overlap_ids == [2, 8]
+        assert jaccard_ids == [2, 3]
+
+    def test_deactivate_removes_candidate(self, engine, make_user):
+        engine.deactivate(3)
+        user = make_user(id=1, gender=GenderEnum.MALE)
+
+        ids, _ = engine.rank(user, limit=10)
+
+        assert 3 not in ids
+
+    @pytest.fixture
+    def ready_engine(self, engine):
+        engine.loaded = True
+        with (
+            patch.object(settings.matching, "engine", "bitset"),
+            patch("crud.services.matches_service.interest_engine", engine),
+        ):
+            yield engine
+
+    @staticmethod
+    def liked_result(*ids):
+        result = MagicMock()
+        result.scalars.return_value = list(ids)
+        return result
+
+    async def test_suggestions_exclude_liked_users(
+        self, ready_engine, make_user, sample_interests
+    ):
+        user = make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+        candidates = MagicMock()
+        candidates.scalars.return_value.all.return_value = [
+            make_user(id=3),
+            make_user(id=4),
+        ]
+        session = AsyncMock()
+        session.execute.side_effect = [self.liked_result(2), candidates]
+
+        matches, total = await MatchingService.find_matches_by_interests_and_rating(
+            session, user
+        )
+
+        assert [m.id for m in matches] == [3, 4]
+        assert total == 2
+        loaded = session.execute.await_args_list[1].args[0].compile().params
+        assert list(loaded.values()) == [[3, 4]]
+
+    async def test_queue_excludes_liked_users(
+        self, ready_engine, make_user, sample_interests, seen_set
+    ):
+        seen_set[0].return_value = [4]
+        user = make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+        session = AsyncMock()
+        session.execute.return_value = self.liked_result(2)
+
+        ids, total = await MatchingService.rank_candidate_ids(session, user, 10)
+
+        assert ids == [3]
+        assert total == 1
+
+
+class TestFindMatchesByInterestsAndRating:
+    @pytest.fixture
+    def user(self, make_user, sample_interests):
+        return make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+
+    async def test_page_and_total_in_one_statement(self, user, make_user):
+        candidates = [make_user(id=7), make_user(id=8)]
+        session = AsyncMock()
+        result = MagicMock()
+        result.all.return_value = [(candidates[0], 42), (candidates[1], 42)]
+        session.execute.return_value = result
+
+        items, total = await MatchingService.find_matches_by_interests_and_rating(
+            session, user, limit=2, offset=20
+        )
+
+        assert items == candidates
+        assert total == 42
+        session.execute.assert_awaited_once()
+        sql = str(session.execute.await_args.args[0])
+        assert "count(*) OVER ()" in sql
+        assert "LEFT OUTER JOIN" in sql
+        assert "NOT (EXISTS" in sql
+        assert "OFFSET" in sql
+
+    async def test_excludes_liked_and_seen_users(self, user, seen_set):
+        mock_get_ids, _ = seen_set
+        mock_get_ids.return_value = [4, 6]
+        session = AsyncMock()
+        session.execute.return_value = MagicMock()
+
+        await MatchingService.find_matches_by_interests_and_rating(session, user)
+
+        query = session.execute.await_args.args[0]
+        sql = str(query)
+        assert "matchs.matched_user_id = users.id" in sql
+        assert "users.id != ALL" in sql
+        assert query.compile().params["seen_ids"] == [4, 6]
+
+    async def test_user_without_interests_skips_overlap_join(self, make_user):
+        user = make_user(id=1, gender=GenderEnum.MALE)
+        session = AsyncMock()
+        session.execute.return_value = MagicMock()
+
+        await MatchingService.find_matches_by_interests_and_rating(session, user)
+
+        assert "JOIN" not in str(session.execute.await_args.args[0])
+
+    async def test_page_past_end_counts_separately(self, user):
+        session = AsyncMock()
+        empty = MagicMock()
+        empty.all.return_value = []
+        count = MagicMock()
+        count.scalar.return_value = 15
+        session.execute.side_effect = [empty, count]
+
+        items, total = await MatchingService.find_matches_by_interests_and_rating(
+            session, user, limit=20, offset=40
+        )
+
+        assert items == []
+        assert total == 15
+
+    async def test_empty_first_page_skips_count(self, user):
+        session = AsyncMock()
+        empty = MagicMock()
+        empty.all.return_value = []
+        session.execute.return_value = empty
+
+        result = await MatchingService.find_matches_by_interests_and_rating(
+            session, user
+        )
+
+        assert result == ([], 0)
+        session.execute.assert_awaited_once()
+
+
+class TestRankCandidateIds:
+    async def test_returns_ids_and_window_total(self, make_user, sample_interests):
+        user = make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+        session = AsyncMock()
+        result = MagicMock()
+        result.all.return_value = [(5, 3), (9, 3), (2, 3)]
+        session.execute.return_value = result
+
+        ids, total = await MatchingService.rank_candidate_ids(session, user, limit=3)
+
+        assert ids == [5, 9, 2]
+        assert total == 3
+        session.execute.assert_awaited_once()
+
+
+class TestFindMatchesByCursor:
+    @pytest.fixture
+    def user(self, make_user, sample_interests):
+        return make_user(id=1, gender=GenderEnum.MALE, interests=sample_interests)
+
+    def make_session(self, total, rows):
+        session = AsyncMock()
+        total_result = MagicMock()
+        total_result.scalar.return_value = total
+        rows_result = MagicMock()
+        rows_result.all.return_value = rows
+        session.execute.side_effect = [total_result, rows_result]
+        return session
+
+    async def test_full_page_returns_next_cursor(self, user, make_user):
+        candidate = make_user(id=7, gender=GenderEnum.FEMALE, rating=3)
+        candidate.created_at = datetime(2025, 1, 1)
+        session = self.make_session(10, [(candidate, 2)])
+
+        items, total, next_cursor = await MatchingService.find_matches_by_cursor(
+            session, user, limit=1
+        )
+
+        assert items == [candidate]
+        assert total == 10
+        assert decode_cursor(next_cursor, int, int, datetime, int) == [
+            2,
+            3,
+            datetime(2025, 1, 1),
+            7,
+        ]
+
+    async def test_last_page_has_no_cursor(self, user):
+        session = self.make_session(0, [])
+
+        items, total, next_cursor = await MatchingService.find_matches_by_cursor(
+            session, user, limit=20, cursor=encode_cursor(1, 1, datetime.now(), 1)
+        )
+
+        assert items == []
+        assert next_cursor is None
+
+    async def test_invalid_cursor_raises(self, user):
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            await MatchingService.find_matches_by_cursor(
+                AsyncMock(), user, cursor="not-a-cursor"
+            )
+
+
+class TestGetUserMatchesByCursor:
+    async def test_full_page_returns_next_cursor(self):
+        session = AsyncMock()
+        total_result = MagicMock()
+        total_result.scalar.return_value = 5
+        match = Match(id=3, user_id=1, matched_user_id=2, is_mutual=True)
+        match.created_at = datetime(2025, 1, 1)
+        rows_result = MagicMock()
+        rows_result.scalars.return_value.all.return_value = [match]
+        session.execute.side_effect = [total_result, rows_result]
+
+        items, total, next_cursor = await MatchingService.get_user_matches_by_cursor(
+            session, 1, limit=1
+        )
+
+        assert items == [match]
+        assert total == 5
+        assert decode_cursor(next_cursor, datetime, int) == [datetime(2025, 1, 1), 3]
+
+
+class TestGetUserInbox:
+    async def test_builds_items_from_lateral_columns(self, make_user):
+        session = AsyncMock()
+        total_result = MagicMock()
+        total_result.scalar.return_value = 2
+        with_message = Match(id=3, user_id=1, matched_user_id=2, is_mutual=True)
+        with_message.matched_user = make_user(id=2)
+        no_message = Match(id=4, user_id=1, matched_user_id=5, is_mutual=False)
+        no_message.matched_user = make_user(id=5)
+        rows_result = MagicMock()
+        rows_result.all.return_value = [
+            (with_message, "hello", 2, datetime(2025, 1, 2), 3),
+            (no_message, None, None, None, 0),
+        ]
+        session.execute.side_effect = [total_result, rows_result]
+
+        items, total = await MatchingService.get_user_inbox(session, 1, limit=2)
+
+        assert total == 2
+        assert [item["id"] for item in items] == [3, 4]
+        assert items[0]["last_message"] == {
+            "text": "hello",
+            "sender_id": 2,
+            "created_at": datetime(2025, 1, 2),
+        }
+        assert items[0]["unread_count"] == 3
+        assert items[0]["matched_user"] is with_message.matched_user
+        assert items[1]["last_message"] is None
+
+    async def test_single_page_statement_with_lateral_subqueries(self):
+        session = AsyncMock()
+        rows_result = MagicMock()
+        rows_result.all.return_value = []
+        session.execute.side_effect = [MagicMock(), rows_result]
+
+        await MatchingService.get_user_inbox(session, 1)
+
+        statement = str(session.execute.await_args_list[1].args[0])
+        assert statement.count("LATERAL") == 2
+        assert "messages.id > coalesce(" in statement
+        assert "read_cursors" in statement
@@ -0,0 +1,111 @@
+"""Unit tests for MessageWriter."""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from core.config import settings
+from crud.services.message_writer import MessageWriter
+
+CREATED_AT = datetime(2026, 1, 1)
+
+
+def inserted(*ids):
+    result = MagicMock()
+    result.all.return_value = [
+        MagicMock(id=message_id, created_at=CREATED_AT) for message_id in ids
+    ]
+    return result
+
+
+@pytest.fixture
+def session():
+    session = AsyncMock()
+    factory = MagicMock()
+    factory.return_value.__aenter__.return_value = session
+    with patch("crud.services.message_writer.db_helper") as db_helper:
+        db_helper.session_factory = factory
+        yield session
+
+
+@pytest.fixture
+async def writer():
+    MessageWriter.start()
+    yield
+    await MessageWriter.stop()
+
+
+class TestSave:
+    async def test_batches_concurrent_messages_into_one_insert(self, session, writer):
+        session.execute.return_value = inserted(1, 2, 3)
+
+        messages = await asyncio.gather(
+            MessageWriter.save(1, 10, "a"),
+            MessageWriter.save(2, 20, "b"),
+            MessageWriter.save(1, 30, "c"),
+        )
+
+        session.execute.assert_awaited_once()
+        rows = session.execute.await_args.args[1]
+        assert [row["text"] for row in rows] == ["a", "b", "c"]
+        session.commit.assert_awaited_once()
+        assert [(m.id, m.match_id, m.text) for m in messages] == [
+            (1, 1, "a"),
+            (2, 2, "b"),
+            (3, 1, "c"),
+        ]
+        assert messages[0].created_at == CREATED_AT
+
+    async def test_splits_at_batch_size(self, session):
+        session.execute.side_effect = [inserted(1, 2), inserted(3)]
+
+        with patch.object(settings.chat, "write_batch_size", 2):
+            MessageWriter.start()
+            try:
+                messages = await asyncio.gather(
+                    *(MessageWriter.save(1, 10, text) for text in "abc")
+                )
+            finally:
+                await MessageWriter.stop()
+
+        assert session.execute.await_count == 2
+        assert [m.id for m in messages] == [1, 2, 3]
+
+    async def test_failed_batch_fails_only_the_bad_message(self, session, writer):
+        error = IntegrityError("INSERT", {}, Exception("fk"))
+        session.execute.side_effect = [error, inserted(1), error]
+
+        results = await asyncio.gather(
+            MessageWriter.save(1, 10, "ok"),
+            MessageWriter.save(999, 10, "bad"),
+            return_exceptions=True,
+        )
+
+        assert results[0].id == 1
+        assert results[1] is error
+        assert session.execute.await_count == 3
+
+    async def test_saves_directly_when_not_started(self, session):
+        with patch(
+            "crud.services.message_writer.ChatService.save_message",
+            new_callable=AsyncMock,
+        ) as save_message:
+            await MessageWriter.save(1, 10, "hello")
+
+        save_message.assert_awaited_once_with(session, 1, 10, "hello")
+
+
+class TestStop:
+    async def test_writes_queued_messages_before_stopping(self, session):
+        session.execute.return_value = inserted(1)
+        MessageWriter.start()
+
+        save = asyncio.create_task(MessageWriter.save(1, 10, "last"))
+        await asyncio.sleep(0)
+        await MessageWriter.stop()
+
+        assert (await save).id == 1
+        assert MessageWriter._writer_task is None
@@ -0,0 +1,89 @@
+"""Unit tests for ProfileCardService."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from core.config import settings
+from crud.services.cache_service import CacheService
+from crud.services.profile_card_service import ProfileCardService
+
+
+@pytest.fixture
+def make_card_user(make_user):
+    def _make_card_user(id):
+        user = make_user(id=id, email=f"user{id}@example.com", first_name=f"U{id}")
+        user.is_superuser = False
+        user.is_verified = True
+        return user
+
+    return _make_card_user
+
+
+@pytest.fixture
+def cache():
+    with (
+        patch.object(CacheService, "mget_json", new_callable=AsyncMock) as mget,
+        patch.object(CacheService, "mset_json", new_callable=AsyncMock) as mset,
+        patch.object(CacheService, "invalidate", new_callable=AsyncMock) as invalidate,
+    ):
+        yield MagicMock(mget=mget, mset=mset, invalidate=invalidate)
+
+
+def query_returning(users):
+    session = AsyncMock()
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = users
+    session.execute.return_value = result
+    return session
+
+
+class TestGetCards:
+    async def test_all_cached_skips_database(self, cache):
+        cache.mget.return_value = (
+            {("cards", 1): {"id": 1}, ("cards", 2): {"id": 2}},
+            [],
+        )
+        session = AsyncMock()
+
+        cards = await ProfileCardService.get_cards(session, [2, 1])
+
+        assert cards == [{"id": 2}, {"id": 1}]
+        session.execute.assert_not_awaited()
+        cache.mset.assert_not_awaited()
+
+    async def test_backfills_only_misses(self, cache, make_card_user):
+        cache.mget.return_value = ({("cards", 1): {"id": 1}}, [("cards", 3)])
+        session = query_returning([make_card_user(3)])
+
+        cards = await ProfileCardService.get_cards(session, [3, 1])
+
+        assert [card["id"] for card in cards] == [3, 1]
+        assert cards[0]["first_name"] == "U3"
+        session.execute.assert_awaited_once()
+        (stored,) = cache.mset.await_args.args
+        assert list(stored) == [("cards", 3)]
+        assert cache.mset.await_args.kwargs == {"ttl": settings.cache.cards_ttl}
+
+    async def test_skips_users_that_no_longer_exist(self, cache):
+        cache.mget.return_value = ({("cards", 1): {"id": 1}}, [("cards", 9)])
+        session = query_returning([])
+
+        assert await ProfileCardService.get_cards(session, [9, 1]) == [{"id": 1}]
+        cache.mset.assert_not_awaited()
+
+
+class TestStore:
+    async def test_renders_public_fields(self, cache, make_card_user):
+        cards = await ProfileCardService.store([make_card_user(5)])
+
+        assert cards[0]["id"] == 5
+        assert "hashed_password" not in cards[0]
+        assert "is_superuser" not in cards[0]
+
+
+class TestInvalidate:
+    async def test_drops_card(self, cache):
+        await ProfileCardService.invalidate(7)
+
+        cache.invalidate.assert_awaited_once_with("cards", 7)
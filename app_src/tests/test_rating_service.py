@@ -0,0 +1,130 @@
+"""Unit tests for RatingService."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import redis.asyncio as redis
+
+from core.config import settings
+from crud.services.cache_service import CacheService
+from crud.services.rating_service import RatingService
+
+
+def make_pipeline(results=None):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=results or [])
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    return pipe
+
+
+@pytest.fixture(autouse=True)
+def reset_redis():
+    CacheService._redis = None
+    yield
+    CacheService._redis = None
+
+
+class TestIncrement:
+    async def test_buffers_deltas_in_redis(self):
+        mock_redis = MagicMock()
+        pipe = make_pipeline()
+        mock_redis.pipeline.return_value = pipe
+        CacheService._redis = mock_redis
+        session = AsyncMock()
+
+        await RatingService.increment(session, 2, 3, 2)
+
+        assert [c.args for c in pipe.hincrby.call_args_list] == [
+            ("dating:rating:pending", "2", 2),
+            ("dating:rating:pending", "3", 1),
+        ]
+        session.execute.assert_not_awaited()
+
+    async def test_falls_back_to_atomic_update_on_redis_error(self):
+        mock_redis = MagicMock()
+        pipe = make_pipeline()
+        pipe.execute.side_effect = redis.RedisError("down")
+        mock_redis.pipeline.return_value = pipe
+        CacheService._redis = mock_redis
+        session = AsyncMock()
+
+        await RatingService.increment(session, 2)
+
+        session.execute.assert_awaited_once()
+        sql = str(session.execute.await_args.args[0])
+        assert "SET rating=(users.rating + deltas.delta)" in sql
+        session.commit.assert_awaited_once()
+
+    async def test_direct_update_when_write_behind_disabled(self):
+        session = AsyncMock()
+
+        with patch.object(settings.rating, "write_behind", False):
+            await RatingService.increment(session, 2)
+
+        session.execute.assert_awaited_once()
+
+    async def test_nothing_to_increment(self):
+        session = AsyncMock()
+
+        await RatingService.increment(session)
+
+        session.execute.assert_not_awaited()
+
+
+class TestFlush:
+    async def test_takes_pending_and_applies_in_batches(self):
+        mock_redis = MagicMock()
+        pipe = make_pipeline([{"2": "5", "3": "1", "4": "0"}, 1])
+        mock_redis.pipeline.return_value = pipe
+        CacheService._redis = mock_redis
+        session = AsyncMock()
+
+        with patch.object(settings.rating, "flush_batch_size", 1):
+            flushed = await RatingService.flush(session)
+
+        assert flushed == 2
+        mock_redis.pipeline.assert_called_once_with(transaction=True)
+        pipe.delete.assert_called_once_with("dating:rating:pending")
+        assert session.execute.await_count == 2
+        session.commit.assert_awaited_once()
+
+    async def test_applies_deltas_in_user_id_order(self):
+        mock_redis = MagicMock()
+        mock_redis.pipeline.return_value = make_pipeline([{"9": "1", "2": "5"}, 1])
+        CacheService._redis = mock_redis
+        session = AsyncMock()
+
+        with patch.object(settings.rating, "flush_batch_size", 1):
+            await RatingService.flush(session)
+
+        batches = [
+            c.args[0].compile(compile_kwargs={"literal_binds": True})
+            for c in session.execute.await_args_list
+        ]
+        assert "(2, 5)" in str(batches[0])
+        assert "(9, 1)" in str(batches[1])
+
+    async def test_empty_hash_skips_database(self):
+        mock_redis = MagicMock()
+        mock_redis.pipeline.return_value = make_pipeline([{}, 0])
+        CacheService._redis = mock_redis
+        session = AsyncMock()
+
+        assert await RatingService.flush(session) == 0
+        session.execute.assert_not_awaited()
+
+    async def test_puts_deltas_back_when_update_fails(self):
+        mock_redis = MagicMock()
+        take = make_pipeline([{"2": "5"}, 1])
+        put_back = make_pipeline()
+        mock_redis.pipeline.side_effect = [take, put_back]
+        CacheService._redis = mock_redis
+        session = AsyncMock()
+        session.execute.side_effect = RuntimeError("db down")
+
+        with pytest.raises(RuntimeError):
+            await RatingService.flush(session)
+
+        session.rollback.assert_awaited_once()
+        put_back.hincrby.assert_called_once_with("dating:rating:pending", "2", 5)
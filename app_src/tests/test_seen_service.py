@@ -0,0 +1,116 @@
+"""Unit tests for SeenService."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import redis.asyncio as redis
+
+from core.config import settings
+from crud.services.cache_service import CacheService
+from crud.services.seen_service import SeenService
+
+NOW = 1_700_000_000.0
+
+
+def make_pipeline():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    return pipe
+
+
+@pytest.fixture(autouse=True)
+def reset_redis():
+    CacheService._redis = None
+    CacheService._binary_redis = None
+    yield
+    CacheService._redis = None
+    CacheService._binary_redis = None
+
+
+class TestMark:
+    async def test_adds_ids_prunes_expired_and_refreshes_ttl(self):
+        mock_redis = MagicMock()
+        pipe = make_pipeline()
+        mock_redis.pipeline.return_value = pipe
+        CacheService._redis = mock_redis
+
+        with patch("crud.services.seen_service.time.time", return_value=NOW):
+            await SeenService.mark(1, 5, 9)
+
+        pipe.zadd.assert_called_once_with("dating:seen_ids:1", {5: NOW, 9: NOW})
+        pipe.zremrangebyscore.assert_called_once_with(
+            "dating:seen_ids:1", "-inf", f"({NOW - settings.matching.seen_ttl}"
+        )
+        pipe.expire.assert_called_once_with(
+            "dating:seen_ids:1", settings.matching.seen_ttl
+        )
+        pipe.execute.assert_awaited_once()
+
+    async def test_nothing_to_mark(self):
+        mock_redis = MagicMock()
+        CacheService._redis = mock_redis
+
+        await SeenService.mark(1)
+
+        mock_redis.pipeline.assert_not_called()
+
+    async def test_silent_on_redis_error(self):
+        mock_redis = MagicMock()
+        pipe = make_pipeline()
+        pipe.execute.side_effect = redis.RedisError("down")
+        mock_redis.pipeline.return_value = pipe
+        CacheService._redis = mock_redis
+
+        await SeenService.mark(1, 2)  # Should not raise
+
+
+class TestGetIds:
+    async def test_returns_ids_seen_within_ttl(self):
+        mock_redis = AsyncMock()
+        mock_redis.zrangebyscore.return_value = ["2", "22", "23"]
+        CacheService._redis = mock_redis
+
+        with patch("crud.services.seen_service.time.time", return_value=NOW):
+            result = await SeenService.get_ids(1)
+
+        assert result == [2, 22, 23]
+        mock_redis.zrangebyscore.assert_awaited_once_with(
+            "dating:seen_ids:1", NOW - settings.matching.seen_ttl, "+inf"
+        )
+
+    async def test_returns_empty_on_redis_error(self):
+        mock_redis = AsyncMock()
+        mock_redis.zrangebyscore.side_effect = redis.RedisError("down")
+        CacheService._redis = mock_redis
+
+        assert await SeenService.get_ids(1) == []
+
+
+class TestSeenAmong:
+    async def test_only_ids_seen_within_ttl(self):
+        mock_redis = AsyncMock()
+        expired = NOW - settings.matching.seen_ttl - 1
+        mock_redis.zmscore.return_value = [NOW, None, expired]
+        CacheService._redis = mock_redis
+
+        with patch("crud.services.seen_service.time.time", return_value=NOW):
+            seen = await SeenService.seen_among(1, [5, 6, 7])
+
+        assert seen == {5}
+        mock_redis.zmscore.assert_awaited_once_with("dating:seen_ids:1", [5, 6, 7])
+
+    async def test_no_candidates(self):
+        mock_redis = AsyncMock()
+        CacheService._redis = mock_redis
+
+        assert await SeenService.seen_among(1, []) == set()
+        mock_redis.zmscore.assert_not_awaited()
+
+    async def test_nothing_seen_on_redis_error(self):
+        mock_redis = AsyncMock()
+        mock_redis.zmscore.side_effect = redis.RedisError("down")
+        CacheService._redis = mock_redis
+
+        assert await SeenService.seen_among(1, [5]) == set()
@@ -0,0 +1,260 @@
+"""Unit tests for SuggestionQueueService."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import redis.asyncio as redis
+
+from crud.services.cache_service import CacheService
+from crud.services.matches_service import MatchingService
+from crud.services.seen_service import SeenService
+from crud.services.suggestion_queue_service import SuggestionQueueService
+
+
+def make_pipeline(results):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=results)
+    pipe.watch = AsyncMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    return pipe
+
+
+class TestGetPage:
+    @pytest.fixture(autouse=True)
+    def reset_state(self):
+        CacheService._redis = None
+        SuggestionQueueService._rebuilding.clear()
+        with patch.object(SeenService, "seen_among", return_value=set()):
+            yield
+        CacheService._redis = None
+        SuggestionQueueService._rebuilding.clear()
+
+    @pytest.fixture
+    def user(self, make_user):
+        return make_user(id=1)
+
+    async def test_slices_built_queue(self, user, make_user):
+        mock_redis = MagicMock()
+        pipe = make_pipeline(["0", 3, ["2", "3"]])
+        mock_redis.pipeline.return_value = pipe
+        CacheService._redis = mock_redis
+        users = [make_user(id=2), make_user(id=3)]
+
+        with patch.object(
+            MatchingService, "get_users_by_ids", return_value=users
+        ) as mock_fetch:
+            items, total = await SuggestionQueueService.get_page(
+                AsyncMock(), user, limit=2, offset=0
+            )
+
+        assert items == users
+        assert total == 3
+        pipe.zrange.assert_called_once_with(
+            "dating:suggestion_queue:1", 0, 1, desc=True
+        )
+        mock_fetch.assert_awaited_once()
+        assert mock_fetch.await_args.args[1] == [2, 3]
+        assert mock_fetch.await_args.kwargs["suggested_to"] is user
+        pipe.zrem.assert_not_called()
+
+    async def test_drops_candidates_no_longer_suggestible(self, user, make_user):
+        mock_redis = MagicMock()
+        pipe = make_pipeline(["0", 4, ["2", "3", "4"]])
+        mock_redis.pipeline.return_value = pipe
+        CacheService._redis = mock_redis
+        # 3 was deactivated or blocked, 4 was passed since the queue was built
+        users = [make_user(id=2), make_user(id=4)]
+
+        with (
+            patch.object(MatchingService, "get_users_by_ids", return_value=users),
+            patch.object(SeenService, "seen_among", return_value={4}),
+        ):
+            items, total = await SuggestionQueueService.get_page(
+                AsyncMock(), user, limit=3, offset=0
+            )
+
+        assert [u.id for u in items] == [2]
+        assert total == 2
+        pipe.zrem.assert_called_once()
+        assert pipe.zrem.call_args.args[0] == "dating:suggestion_queue:1"
+        assert sorted(pipe.zrem.call_args.args[1:]) == [3, 4]
+
+    async def test_builds_queue_on_first_use(self, user, make_user):
+        mock_redis = MagicMock()
+        mock_redis.pipeline.return_value = make_pipeline([None, 0, []])
+        CacheService._redis = mock_redis
+
+        with (
+            patch.object(
+                SuggestionQueueService,
+                "build",
+                return_value=([5, 6, 7], 3),
+            ) as mock_build,
+            patch.object(
+                MatchingService,
+                "get_users_by_ids",
+                return_value=[make_user(id=6)],
+            ) as mock_fetch,
+        ):
+            items, total = await SuggestionQueueService.get_page(
+                AsyncMock(), user, limit=1, offset=1
+            )
+
+        mock_build.assert_awaited_once()
+        assert mock_fetch.await_args.args[1] == [6]
+        assert total == 3
+        assert len(items) == 1
+
+    async def test_falls_back_to_sql_on_redis_error(self, user):
+        mock_redis = MagicMock()
+        pipe = make_pipeline(None)
+        pipe.execute.side_effect = redis.RedisError("down")
+        mock_redis.pipeline.return_value = pipe
+        CacheService._redis = mock_redis
+
+        with patch.object(
+            MatchingService,
+            "find_matches_by_interests_and_rating",
+            return_value=([], 0),
+        ) as mock_sql:
+            result = await SuggestionQueueService.get_page(AsyncMock(), user)
+
+        assert result == ([], 0)
+        mock_sql.assert_awaited_once()
+
+    async def test_page_past_queue_uses_sql_and_rebuilds(self, user):
+        mock_redis = MagicMock()
+        mock_redis.pipeline.return_value = make_pipeline(["100", 10, []])
+        CacheService._redis = mock_redis
+
+        with (
+            patch.object(
+                MatchingService,
+                "find_matches_by_interests_and_rating",
+                return_value=([], 110),
+            ) as mock_sql,
+            patch.object(SuggestionQueueService, "schedule_rebuild") as mock_rebuild,
+        ):
+            _, total = await SuggestionQueueService.get_page(
+                AsyncMock(), user, limit=20, offset=20
+            )
+
+        assert total == 110
+        mock_sql.assert_awaited_once()
+        mock_rebuild.assert_called_once_with(user.id)
+
+    async def test_low_queue_schedules_rebuild(self, user):
+        mock_redis = MagicMock()
+        mock_redis.pipeline.return_value = make_pipeline(["100", 25, ["2"] * 20])
+        CacheService._redis = mock_redis
+
+        with (
+            patch.object(MatchingService, "get_users_by_ids", return_value=[]),
+            patch.object(SuggestionQueueService, "schedule_rebuild") as mock_rebuild,
+        ):
+            await SuggestionQueueService.get_page(AsyncMock(), user, limit=20)
+
+        mock_rebuild.assert_called_once_with(user.id)
+
+
+class TestBuild:
+    @pytest.fixture(autouse=True)
+    def reset_redis(self):
+        CacheService._redis = None
+        yield
+        CacheService._redis = None
+
+    @pytest.fixture
+    def mock_redis(self):
+        mock_redis = MagicMock()
+        mock_redis.get = AsyncMock(return_value="4")
+        mock_redis.pipeline.return_value = make_pipeline([])
+        mock_redis.pipeline.return_value.get = AsyncMock(return_value="4")
+        CacheService._redis = mock_redis
+        return mock_redis
+
+    async def test_stores_ranked_ids_with_inverse_rank_scores(
+        self, make_user, mock_redis
+    ):
+        pipe = mock_redis.pipeline.return_value
+
+        with patch.object(
+            MatchingService, "rank_candidate_ids", return_value=([7, 3, 9], 10)
+        ):
+            ids, total = await SuggestionQueueService.build(
+                AsyncMock(), make_user(id=1)
+            )
+
+        assert ids == [7, 3, 9]
+        assert total == 10
+        pipe.zadd.assert_called_once_with(
+            "dating:suggestion_queue:1", {7: 3, 3: 2, 9: 1}
+        )
+        pipe.set.assert_called_once()
+        assert pipe.set.call_args.args[1] == 7  # overflow beyond the queue
+        pipe.watch.assert_awaited_once_with("dating:suggestion_queue:1:version")
+
+    async def test_skips_write_when_queue_changed_while_ranking(
+        self, make_user, mock_redis
+    ):
+        pipe = mock_redis.pipeline.return_value
+        # A swipe removed a candidate after the version was read
+        pipe.get.return_value = "5"
+
+        with patch.object(
+            MatchingService, "rank_candidate_ids", return_value=([7, 3, 9], 10)
+        ):
+            ids, total = await SuggestionQueueService.build(
+                AsyncMock(), make_user(id=1)
+            )
+
+        assert (ids, total) == ([7, 3, 9], 10)
+        pipe.multi.assert_not_called()
+        pipe.zadd.assert_not_called()
+        pipe.execute.assert_not_awaited()
+
+    async def test_change_after_watch_is_not_written(self, make_user, mock_redis):
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.side_effect = redis.WatchError()
+
+        with patch.object(MatchingService, "rank_candidate_ids", return_value=([7], 1)):
+            ids, _ = await SuggestionQueueService.build(AsyncMock(), make_user(id=1))
+
+        assert ids == [7]
+
+
+class TestRemoveAndDrop:
+    @pytest.fixture(autouse=True)
+    def reset_redis(self):
+        CacheService._redis = None
+        yield
+        CacheService._redis = None
+
+    @pytest.fixture
+    def mock_redis(self):
+        mock_redis = MagicMock()
+        mock_redis.pipeline.return_value = make_pipeline([])
+        CacheService._redis = mock_redis
+        return mock_redis
+
+    async def test_remove_zrems_candidates_and_bumps_version(self, mock_redis):
+        await SuggestionQueueService.remove(1, 2, 3)
+
+        pipe = mock_redis.pipeline.return_value
+        pipe.zrem.assert_called_once_with("dating:suggestion_queue:1", 2, 3)
+        pipe.incr.assert_called_once_with("dating:suggestion_queue:1:version")
+
+    async def test_drop_deletes_queue_and_bumps_version(self, mock_redis):
+        await SuggestionQueueService.drop(1)
+
+        pipe = mock_redis.pipeline.return_value
+        pipe.delete.assert_called_once_with(
+            "dating:suggestion_queue:1", "dating:suggestion_queue:1:overflow"
+        )
+        pipe.incr.assert_called_once_with("dating:suggestion_queue:1:version")
+
+    async def test_remove_silent_on_redis_error(self, mock_redis):
+        mock_redis.pipeline.return_value.execute.side_effect = redis.RedisError("down")
+
+        await SuggestionQueueService.remove(1, 2)  # Should not raise
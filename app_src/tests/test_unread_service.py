@@ -0,0 +1,150 @@
+"""Unit tests for UnreadService."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import redis.asyncio as redis
+from sqlalchemy.dialects import postgresql
+
+from core.config import settings
+from crud.services.cache_service import CacheService
+from crud.services.unread_service import UnreadService
+
+
+def make_pipeline():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    return pipe
+
+
+def make_session(*rows):
+    session = AsyncMock()
+    result = MagicMock()
+    result.all.return_value = list(rows)
+    session.execute.return_value = result
+    return session
+
+
+@pytest.fixture
+def mock_redis():
+    mock_redis = MagicMock()
+    mock_redis.pipeline.return_value = make_pipeline()
+    mock_redis.hgetall = AsyncMock(return_value={})
+    mock_redis.hdel = AsyncMock()
+    CacheService._redis = mock_redis
+    yield mock_redis
+    CacheService._redis = None
+
+
+class TestIncrement:
+    async def test_increments_recipient_field(self, mock_redis):
+        await UnreadService.increment(5, 20)
+
+        pipe = mock_redis.pipeline.return_value
+        pipe.hincrby.assert_called_once_with("dating:unread:20", "5", 1)
+        pipe.expire.assert_called_once_with("dating:unread:20", settings.unread.ttl)
+
+    async def test_redis_error_is_logged(self, mock_redis):
+        mock_redis.pipeline.return_value.execute.side_effect = redis.RedisError()
+
+        await UnreadService.increment(5, 20)
+
+    async def test_disabled(self, mock_redis):
+        with patch.object(settings.unread, "counters", False):
+            await UnreadService.increment(5, 20)
+
+        mock_redis.pipeline.assert_not_called()
+
+
+class TestReset:
+    async def test_deletes_match_field(self, mock_redis):
+        await UnreadService.reset(5, 20)
+
+        mock_redis.hdel.assert_awaited_once_with("dating:unread:20", "5")
+
+
+class TestGetCounts:
+    async def test_served_from_hash_with_baseline(self, mock_redis):
+        mock_redis.hgetall.return_value = {"baseline": "0", "5": "3", "6": "0"}
+        session = make_session()
+
+        counts = await UnreadService.get_counts(session, 20)
+
+        assert counts == {5: 3}
+        session.execute.assert_not_awaited()
+
+    async def test_hash_without_baseline_is_rebuilt(self, mock_redis):
+        # Only incremented since it expired: 1 is not the real count
+        mock_redis.hgetall.return_value = {"5": "1"}
+        session = make_session((20, 5, 4), (20, 7, 2))
+
+        counts = await UnreadService.get_counts(session, 20)
+
+        assert counts == {5: 4, 7: 2}
+        pipe = mock_redis.pipeline.return_value
+        pipe.delete.assert_called_once_with("dating:unread:20")
+        pipe.hset.assert_called_once_with(
+            "dating:unread:20", mapping={"baseline": 0, 5: 4, 7: 2}
+        )
+
+    async def test_counts_from_database_on_redis_error(self, mock_redis):
+        mock_redis.hgetall.side_effect = redis.RedisError()
+        mock_redis.pipeline.return_value.execute.side_effect = redis.RedisError()
+        session = make_session((20, 5, 4))
+
+        assert await UnreadService.get_counts(session, 20) == {5: 4}
+
+    async def test_disabled_counts_from_database(self, mock_redis):
+        session = make_session((20, 5, 4))
+
+        with patch.object(settings.unread, "counters", False):
+            counts = await UnreadService.get_counts(session, 20)
+
+        assert counts == {5: 4}
+        mock_redis.hgetall.assert_not_awaited()
+        mock_redis.pipeline.assert_not_called()
+
+
+class TestCountFromDb:
+    async def test_counts_above_read_cursor_for_both_participants(self):
+        session = make_session((20, 5, 4), (21, 6, 1), (20, 7, 2))
+
+        counts = await UnreadService.count_from_db(session, [20, 21])
+
+        assert counts == {20: {5: 4, 7: 2}, 21: {6: 1}}
+        statement = str(
+            session.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+        )
+        assert "matchs.matched_user_id IN" in statement
+        assert "coalesce(read_cursors.last_read_message_id" in statement
+
+    async def test_no_users(self):
+        session = make_session()
+
+        assert await UnreadService.count_from_db(session, []) == {}
+        session.execute.assert_not_awaited()
+
+
+class TestReconcile:
+    async def test_rewrites_every_hash_in_batches(self, mock_redis):
+        async def scan_iter(**kwargs):
+            for key in ("dating:unread:20", "dating:unread:21", "dating:unread:22"):
+                yield key
+
+        mock_redis.scan_iter = scan_iter
+        session = make_session((20, 5, 4))
+
+        with patch.object(settings.unread, "reconcile_batch_size", 2):
+            reconciled = await UnreadService.reconcile(session)
+
+        assert reconciled == 3
+        assert session.execute.await_count == 2
+        pipe = mock_redis.pipeline.return_value
+        # 21 and 22 have nothing unread: their stale counts are cleared
+        assert [c.kwargs["mapping"] for c in pipe.hset.call_args_list] == [
+            {"baseline": 0, 5: 4},
+            {"baseline": 0},
+            {"baseline": 0},
+        ]
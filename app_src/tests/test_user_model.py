@@ -2,16 +2,6 @@
 
 
 class TestUserRating:
-    def test_increment_rating(self, make_user):
-        user = make_user(rating=5)
-        user.increment_rating()
-        assert user.rating == 6
-
-    def test_increment_from_zero(self, make_user):
-        user = make_user(rating=0)
-        user.increment_rating()
-        assert user.rating == 1
-
     def test_decrement_rating(self, make_user):
         user = make_user(rating=5)
         user.decrement_rating()
@@ -27,12 +17,6 @@ class TestUserRating:
         user.decrement_rating()
         assert user.rating == 0
 
-    def test_multiple_increments(self, make_user):
-        user = make_user(rating=0)
-        for _ in range(10):
-            user.increment_rating()
-        assert user.rating == 10
-
 
 class TestUserInterests:
     def test_get_interests_names(self, make_user, sample_interests):
@@ -1,3 +1,10 @@
-__all__ = ("camel_case_to_snake_case",)
+__all__ = (
+    "camel_case_to_snake_case",
+    "decode_cursor",
+    "encode_cursor",
+    "json_response",
+)
 
 from .case_converter import camel_case_to_snake_case
+from .cursor import decode_cursor, encode_cursor
+from .etag import json_response
@@ -0,0 +1,105 @@
+"""
+Binary format of cached values.
+
+A stored value is a compression marker followed by the (possibly
+compressed) plain value, which is a format marker followed by the payload::
+
+    b"-" b"j" b'{"items":[]}'          orjson, uncompressed
+    b"z" zstd(b"m" + msgpack bytes)    msgpack, zstd-compressed
+
+Unknown markers raise ValueError, so values written by another version
+of the app read as cache misses instead of garbage.
+"""
+
+from typing import Any, Literal
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # optional dependency, only needed for the msgpack codec
+    msgpack = None
+
+try:
+    import lz4.frame as lz4
+except ImportError:  # optional dependency, only needed for lz4 compression
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, only needed for zstd compression
+    zstandard = None
+
+Codec = Literal["orjson", "msgpack"]
+Compression = Literal["none", "zstd", "lz4"]
+
+# Format markers
+RAW = b"r"  # bytes stored as they are, e.g. a serialized response body
+CODECS: dict[Codec, bytes] = {"orjson": b"j", "msgpack": b"m"}
+
+# Compression markers
+COMPRESSIONS: dict[Compression, bytes] = {"none": b"-", "zstd": b"z", "lz4": b"4"}
+
+
+def available(name: Codec | Compression) -> bool:
+    """Whether the library behind a codec or compression is installed."""
+    libraries = {"msgpack": msgpack, "lz4": lz4, "zstd": zstandard}
+    return name not in libraries or libraries[name] is not None
+
+
+def encode(value: Any, codec: Codec = "orjson") -> bytes:
+    """
+    Serialize ``value`` into a plain value, falling back to orjson if the
+    codec is not installed.
+
+    >>> encode({"id": 1})
+    b'j{"id":1}'
+    """
+    if codec == "msgpack" and msgpack is not None:
+        return CODECS["msgpack"] + msgpack.packb(value, default=str)
+    return CODECS["orjson"] + orjson.dumps(value, default=str)
+
+
+def decode(plain: bytes) -> Any:
+    """
+    Deserialize a plain value written by ``encode`` with any codec.
+
+    >>> decode(b'j{"id":1}')
+    {'id': 1}
+    """
+    marker, payload = plain[:1], memoryview(plain)[1:]
+    if marker == CODECS["orjson"]:
+        return orjson.loads(payload)
+    if marker == CODECS["msgpack"] and msgpack is not None:
+        return msgpack.unpackb(payload)
+    raise ValueError(f"Unknown cache format {marker!r}")
+
+
+def compress(plain: bytes, compression: Compression, min_size: int) -> bytes:
+    """
+    Build the stored value. Values shorter than ``min_size`` are left
+    uncompressed, as is everything when the library is not installed.
+    """
+    if len(plain) >= min_size:
+        if compression == "zstd" and zstandard is not None:
+            return COMPRESSIONS["zstd"] + zstandard.compress(plain)
+        if compression == "lz4" and lz4 is not None:
+            return COMPRESSIONS["lz4"] + lz4.compress(plain)
+    return COMPRESSIONS["none"] + plain
+
+
+def decompress(stored: bytes) -> bytes:
+    """
+    Get the plain value back from a stored value.
+
+    >>> decompress(b'-j{"id":1}')
+    b'j{"id":1}'
+    """
+    marker, payload = stored[:1], stored[1:]
+    if marker == COMPRESSIONS["none"]:
+        return payload
+    if marker == COMPRESSIONS["zstd"] and zstandard is not None:
+        return zstandard.decompress(payload)
+    if marker == COMPRESSIONS["lz4"] and lz4 is not None:
+        return lz4.decompress(payload)
+    raise ValueError(f"Unknown cache compression {marker!r}")
@@ -0,0 +1,38 @@
+"""Opaque cursors for keyset pagination."""
+
+import base64
+import binascii
+from datetime import datetime
+
+import orjson
+
+
+def encode_cursor(*values: int | str | datetime) -> str:
+    """
+    >>> encode_cursor(3, datetime(2025, 1, 1), 42)
+    'WzMsIjIwMjUtMDEtMDFUMDA6MDA6MDAiLDQyXQ'
+    """
+    raw = orjson.dumps(values)
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    """
+    Decode a cursor produced by ``encode_cursor`` into values of ``types``.
+
+    Raises ValueError if the cursor is malformed.
+
+    >>> decode_cursor("WzMsIjIwMjUtMDEtMDFUMDA6MDA6MDAiLDQyXQ", int, datetime, int)
+    [3, datetime.datetime(2025, 1, 1, 0, 0), 42]
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = orjson.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("Invalid cursor")
+        return [
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for value, type_ in zip(values, types, strict=True)
+        ]
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
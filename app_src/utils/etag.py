@@ -0,0 +1,27 @@
+"""Responses for pre-serialized JSON bodies, with conditional GET."""
+
+import hashlib
+
+from fastapi import Request, Response, status
+
+
+def etag(body: bytes) -> str:
+    """
+    >>> etag(b"{}")
+    '"2afb9b83f9314e5d029766197f539792"'
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def json_response(request: Request, body: bytes) -> Response:
+    """
+    Return ``body`` as is, skipping ``response_model`` validation.
+
+    Answers 304 Not Modified when the client already has this body.
+    """
+    tag = etag(body)
+    headers = {"ETag": tag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if tag in (value.strip() for value in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
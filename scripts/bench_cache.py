@@ -0,0 +1,181 @@
+"""Benchmark cache codecs and compression on realistic suggestion pages.
+
+Usage:
+    uv run --extra cache python scripts/bench_cache.py
+    uv run --extra cache python scripts/bench_cache.py --limit 20 100 --pages 200
+    uv run --extra cache python scripts/bench_cache.py --redis   # + MEMORY USAGE
+
+Pages are ``PaginatedResponse[UserRead]`` with bios and interests, encoded
+the way ``CacheService`` stores them: JSON values with each codec, and the
+raw response bodies kept by ``get_or_compute``. Reports the stored size
+and the median encode (serialize + compress) and decode times per page.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app_src"))
+os.environ.setdefault("APP_CONFIG__DB__URL", "postgresql+asyncpg://u:p@localhost/db")
+os.environ.setdefault("APP_CONFIG__ACCESS_TOKEN__RESET_PASSWORD_TOKEN_SECRET", "x")
+os.environ.setdefault("APP_CONFIG__ACCESS_TOKEN__VERIFICATION_TOKEN_SECRET", "x")
+
+import redis.asyncio as redis  # noqa: E402
+
+from core.models import GenderEnum  # noqa: E402
+from core.schemas.pagination import PaginatedResponse  # noqa: E402
+from core.schemas.user import UserRead  # noqa: E402
+from utils import cache_codec  # noqa: E402
+
+REDIS_URL = "redis://localhost:6379/15"
+
+SEED = 42
+N_INTERESTS = 300
+WORDS = (
+    "love hiking coffee travel music books dogs cats cooking movies yoga "
+    "running photography art wine beach mountains football games dancing "
+    "looking for someone kind honest funny to explore the city with"
+).split()
+CITIES = ["Kyiv", "Lviv", "Odesa", "Kharkiv", "Dnipro", "Warsaw", "Berlin"]
+
+
+def make_page(rng: random.Random, limit: int) -> dict:
+    """A suggestion page as returned by GET /matches/suggestion."""
+    now = datetime(2026, 1, 1, tzinfo=UTC)
+    users = []
+    for _ in range(limit):
+        user_id = rng.randint(1, 1_000_000)
+        interests = [
+            {
+                "id": interest_id,
+                "name": f"interest {interest_id}",
+                "created_at": now - timedelta(days=interest_id),
+            }
+            for interest_id in rng.sample(range(1, N_INTERESTS + 1), rng.randint(1, 10))
+        ]
+        users.append(
+            UserRead(
+                id=user_id,
+                email=f"user{user_id}@example.com",
+                first_name=rng.choice(["Anna", "Olena", "Dmytro", "Ivan", "Maria"]),
+                last_name=f"Surname{user_id}",
+                gender=rng.choice(list(GenderEnum)),
+                interests=interests,
+                bio=" ".join(rng.choices(WORDS, k=rng.randint(0, 60))) or None,
+                age=rng.randint(18, 60),
+                photo=f"/static/photos/{user_id}.jpg" if rng.random() < 0.8 else None,
+                location=rng.choice(CITIES),
+                is_active=True,
+                is_superuser=False,
+                is_verified=True,
+            )
+        )
+    response = PaginatedResponse[UserRead](
+        items=users, total=rng.randint(limit, 5000), limit=limit, offset=0
+    )
+    return response.model_dump(mode="json")
+
+
+def variants() -> list[tuple[str, str]]:
+    """(codec, compression) pairs whose libraries are installed; "raw" is the
+    response body as served."""
+    codecs = ["raw", "orjson", "msgpack"]
+    compressions = ["none", "zstd", "lz4"]
+    return [
+        (codec, compression)
+        for codec in codecs
+        for compression in compressions
+        if cache_codec.available(compression)
+        and (codec == "raw" or cache_codec.available(codec))
+    ]
+
+
+def encode(page: dict, body: bytes, codec: str, compression: str) -> bytes:
+    plain = (
+        cache_codec.RAW + body if codec == "raw" else cache_codec.encode(page, codec)
+    )
+    return cache_codec.compress(plain, compression, min_size=0)
+
+
+def decode(stored: bytes, codec: str):
+    plain = cache_codec.decompress(stored)
+    return plain[1:] if codec == "raw" else cache_codec.decode(plain)
+
+
+def bench(pages: list[dict], codec: str, compression: str) -> tuple[int, float, float]:
+    """Median stored size, encode and decode time."""
+    bodies = [
+        PaginatedResponse.model_validate(page).model_dump_json().encode()
+        for page in pages
+    ]
+    sizes, encode_times, decode_times = [], [], []
+    for page, body in zip(pages, bodies, strict=True):
+        start = time.perf_counter()
+        stored = encode(page, body, codec, compression)
+        encode_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        decode(stored, codec)
+        decode_times.append(time.perf_counter() - start)
+        sizes.append(len(stored))
+    return (
+        int(statistics.median(sizes)),
+        statistics.median(encode_times),
+        statistics.median(decode_times),
+    )
+
+
+async def redis_usage(url: str, page: dict, results: dict) -> dict[tuple, int]:
+    """MEMORY USAGE of one page stored with each variant."""
+    body = PaginatedResponse.model_validate(page).model_dump_json().encode()
+    r = redis.from_url(url)
+    usage = {}
+    try:
+        for codec, compression in results:
+            key = f"bench_cache:{codec}:{compression}"
+            await r.set(key, encode(page, body, codec, compression), ex=60)
+            usage[codec, compression] = await r.memory_usage(key)
+            await r.delete(key)
+    finally:
+        await r.aclose()
+    return usage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--redis", action="store_true", help="also measure Redis")
+    parser.add_argument("--redis-url", default=REDIS_URL)
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    for limit in args.limit:
+        pages = [make_page(rng, limit) for _ in range(args.pages)]
+        print(f"{limit} users per page")
+        results = {
+            (codec, compression): bench(pages, codec, compression)
+            for codec, compression in variants()
+        }
+        usage = {}
+        if args.redis:
+            usage = asyncio.run(redis_usage(args.redis_url, pages[0], results))
+        baseline = results["orjson", "none"][0]
+        for (codec, compression), (size, encode_time, decode_time) in results.items():
+            line = (
+                f"  {codec:<8}{compression:<6}{size:>9,} B ({size / baseline:4.0%})"
+                f"   encode {encode_time * 1e6:7.1f} us"
+                f"   decode {decode_time * 1e6:7.1f} us"
+            )
+            if usage:
+                line += f"   redis {usage[codec, compression]:>9,} B"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Benchmark chat delivery from Redis Pub/Sub to WebSockets in one worker.
+
+Usage:
+    uv run python scripts/bench_chat.py
+    uv run python scripts/bench_chat.py --matches 10 100 1000 --messages 50
+    uv run python scripts/bench_chat.py --slow 0.01     # 1% of sockets stall
+    uv run python scripts/bench_chat.py --routing shard # bounded subscriptions
+    uv run python scripts/bench_chat.py --transport stream
+
+Needs a local Redis. Both participants of every match are connected to a
+``ConnectionManager`` through fake WebSockets, a second client publishes
+the messages round-robin over the matches, and the run reports delivered
+messages per second and the publish-to-send latency. Slow sockets take
+``--slow-delay`` seconds per send and show how much they hold up the
+other chats. Also reports how long connecting every socket took and how
+many channels the worker ended up subscribed to (streams read, with
+``--transport stream``).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app_src"))
+os.environ.setdefault("APP_CONFIG__DB__URL", "postgresql+asyncpg://u:p@localhost/db")
+os.environ.setdefault("APP_CONFIG__ACCESS_TOKEN__RESET_PASSWORD_TOKEN_SECRET", "x")
+os.environ.setdefault("APP_CONFIG__ACCESS_TOKEN__VERIFICATION_TOKEN_SECRET", "x")
+
+import redis.asyncio as redis  # noqa: E402
+
+from core.config import settings  # noqa: E402
+from crud.services.connection_manager import (  # noqa: E402
+    ConnectionManager,
+    StreamConnectionManager,
+)
+
+REDIS_URL = "redis://localhost:6379/15"
+
+SEED = 42
+PUBLISH_BATCH = 500
+
+
+class FakeWebSocket:
+    """Records when each message reaches the socket."""
+
+    def __init__(self, run: "Run", delay: float = 0.0):
+        self.run = run
+        self.delay = delay
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_json(self, message: dict) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.run.received(message)
+
+
+class Run:
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.latencies: list[float] = []
+        self.done = asyncio.Event()
+
+    def received(self, message: dict) -> None:
+        self.latencies.append(time.perf_counter() - message["sent_at"])
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+async def bench(
+    url: str, n_matches: int, n_messages: int, slow: float, slow_delay: float
+) -> tuple[float, int, int, float, list[float]]:
+    """
+    Connect time, subscriptions, delivered sends, elapsed seconds and
+    latencies of one run.
+    """
+    rng = random.Random(SEED)
+    # Every message is sent to both participants
+    run = Run(expected=2 * n_matches * n_messages)
+    streams = settings.chat.transport == "stream"
+    cm = StreamConnectionManager() if streams else ConnectionManager()
+    publisher = redis.from_url(url)
+    try:
+        start = time.perf_counter()
+        for match_id in range(1, n_matches + 1):
+            for user_id in (2 * match_id, 2 * match_id + 1):
+                delay = slow_delay if rng.random() < slow else 0.0
+                await cm.connect(FakeWebSocket(run, delay), match_id, user_id)
+        # SUBSCRIBE is not acknowledged synchronously; wait for the last one
+        if streams:
+            subscriptions = len(cm._positions)
+        else:
+            while (await publisher.pubsub_numsub(cm._channel(n_matches)))[0][1] == 0:
+                await asyncio.sleep(0.01)
+            subscriptions = len(cm._pubsub.channels)
+        connect_time = time.perf_counter() - start
+
+        total = n_matches * n_messages
+        start = time.perf_counter()
+        for batch_start in range(0, total, PUBLISH_BATCH):
+            async with publisher.pipeline(transaction=False) as pipe:
+                for i in range(batch_start, min(batch_start + PUBLISH_BATCH, total)):
+                    message = {"text": f"message {i}", "sent_at": time.perf_counter()}
+                    match_id = i % n_matches + 1
+                    if streams:
+                        pipe.xadd(
+                            cm._stream(match_id),
+                            {"data": json.dumps(message)},
+                            maxlen=settings.chat.stream_maxlen,
+                            approximate=True,
+                        )
+                    else:
+                        pipe.publish(cm._channel(match_id), cm._pack(match_id, message))
+                await pipe.execute()
+        try:
+            await asyncio.wait_for(run.done.wait(), timeout=120)
+        except TimeoutError:
+            print(f"  timed out after {len(run.latencies)}/{run.expected} sends")
+        elapsed = time.perf_counter() - start
+    finally:
+        await cm.close()
+        if streams:
+            keys = [cm._stream(match_id) for match_id in range(1, n_matches + 1)]
+            await publisher.delete(*keys)
+        await publisher.aclose()
+    return connect_time, subscriptions, len(run.latencies), elapsed, run.latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--matches", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--messages", type=int, default=20, help="per match")
+    parser.add_argument("--slow", type=float, default=0.0, help="fraction of sockets")
+    parser.add_argument("--slow-delay", type=float, default=0.5)
+    parser.add_argument("--routing", choices=["channel", "shard"], default="channel")
+    parser.add_argument("--transport", choices=["pubsub", "stream"], default="pubsub")
+    parser.add_argument("--redis-url", default=REDIS_URL)
+    args = parser.parse_args()
+    settings.chat.routing = args.routing
+    settings.chat.transport = args.transport
+    settings.REDIS_URL = args.redis_url
+
+    for n_matches in args.matches:
+        connect_time, subscriptions, sends, elapsed, latencies = asyncio.run(
+            bench(args.redis_url, n_matches, args.messages, args.slow, args.slow_delay)
+        )
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+        median = statistics.median(latencies) if latencies else 0.0
+        print(
+            f"{n_matches:>6} matches connected in {connect_time:5.2f} s"
+            f" ({subscriptions:>5} channels)"
+            f"   {sends:>8,} sends in {elapsed:6.2f} s"
+            f"   {sends / 2 / elapsed:>9,.0f} msg/s"
+            f"   latency p50 {median * 1e3:7.1f} ms   p99 {p99 * 1e3:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Load test: idle chat WebSockets must not hold database connections.
+
+Usage:
+    uv run python scripts/load_chat_ws.py --token <access_token> --match-id 1
+    uv run python scripts/load_chat_ws.py --token ... --match-id 1 --sockets 5000
+
+Run against one worker (e.g. ``uvicorn main:main_app``). Opens ``--sockets``
+chat WebSockets for a mutual match the token's user belongs to, keeps them
+idle, and reads ``db_pool_checked_out`` from ``/metrics`` while they are
+open. Then sends one message on each of a few sockets and checks the pool
+is back to zero once they are saved. Exits non-zero if idle sockets hold
+connections.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import urllib.request
+
+import websockets
+
+METRIC = "db_pool_checked_out"
+
+
+def pool_checked_out(base_url: str) -> float:
+    with urllib.request.urlopen(f"{base_url}/metrics") as response:
+        for line in response.read().decode().splitlines():
+            if line.startswith(METRIC + " "):
+                return float(line.split()[1])
+    raise RuntimeError(f"{METRIC} missing from /metrics")
+
+
+async def run(args: argparse.Namespace) -> bool:
+    ws_url = (
+        args.base_url.replace("http", "ws", 1)
+        + f"/api/v1/chat/ws/{args.match_id}?token={args.token}"
+    )
+    start = time.perf_counter()
+    sockets = []
+    try:
+        for batch_start in range(0, args.sockets, args.batch):
+            batch = min(args.batch, args.sockets - batch_start)
+            sockets += await asyncio.gather(
+                *(websockets.connect(ws_url) for _ in range(batch))
+            )
+        print(f"{len(sockets)} sockets open in {time.perf_counter() - start:.1f} s")
+
+        await asyncio.sleep(args.hold)
+        idle = await asyncio.to_thread(pool_checked_out, args.base_url)
+        print(f"idle:  {idle:.0f} pooled connections checked out")
+
+        for ws in sockets[: args.send]:
+            await ws.send(json.dumps({"text": "load test"}))
+        await asyncio.sleep(1)  # let the worker save and broadcast them
+        after = await asyncio.to_thread(pool_checked_out, args.base_url)
+        print(f"after {args.send} messages: {after:.0f} checked out")
+    finally:
+        await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+    return idle == 0 and after == 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--match-id", type=int, required=True)
+    parser.add_argument("--sockets", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=100, help="sockets opened at once")
+    parser.add_argument("--hold", type=float, default=2.0, help="seconds idle")
+    parser.add_argument("--send", type=int, default=5, help="messages sent")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()